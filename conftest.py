@@ -0,0 +1,12 @@
+import pytest
+from django.core.cache import cache
+
+from medicine.barcodes import resolver
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Database rollbacks between tests don't fire invalidation signals."""
+    cache.clear()
+    resolver.clear()
+    yield
@@ -11,13 +11,14 @@ Admin Models:
     - ActiveIngredientAdmin: Simple list view
     - SupplierAdmin: Supplier management with location filtering
     - ManufacturerAdmin: Manufacturer details with country filtering
+    - StockMovementAdmin: Read-only view of the stock ledger
 """
 
 from django.contrib import admin
 from django.contrib.admin import register
 from mptt.admin import MPTTModelAdmin
 from django.utils.html import format_html
-from .models import Category, Medicine, Batch, ActiveIngredient, Supplier, Manufacturer
+from .models import Category, Medicine, Batch, ActiveIngredient, Supplier, Manufacturer, StockMovement
 
 
 @register(Category)
@@ -68,4 +69,22 @@ class ManufacturerAdmin(admin.ModelAdmin):
     """Admin interface for Manufacturer model with country filtering."""
     list_display = ['name', 'phone_number', 'country', 'website']
     search_fields = ['name', 'phone_number', 'website']
-    list_filter = ['country']
\ No newline at end of file
+    list_filter = ['country']
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Read-only admin interface for the append-only stock ledger."""
+    list_display = ['batch', 'delta', 'reason', 'user', 'created']
+    list_filter = ['reason', 'created']
+    search_fields = ['batch__barcode', 'batch__medicine__name']
+    list_select_related = ['batch', 'user']
+    raw_id_fields = ['batch']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,120 @@
+"""
+FEFO Batch Allocation
+
+Draws a quantity of a medicine from its non-expired batches, first expiry
+first out, so sales can be made by medicine instead of by batch barcode. A
+line may be split across several batches.
+
+Each allocation round is a single ordered query: a window function computes
+the running stock of earlier-expiring batches, only the batches needed to
+cover the remaining quantity are selected, and those rows are locked with
+`SELECT ... FOR UPDATE SKIP LOCKED`. Rows held by concurrent sales are
+skipped; when that leaves the line short, a further round locks the next
+free batches in expiry order.
+
+Callers must run `allocate` inside `transaction.atomic()` and write the
+decrements in the same transaction, so the locks cover the whole sale.
+
+Classes:
+    - Allocation: Quantity drawn from one batch
+
+Raises medicine.stock.InsufficientStock when free sellable stock can't
+cover a line.
+
+Functions:
+    - allocate: Lock and split a quantity across batches in FEFO order
+"""
+
+from django.db.models import F, Sum, Value, Window
+from django.db.models.expressions import RowRange
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from medicine.models import Batch
+from medicine.stock import InsufficientStock
+
+
+class Allocation:
+    """
+    Quantity drawn from one batch.
+
+    Attributes:
+        batch (Batch): The locked batch, loaded after the lock was taken
+        quantity (int): Units drawn from it
+    """
+
+    def __init__(self, batch, quantity):
+        self.batch = batch
+        self.quantity = quantity
+
+    def __repr__(self):
+        return f"Allocation(batch={self.batch.pk}, quantity={self.quantity})"
+
+
+def sellable_batches(medicine_id):
+    """Non-empty, non-expired batches of a medicine."""
+    return Batch.objects.filter(
+        medicine_id=medicine_id,
+        expiry_date__gt=now().date(),
+        stock_units__gt=0,
+    )
+
+
+def needed_batches(medicine_id, quantity):
+    """
+    Ids of the earliest-expiring batches that together cover `quantity`.
+
+    A batch is needed while the stock of the batches expiring before it is
+    still below the quantity.
+    """
+    stock_before = Window(
+        Sum("stock_units"),
+        order_by=[F("expiry_date").asc(), F("id").asc()],
+        frame=RowRange(start=None, end=-1),
+    )
+    return sellable_batches(medicine_id)\
+        .annotate(stock_before=Coalesce(stock_before, Value(0)))\
+        .filter(stock_before__lt=quantity)\
+        .values("pk")
+
+
+def allocate(medicine_id, quantity, round_size=10):
+    """
+    Lock batches of a medicine and split `quantity` across them in FEFO order.
+
+    Args:
+        medicine_id (int): Medicine to draw from
+        quantity (int): Units to allocate
+        round_size (int): Batches locked per fallback round under contention
+
+    Returns:
+        list[Allocation]: Allocations in expiry order; their quantities sum to `quantity`
+
+    Raises:
+        InsufficientStock: When free sellable batches can't cover the quantity
+    """
+    def lock(batches):
+        # the medicine is read for pricing but only batch rows are locked
+        return batches.select_related("medicine")\
+            .select_for_update(skip_locked=True, of=("self",))\
+            .order_by("expiry_date", "id")
+
+    allocations = []
+    remaining = quantity
+    seen = []
+    # first round: exactly the batches needed; later rounds: next free batches
+    batches = lock(sellable_batches(medicine_id).filter(pk__in=needed_batches(medicine_id, quantity)))
+    fallback = False
+    while remaining > 0:
+        batches = list(batches)
+        if not batches and fallback:
+            raise InsufficientStock(quantity, quantity - remaining, medicine_id=medicine_id)
+        for batch in batches:
+            seen.append(batch.pk)
+            if remaining and batch.stock_units:
+                taken = min(batch.stock_units, remaining)
+                allocations.append(Allocation(batch, taken))
+                remaining -= taken
+        batches = lock(sellable_batches(medicine_id).exclude(pk__in=seen))[:round_size]
+        fallback = True
+    return allocations
@@ -0,0 +1,291 @@
+"""
+Barcode Resolution
+
+Resolves a scanned barcode to the batch and medicine it belongs to, together
+with the unit price, stock and expiry needed at the point of sale.
+
+Both `Batch.barcode` and `Medicine.international_barcode` are accepted. A
+medicine barcode resolves to the medicine's first-expiring sellable batch.
+
+Lookups go through two cache layers:
+    - a small in-process LRU (per worker, short TTL) for repeated scans
+    - the Django cache backend, shared between workers
+
+Entries are invalidated from `medicine.signals` whenever a Batch or Medicine
+is saved or deleted, once the writing transaction commits: dropping them
+earlier would let a concurrent lookup cache the rows as they were before the
+commit, and keep serving them for `BARCODE_CACHE_TIMEOUT`. Other workers'
+LRUs expire within `BARCODE_LRU_TTL`.
+
+Classes:
+    - LRUCache: Thread-safe in-process LRU with per-entry expiry
+    - BarcodeMatch: Resolved batch/medicine pair with sale-time details
+    - BarcodeResolver: Cached barcode lookups and invalidation
+
+Functions:
+    - resolve_barcode: Resolve one barcode with the shared resolver
+    - resolve_barcodes: Resolve many barcodes with at most one query per kind
+    - invalidate_barcodes: Drop barcodes from both cache layers
+    - invalidate_batch_barcodes: Drop batches' barcodes and their medicines' barcodes
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.timezone import now
+
+from medicine.models import Batch, Medicine
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache with a time-to-live per entry.
+
+    Attributes:
+        maxsize (int): Maximum number of entries kept
+        ttl (float): Seconds an entry stays valid
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Medicine columns carried in cache entries; the search vector is never needed.
+MEDICINE_FIELDS = [
+    field.attname for field in Medicine._meta.concrete_fields
+    if field.name != "search_vector"
+]
+BATCH_FIELDS = [field.attname for field in Batch._meta.concrete_fields]
+
+
+class BarcodeMatch:
+    """
+    Result of a barcode lookup.
+
+    Model instances are rebuilt from plain cached values on every lookup, so
+    callers may modify or save them without affecting other lookups.
+
+    Attributes:
+        barcode (str): The scanned barcode
+        kind (str): 'batch' for a batch barcode, 'medicine' for an international barcode
+        medicine (Medicine): The matched medicine
+        batch (Batch | None): The matched batch, or the first-expiring sellable batch
+        stock_units (int): Units in the batch, or sellable units of the medicine
+    """
+
+    def __init__(self, barcode, entry):
+        self.barcode = barcode
+        self.kind = entry["kind"]
+        self.medicine = Medicine.from_db(None, MEDICINE_FIELDS, entry["medicine"])
+        self.batch = None
+        if entry["batch"] is not None:
+            self.batch = Batch.from_db(None, BATCH_FIELDS, entry["batch"])
+            self.batch.medicine = self.medicine
+        self.stock_units = entry["stock_units"]
+
+    @property
+    def unit_price(self):
+        return self.medicine.unit_price
+
+    @property
+    def expiry_date(self):
+        return self.batch.expiry_date if self.batch else None
+
+    @property
+    def is_expired(self):
+        return self.batch.is_expired if self.batch else False
+
+    @property
+    def stock(self):
+        """Stock in 'packs:units' format."""
+        packs = self.stock_units // self.medicine.units_per_pack
+        units = self.stock_units % self.medicine.units_per_pack
+        return f"{packs}:{units}"
+
+
+class BarcodeResolver:
+    """
+    Resolves barcodes through an in-process LRU in front of the Django cache.
+
+    Attributes:
+        key_prefix (str): Prefix of shared cache keys
+        timeout (int): Seconds entries live in the shared cache
+    """
+    key_prefix = "barcode:"
+
+    def __init__(self, maxsize, ttl, timeout):
+        self.local = LRUCache(maxsize, ttl)
+        self.timeout = timeout
+
+    def cache_key(self, barcode):
+        return f"{self.key_prefix}{barcode}"
+
+    def resolve(self, barcode):
+        """Resolve one barcode, returning a BarcodeMatch or None."""
+        return self.resolve_many([barcode]).get(barcode)
+
+    def resolve_many(self, barcodes):
+        """
+        Resolve several barcodes at once.
+
+        Cache misses are loaded with one query for batch barcodes and, for the
+        remainder, one aggregate query plus one batch query for medicine barcodes.
+
+        Returns:
+            dict: Maps each resolvable barcode to its BarcodeMatch
+        """
+        barcodes = {str(barcode) for barcode in barcodes if barcode}
+        entries = {}
+        for barcode in barcodes:
+            entry = self.local.get(barcode)
+            if entry is not None:
+                entries[barcode] = entry
+
+        missing = barcodes - entries.keys()
+        if missing:
+            shared = cache.get_many([self.cache_key(barcode) for barcode in missing])
+            for barcode in missing:
+                entry = shared.get(self.cache_key(barcode))
+                if entry is not None:
+                    entries[barcode] = entry
+                    self.local.set(barcode, entry)
+
+        missing = barcodes - entries.keys()
+        if missing:
+            loaded = self.load(missing)
+            cache.set_many(
+                {self.cache_key(barcode): entry for barcode, entry in loaded.items()},
+                self.timeout,
+            )
+            for barcode, entry in loaded.items():
+                self.local.set(barcode, entry)
+            entries.update(loaded)
+
+        return {barcode: BarcodeMatch(barcode, entry) for barcode, entry in entries.items()}
+
+    def load(self, barcodes):
+        """Load cache entries for barcodes from the database."""
+        entries = {}
+        batches = Batch.objects.select_related("medicine").filter(barcode__in=barcodes)
+        for batch in batches:
+            entries[batch.barcode] = {
+                "kind": "batch",
+                "batch": [getattr(batch, name) for name in BATCH_FIELDS],
+                "medicine": [getattr(batch.medicine, name) for name in MEDICINE_FIELDS],
+                "stock_units": batch.stock_units,
+            }
+
+        remaining = set(barcodes) - entries.keys()
+        if not remaining:
+            return entries
+
+        medicines = Medicine.objects.with_stock().defer("search_vector")\
+            .filter(international_barcode__in=remaining)
+        medicines = {medicine.id: medicine for medicine in medicines}
+        if not medicines:
+            return entries
+
+        first_batches = {}
+        sellable = Batch.objects.filter(
+            medicine_id__in=medicines,
+            expiry_date__gt=now().date(),
+            stock_units__gt=0,
+        ).order_by("medicine_id", "expiry_date", "id")
+        for batch in sellable:
+            first_batches.setdefault(batch.medicine_id, batch)
+
+        for medicine in medicines.values():
+            batch = first_batches.get(medicine.id)
+            entries[medicine.international_barcode] = {
+                "kind": "medicine",
+                "batch": [getattr(batch, name) for name in BATCH_FIELDS] if batch else None,
+                "medicine": [getattr(medicine, name) for name in MEDICINE_FIELDS],
+                "stock_units": medicine.unexpired_units,
+            }
+        return entries
+
+    def invalidate(self, *barcodes):
+        """Drop barcodes from the local LRU and the shared cache."""
+        barcodes = [str(barcode) for barcode in barcodes if barcode]
+        for barcode in barcodes:
+            self.local.delete(barcode)
+        cache.delete_many([self.cache_key(barcode) for barcode in barcodes])
+
+    def clear(self):
+        """Empty the local LRU (the shared cache expires on its own)."""
+        self.local.clear()
+
+
+resolver = BarcodeResolver(
+    maxsize=getattr(settings, "BARCODE_LRU_SIZE", 2048),
+    ttl=getattr(settings, "BARCODE_LRU_TTL", 10),
+    timeout=getattr(settings, "BARCODE_CACHE_TIMEOUT", 300),
+)
+
+
+def resolve_barcode(barcode):
+    """Resolve a batch or international barcode. Returns a BarcodeMatch or None."""
+    return resolver.resolve(barcode)
+
+
+def resolve_barcodes(barcodes):
+    """Resolve several barcodes, returning a dict of barcode to BarcodeMatch."""
+    return resolver.resolve_many(barcodes)
+
+
+def invalidate_barcodes(*barcodes):
+    """Invalidate cached lookups for the given barcodes once the current transaction commits."""
+    transaction.on_commit(lambda: resolver.invalidate(*barcodes))
+
+
+def invalidate_batch_barcodes(*batches):
+    """
+    Drop the batches' barcodes and their medicines' barcodes, whose stock and first batch may change.
+
+    Medicines not loaded on the batches are read with one query; the
+    barcodes are dropped together once the current transaction commits.
+    """
+    barcodes = {batch.barcode for batch in batches}
+    unloaded = set()
+    for batch in batches:
+        if Batch.medicine.is_cached(batch):
+            barcodes.add(batch.medicine.international_barcode)
+        else:
+            unloaded.add(batch.medicine_id)
+    if unloaded:
+        barcodes.update(Medicine.objects.filter(pk__in=unloaded).values_list("international_barcode", flat=True))
+    invalidate_barcodes(*barcodes)
@@ -0,0 +1,79 @@
+"""
+Category Tree
+
+Nested view of the MPTT category hierarchy, served from the Django cache.
+
+The tree is built from a single query ordered by (tree_id, lft), which is
+exactly the depth-first order of the nested output, so each node can be
+attached to its parent with a simple stack. The cached tree is dropped from
+`medicine.signals` whenever a Category is saved or deleted.
+
+Functions:
+    - build_category_tree: Build the nested tree from the database
+    - get_category_tree: Return the cached tree, building it on a miss
+    - invalidate_category_tree: Drop the cached tree
+    - descendants_filter: Q matching medicines in a category's subtree
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from medicine.models import Category
+
+
+CACHE_KEY = "categories:tree"
+
+
+def build_category_tree():
+    """
+    Build the nested category tree with one query.
+
+    Returns:
+        list[dict]: Root nodes, each with id, name and nested children
+    """
+    roots = []
+    path = []
+    rows = Category.objects.order_by("tree_id", "lft").values_list("id", "name", "level")
+    for category_id, name, level in rows:
+        node = {"id": category_id, "name": name, "children": []}
+        del path[level:]
+        (path[-1]["children"] if path else roots).append(node)
+        path.append(node)
+    return roots
+
+
+def get_category_tree():
+    """Return the cached nested category tree, building and caching it on a miss."""
+    tree = cache.get(CACHE_KEY)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(CACHE_KEY, tree, getattr(settings, "CATEGORY_TREE_CACHE_TIMEOUT", 3600))
+    return tree
+
+
+def invalidate_category_tree():
+    """Drop the cached tree once the current transaction commits; the next request rebuilds it."""
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY))
+
+
+def descendants_filter(category_id, prefix="category__"):
+    """
+    Build a Q matching rows whose category is `category_id` or one of its descendants.
+
+    Uses the node's MPTT (tree_id, lft, rght) range, so the subtree costs a
+    single indexed range condition instead of recursive lookups.
+
+    Returns:
+        Q | None: The range condition, or None when the category doesn't exist
+    """
+    bounds = Category.objects.filter(pk=category_id).values_list("tree_id", "lft", "rght").first()
+    if bounds is None:
+        return None
+    tree_id, lft, rght = bounds
+    return Q(**{
+        f"{prefix}tree_id": tree_id,
+        f"{prefix}lft__gte": lft,
+        f"{prefix}rght__lte": rght,
+    })
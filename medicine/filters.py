@@ -0,0 +1,56 @@
+"""
+FilterSet for filtering and sorting medicine listings.
+
+Availability and stock sorts read the stored `Medicine.is_available` and
+`Medicine.sellable_units` columns, which are indexed, instead of
+aggregating batches per row. The category filter matches the whole subtree
+through MPTT ranges.
+"""
+
+import django_filters
+from medicine.categories import descendants_filter
+from medicine.models import Medicine
+
+
+class MedicineFilter(django_filters.FilterSet):
+    """
+    FilterSet for filtering Medicine objects.
+
+    Provides an availability filter, a category filter including descendant
+    categories, and an ordering by name or stored stock.
+    Ordering applies to page-number pagination; cursor pages always follow
+    (name, id).
+    """
+    orderings = {
+        "name": ("name", "id"),
+        "stock": ("sellable_units", "id"),
+        "-stock": ("-sellable_units", "-id"),
+    }
+
+    available = django_filters.BooleanFilter(
+        field_name="is_available",
+        label="Has non-expired stock"
+    )
+    category = django_filters.NumberFilter(
+        method="filter_category",
+        label="Category id (includes its subcategories)"
+    )
+    ordering = django_filters.ChoiceFilter(
+        choices=[(key, key) for key in orderings],
+        method="order",
+        label="Order by name, stock or -stock"
+    )
+
+    class Meta:
+        """Metadata for the MedicineFilter."""
+        model = Medicine
+        fields = ["available", "category", "ordering"]
+
+    def filter_category(self, queryset, name, value):
+        condition = descendants_filter(int(value))
+        if condition is None:
+            return queryset.none()
+        return queryset.filter(condition)
+
+    def order(self, queryset, name, value):
+        return queryset.order_by(*self.orderings[value])
@@ -0,0 +1,259 @@
+"""
+Medicine Bulk Import
+
+Streaming import of medicine catalogs from CSV or JSONL, shared by the
+`import_medicines` management command and the medicine import endpoint.
+
+Rows are parsed lazily and processed in fixed-size chunks, so memory stays
+flat regardless of file size. For every chunk:
+    - rows are validated with MedicineImportRowSerializer
+    - active ingredient, category and manufacturer names are resolved through
+      preloaded dictionaries; missing ones are created with bulk_create
+    - medicines are upserted with one bulk_create keyed on international_barcode
+
+New categories are inserted as complete root trees of their own, so the
+category tree stays valid after every chunk; roots are put back in name
+order by a single MPTT rebuild once the last chunk is imported.
+
+Expected columns: name, international_barcode, active_ingredient, category,
+manufacturer, units_per_pack, price, and optionally manufacturer_country.
+
+Classes:
+    - ChunkReport: Outcome and throughput of one processed chunk
+    - MedicineImporter: Chunked validation and upsert pipeline
+
+Functions:
+    - iter_rows: Lazily parse CSV or JSONL rows from a text stream
+"""
+
+import csv
+import json
+import time
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Max
+
+from medicine.barcodes import invalidate_barcodes
+from medicine.categories import invalidate_category_tree
+from medicine.models import ActiveIngredient, Batch, Category, Manufacturer, Medicine
+from medicine.serializers import MedicineImportRowSerializer
+from medicine.similars import invalidate_alternatives
+
+
+FORMATS = ("csv", "jsonl")
+
+
+def iter_rows(stream, fmt):
+    """
+    Lazily yield row dictionaries from a text stream.
+
+    Args:
+        stream: Text file-like object
+        fmt (str): 'csv' or 'jsonl'
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "jsonl":
+        for line in stream:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield {"__error__": "Invalid JSON line"}
+    else:
+        raise ValueError(f"Unsupported format {fmt!r}, expected one of {FORMATS}")
+
+
+class ChunkReport:
+    """
+    Outcome of one imported chunk.
+
+    Attributes:
+        number (int): 1-based chunk index
+        rows (int): Rows read in the chunk
+        created (int): Medicines inserted
+        updated (int): Existing medicines updated
+        errors (list): (row number, errors) for rejected rows
+        seconds (float): Wall time spent on the chunk
+    """
+
+    def __init__(self, number, rows, created, updated, errors, seconds):
+        self.number = number
+        self.rows = rows
+        self.created = created
+        self.updated = updated
+        self.errors = errors
+        self.seconds = seconds
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else float(self.rows)
+
+    def __str__(self):
+        return (
+            f"Chunk {self.number}: {self.rows} rows "
+            f"({self.created} created, {self.updated} updated, {len(self.errors)} errors) "
+            f"in {self.seconds:.2f}s, {self.rows_per_second:.0f} rows/s"
+        )
+
+
+class MedicineImporter:
+    """
+    Chunked medicine import pipeline.
+
+    Attributes:
+        chunk_size (int): Rows validated and written per transaction
+        ingredients (dict): Active ingredient name -> id
+        categories (dict): Category name -> id
+        manufacturers (dict): Manufacturer name -> id
+        created_categories (bool): Whether any chunk created a category
+    """
+    update_fields = [
+        "name",
+        "active_ingredient",
+        "category",
+        "manufacturer",
+        "units_per_pack",
+        "price",
+        "modified",
+    ]
+
+    def __init__(self, chunk_size=500):
+        self.chunk_size = chunk_size
+        self.ingredients = dict(ActiveIngredient.objects.values_list("name", "id"))
+        self.categories = dict(Category.objects.values_list("name", "id"))
+        self.manufacturers = dict(Manufacturer.objects.values_list("name", "id"))
+        self.created_categories = False
+
+    def run(self, rows):
+        """Import rows chunk by chunk, yielding a ChunkReport after each one."""
+        rows = iter(rows)
+        offset = 0
+        number = 0
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            number += 1
+            started = time.perf_counter()
+            with transaction.atomic():
+                created, updated, errors = self.import_chunk(chunk, offset)
+            yield ChunkReport(
+                number, len(chunk), created, updated, errors,
+                time.perf_counter() - started,
+            )
+            offset += len(chunk)
+        if self.created_categories:
+            with transaction.atomic():
+                Category.objects.rebuild()
+            invalidate_category_tree()
+
+    def import_chunk(self, chunk, offset):
+        """Validate and upsert one chunk. Returns (created, updated, errors)."""
+        errors = []
+        valid = {}
+        for index, row in enumerate(chunk, start=offset + 1):
+            if "__error__" in row:
+                errors.append((index, {"row": [row["__error__"]]}))
+                continue
+            serializer = MedicineImportRowSerializer(data=row)
+            if not serializer.is_valid():
+                errors.append((index, serializer.errors))
+                continue
+            # a barcode repeated within the chunk keeps its last row
+            valid[serializer.validated_data["international_barcode"]] = (index, serializer.validated_data)
+
+        valid = self.reject_name_conflicts(valid, errors)
+        if not valid:
+            return 0, 0, errors
+
+        rows = [data for _, data in valid.values()]
+        self.create_missing(ActiveIngredient, self.ingredients, {row["active_ingredient"] for row in rows})
+        self.create_missing(Manufacturer, self.manufacturers, {row["manufacturer"] for row in rows},
+                            defaults={row["manufacturer"]: {"country": row.get("manufacturer_country", "")} for row in rows})
+        self.create_missing_categories({row["category"] for row in rows})
+
+        barcodes = list(valid)
+        existing = set(
+            Medicine.objects.filter(international_barcode__in=barcodes)
+            .values_list("international_barcode", flat=True)
+        )
+        Medicine.objects.bulk_create(
+            [
+                Medicine(
+                    international_barcode=row["international_barcode"],
+                    name=row["name"],
+                    active_ingredient_id=self.ingredients[row["active_ingredient"]],
+                    category_id=self.categories[row["category"]],
+                    manufacturer_id=self.manufacturers[row["manufacturer"]],
+                    units_per_pack=row["units_per_pack"],
+                    price=row["price"],
+                )
+                for row in rows
+            ],
+            update_conflicts=True,
+            unique_fields=["international_barcode"],
+            update_fields=self.update_fields,
+        )
+
+        imported = Medicine.objects.filter(international_barcode__in=barcodes)
+        imported.refresh_search_vector()
+        invalidate_alternatives()
+        if existing:
+            batch_barcodes = Batch.objects.filter(medicine__international_barcode__in=existing)\
+                .values_list("barcode", flat=True)
+            invalidate_barcodes(*existing, *batch_barcodes)
+
+        return len(barcodes) - len(existing), len(existing), errors
+
+    def reject_name_conflicts(self, valid, errors):
+        """Drop rows whose unique name belongs to another barcode, in the chunk or the database."""
+        owners = dict(
+            Medicine.objects.filter(name__in=[data["name"] for _, data in valid.values()])
+            .values_list("name", "international_barcode")
+        )
+        accepted = {}
+        for barcode, (index, data) in valid.items():
+            owner = owners.setdefault(data["name"], barcode)
+            if owner != barcode:
+                errors.append((index, {"name": [f"Medicine name is already used by barcode {owner}."]}))
+                continue
+            accepted[barcode] = (index, data)
+        return accepted
+
+    def create_missing(self, model, lookup, names, defaults=None):
+        """Bulk create named records missing from `lookup` and add their ids to it."""
+        missing = names - lookup.keys()
+        if not missing:
+            return
+        defaults = defaults or {}
+        model.objects.bulk_create(
+            [model(name=name, **defaults.get(name, {})) for name in missing],
+            ignore_conflicts=True,
+        )
+        lookup.update(model.objects.filter(name__in=missing).values_list("name", "id"))
+
+    def create_missing_categories(self, names):
+        """
+        Bulk create missing categories as root nodes, each in a new tree.
+
+        Their tree fields are set directly instead of rebuilding the whole
+        tree for every chunk; `run` rebuilds once at the end to order the
+        roots by name.
+        """
+        missing = names - self.categories.keys()
+        if not missing:
+            return
+        last_tree = Category.objects.aggregate(last=Max("tree_id"))["last"] or 0
+        Category.objects.bulk_create(
+            [
+                Category(name=name, lft=1, rght=2, tree_id=tree_id, level=0)
+                for tree_id, name in enumerate(sorted(missing), start=last_tree + 1)
+            ],
+            ignore_conflicts=True,
+        )
+        self.created_categories = True
+        invalidate_category_tree()
+        self.categories.update(Category.objects.filter(name__in=missing).values_list("name", "id"))
@@ -0,0 +1,56 @@
+"""
+Management command importing a medicine catalog from a CSV or JSONL file.
+
+Usage:
+    python manage.py import_medicines catalog.csv
+    python manage.py import_medicines catalog.jsonl --chunk-size 1000
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from medicine.importers import FORMATS, MedicineImporter, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or JSONL medicine catalog into the database in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the .csv or .jsonl file")
+        parser.add_argument("--format", choices=FORMATS, help="File format (default: from extension)")
+        parser.add_argument("--chunk-size", type=int, default=500, help="Rows per transaction")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or path.rsplit(".", 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Cannot infer the format of {path}, use --format.")
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        totals = {"rows": 0, "created": 0, "updated": 0, "errors": 0}
+        started = time.perf_counter()
+        try:
+            stream = open(path, newline="", encoding="utf-8-sig")
+        except OSError as error:
+            raise CommandError(str(error))
+
+        with stream:
+            importer = MedicineImporter(chunk_size=options["chunk_size"])
+            for report in importer.run(iter_rows(stream, fmt)):
+                self.stdout.write(str(report))
+                for row, errors in report.errors:
+                    self.stderr.write(f"  row {row}: {errors}")
+                totals["rows"] += report.rows
+                totals["created"] += report.created
+                totals["updated"] += report.updated
+                totals["errors"] += len(report.errors)
+
+        elapsed = time.perf_counter() - started
+        rate = totals["rows"] / elapsed if elapsed else totals["rows"]
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {totals['rows']} rows ({totals['created']} created, "
+            f"{totals['updated']} updated, {totals['errors']} errors) "
+            f"in {elapsed:.2f}s, {rate:.0f} rows/s"
+        ))
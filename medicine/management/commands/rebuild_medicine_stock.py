@@ -0,0 +1,42 @@
+"""
+Management command rebuilding stored medicine stock from batches.
+
+Medicine.sellable_units and Medicine.is_available are maintained
+incrementally on every batch write. Batches that expire don't write
+anything, so this command should run daily to roll them over; it also
+repairs drift after raw SQL or bulk writes that bypass the model.
+
+Usage:
+    python manage.py rebuild_medicine_stock
+    python manage.py rebuild_medicine_stock --verify
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from medicine.models import Medicine
+
+
+class Command(BaseCommand):
+    help = "Recompute Medicine.sellable_units and is_available from batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify", action="store_true",
+            help="Only report medicines whose stored stock is out of date; fail if any are",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            updated = Medicine.objects.rebuild_stock()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt stored stock of {updated} medicines."))
+            return
+
+        stale = Medicine.objects.stale_stock().order_by("id")\
+            .values_list("id", "name", "sellable_units", "unexpired_units")
+        count = 0
+        for medicine_id, name, stored, actual in stale.iterator():
+            count += 1
+            self.stdout.write(f"#{medicine_id} {name}: stored {stored}, batches {actual}")
+        if count:
+            raise CommandError(f"{count} medicines have out of date stored stock.")
+        self.stdout.write(self.style.SUCCESS("Stored stock matches batches."))
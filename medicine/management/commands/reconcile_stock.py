@@ -0,0 +1,30 @@
+"""
+Management command comparing the stock ledger with batch stock.
+
+The sum of a batch's StockMovement deltas must equal its stock_units. Any
+batch where they differ was changed without going through medicine.stock or
+Batch.save (raw SQL, queryset updates) and is reported.
+
+Usage:
+    python manage.py reconcile_stock
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from medicine.models import Batch
+
+
+class Command(BaseCommand):
+    help = "Report batches whose stock_units differ from the sum of their stock movements."
+
+    def handle(self, *args, **options):
+        mismatched = Batch.objects.with_ledger_units().exclude(ledger_units=F("stock_units"))\
+            .order_by("id").values_list("id", "barcode", "stock_units", "ledger_units")
+        count = 0
+        for batch_id, barcode, units, ledger in mismatched.iterator():
+            count += 1
+            self.stdout.write(f"#{batch_id} {barcode}: stock {units}, ledger {ledger}")
+        if count:
+            raise CommandError(f"{count} batches don't match the stock ledger.")
+        self.stdout.write(self.style.SUCCESS("Batch stock matches the stock ledger."))
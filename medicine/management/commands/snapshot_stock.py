@@ -0,0 +1,43 @@
+"""
+Management command writing a stock snapshot of every batch.
+
+Point-in-time stock (BatchQuerySet.with_stock_as_of) starts from the latest
+snapshot and only replays the movements recorded after it, so this command
+should run daily to keep that replay short.
+
+Usage:
+    python manage.py snapshot_stock
+    python manage.py snapshot_stock --chunk-size 5000
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+
+from medicine.models import Batch, StockSnapshot
+
+
+class Command(BaseCommand):
+    help = "Record the current stock of every batch as a snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=2000,
+            help="Snapshots inserted per query (default: 2000)",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        taken_at = now()
+        snapshots = []
+        count = 0
+        # one transaction so no movement lands between two batches' snapshots
+        with transaction.atomic():
+            batches = Batch.objects.values_list("id", "stock_units")
+            for batch_id, units in batches.iterator(chunk_size=chunk_size):
+                snapshots.append(StockSnapshot(batch_id=batch_id, taken_at=taken_at, stock_units=units))
+                if len(snapshots) == chunk_size:
+                    count += len(StockSnapshot.objects.bulk_create(snapshots))
+                    snapshots = []
+            count += len(StockSnapshot.objects.bulk_create(snapshots))
+        self.stdout.write(self.style.SUCCESS(f"Snapshotted stock of {count} batches at {taken_at:%Y-%m-%d %H:%M}."))
@@ -0,0 +1,30 @@
+"""
+Medicine Middleware
+
+Classes:
+    - StockUserMiddleware: Attribute stock movements made during a request to its user
+"""
+
+from django.utils.functional import SimpleLazyObject
+
+from medicine.models import stock_user
+
+
+class StockUserMiddleware:
+    """
+    Make the requesting user the author of stock movements recorded while
+    handling the request.
+
+    The user is read lazily, when the first movement is recorded, so users
+    authenticated by DRF inside the view (tokens, JWT) are picked up too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = stock_user.set(SimpleLazyObject(lambda: request.user))
+        try:
+            return self.get_response(request)
+        finally:
+            stock_user.reset(token)
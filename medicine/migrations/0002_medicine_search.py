@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-18 00:36
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+# GIN indexes backing medicine search. They only exist on PostgreSQL; other
+# backends use the icontains fallback in medicine.search.
+SEARCH_INDEXES = [
+    ("medicine_medicine_search_vector_gin", "medicine_medicine", "search_vector"),
+    ("medicine_medicine_name_trgm", "medicine_medicine", "name gin_trgm_ops"),
+    ("medicine_activeingredient_name_trgm", "medicine_activeingredient", "name gin_trgm_ops"),
+    ("medicine_category_name_trgm", "medicine_category", "name gin_trgm_ops"),
+    ("medicine_manufacturer_name_trgm", "medicine_manufacturer", "name gin_trgm_ops"),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column})"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _, _ in SEARCH_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def populate_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        """
+        UPDATE medicine_medicine AS m SET search_vector =
+            setweight(to_tsvector('simple', coalesce(m.name, '')), 'A')
+            || setweight(to_tsvector('simple', coalesce(ai.name, '')), 'B')
+            || setweight(to_tsvector('simple', coalesce(c.name, '')), 'C')
+            || setweight(to_tsvector('simple', coalesce(mf.name, '')), 'C')
+        FROM medicine_activeingredient AS ai, medicine_category AS c, medicine_manufacturer AS mf
+        WHERE ai.id = m.active_ingredient_id
+          AND c.id = m.category_id
+          AND mf.id = m.manufacturer_id
+        """
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicine', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='medicine',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 00:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicine', '0002_medicine_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='batch',
+            index=models.Index(fields=['medicine', 'expiry_date', 'id'], name='batch_medicine_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-18 00:55
+
+from django.db import migrations, models
+from django.db.models import Case, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan
+from django.utils.timezone import now
+
+
+def populate_stored_stock(apps, schema_editor):
+    Batch = apps.get_model("medicine", "Batch")
+    Medicine = apps.get_model("medicine", "Medicine")
+    units = Coalesce(
+        Subquery(
+            Batch.objects.filter(medicine=OuterRef("pk"), expiry_date__gt=now().date())
+            .values("medicine").annotate(total=Sum("stock_units")).values("total")
+        ),
+        Value(0),
+    )
+    Medicine.objects.update(
+        sellable_units=units,
+        is_available=Case(When(GreaterThan(units, 0), then=Value(True)), default=Value(False)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicine', '0003_batch_medicine_expiry_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicine',
+            name='is_available',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='medicine',
+            name='sellable_units',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['is_available', 'name', 'id'], name='medicine_available_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicine',
+            index=models.Index(fields=['sellable_units', 'id'], name='medicine_sellable_idx'),
+        ),
+        migrations.RunPython(populate_stored_stock, migrations.RunPython.noop),
+    ]
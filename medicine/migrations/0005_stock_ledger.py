@@ -0,0 +1,63 @@
+# Generated by Django 5.2 on 2026-10-18 01:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.timezone import now
+
+
+def record_opening_balances(apps, schema_editor):
+    """Open the ledger with each batch's current stock so ledger sums match stock_units."""
+    Batch = apps.get_model("medicine", "Batch")
+    StockMovement = apps.get_model("medicine", "StockMovement")
+    opened = now()
+    batches = Batch.objects.filter(stock_units__gt=0).values_list("id", "stock_units")
+    movements = []
+    for batch_id, units in batches.iterator(chunk_size=2000):
+        movements.append(StockMovement(batch_id=batch_id, delta=units, reason="opening", created=opened))
+        if len(movements) == 2000:
+            StockMovement.objects.bulk_create(movements)
+            movements = []
+    StockMovement.objects.bulk_create(movements)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('medicine', '0004_medicine_stored_stock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('opening', 'Opening balance'), ('receiving', 'Receiving'), ('order', 'Purchase order'), ('sale', 'Sale'), ('refund', 'Refund'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('source_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='medicine.batch')),
+                ('source_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='contenttypes.contenttype')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_movements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['batch', 'created'], name='movement_batch_created_idx'), models.Index(fields=['source_type', 'source_id'], name='movement_source_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('stock_units', models.PositiveIntegerField()),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='medicine.batch')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('batch', 'taken_at'), name='unique_batch_snapshot')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
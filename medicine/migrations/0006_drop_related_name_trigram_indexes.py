@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+# Search only runs trigram matching on Medicine.name; related names are
+# matched through search_vector, so these indexes only cost writes.
+UNUSED_INDEXES = [
+    ("medicine_activeingredient_name_trgm", "medicine_activeingredient"),
+    ("medicine_category_name_trgm", "medicine_category"),
+    ("medicine_manufacturer_name_trgm", "medicine_manufacturer"),
+]
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in UNUSED_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table in UNUSED_INDEXES:
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (name gin_trgm_ops)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicine', '0005_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_indexes, create_indexes),
+    ]
@@ -6,15 +6,30 @@ including suppliers, manufacturers, categories, medicines, and batches.
 
 Models:
     - TimeStampedModel: Abstract base model with created/modified timestamps
+    - MedicineSearchSourceMixin: Keeps medicine search vectors in sync with related names
     - Supplier: Entity that provides medicines to the pharmacy
     - Manufacturer: Company that produces medicines
     - Category: Hierarchical classification for medicines (using MPTT)
     - ActiveIngredient: The active pharmaceutical ingredient in medicines
+    - MedicineQuerySet: Queryset helpers for stock aggregation and stored stock maintenance
     - Medicine: The main product model representing a specific medication
+    - BatchQuerySet: Queryset helpers for bulk batch creation and point-in-time stock
     - Batch: Inventory lot tracking for medicines with expiry dates
+    - StockMovement: Append-only ledger of batch stock changes
+    - StockSnapshot: Periodic copy of batch stock for point-in-time queries
 """
 
-from django.db import models
+import datetime
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, connections, transaction
+from django.db.models import Sum, Case, When, F, Q, Value, Prefetch, OuterRef, Subquery
+from django.db.models.lookups import GreaterThan
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db.models.functions import Coalesce, Greatest
 from mptt.models import MPTTModel, TreeForeignKey
 from django.core.exceptions import ValidationError
 from django.utils.timezone import now
@@ -44,6 +59,28 @@ class TimeStampedModel(models.Model):
         abstract = True
 
 
+class MedicineSearchSourceMixin:
+    """
+    Mixin for models whose name is embedded in `Medicine.search_vector`.
+
+    Renaming an existing record refreshes the search vectors of its medicines
+    with a single set-based UPDATE; saves that keep the name skip it.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._synced_name = instance.__dict__.get("name")
+        return instance
+
+    def save(self, *args, **kwargs):
+        renamed = not self._state.adding and getattr(self, "_synced_name", None) != self.name
+        super().save(*args, **kwargs)
+        self._synced_name = self.name
+        if renamed:
+            self.medicines.refresh_search_vector()
+
+
 class Supplier(TimeStampedModel):
     """
     Represents a supplier who provides medicines to the pharmacy.
@@ -67,7 +104,7 @@ class Supplier(TimeStampedModel):
         return str(self.name)
 
 
-class Manufacturer(TimeStampedModel):
+class Manufacturer(MedicineSearchSourceMixin, TimeStampedModel):
     """
     Represents a pharmaceutical company that manufactures medicines.
     
@@ -92,7 +129,7 @@ class Manufacturer(TimeStampedModel):
         return str(self.name)
 
 
-class Category(MPTTModel):
+class Category(MedicineSearchSourceMixin, MPTTModel):
     """
     Hierarchical category system for organizing medicines using Modified Preorder Tree Traversal.
     
@@ -116,7 +153,7 @@ class Category(MPTTModel):
         return self.name
 
 
-class ActiveIngredient(TimeStampedModel):
+class ActiveIngredient(MedicineSearchSourceMixin, TimeStampedModel):
     """
     The active pharmaceutical ingredient (API) in medicines.
     
@@ -127,6 +164,164 @@ class ActiveIngredient(TimeStampedModel):
     
     def __str__(self):
         return str(self.name)
+
+
+class MedicineQuerySet(models.QuerySet):
+    """
+    Queryset for Medicine with set-based stock aggregation.
+
+    Methods:
+        with_stock: Annotate every medicine with its stock levels in one aggregate
+        with_stored_stock: Annotate pack/unit stock from the stored sellable units, without joins
+        with_barcodes: Prefetch batch barcodes for every medicine in one query
+        refresh_search_vector: Recompute the stored search vectors (PostgreSQL only)
+        apply_stock_deltas: Shift stored sellable units of several medicines in one UPDATE
+        rebuild_stock: Recompute stored sellable units and availability from batches
+        stale_stock: Medicines whose stored stock differs from their batches
+    """
+
+    def with_stock(self):
+        """
+        Annotate medicines with stock totals computed in a single SUM/CASE aggregate.
+
+        Annotations:
+            total_units (int): Units held across all batches
+            unexpired_units (int): Units held in batches that have not expired yet
+            stock_packs (int): Whole packs contained in total_units
+            stock_loose_units (int): Units left over after the whole packs
+        """
+        today = now().date()
+        return self.annotate(
+            total_units=Coalesce(Sum("batches__stock_units"), Value(0)),
+            unexpired_units=Coalesce(
+                Sum(Case(
+                    When(batches__expiry_date__gt=today, then=F("batches__stock_units")),
+                    default=Value(0),
+                )),
+                Value(0),
+            ),
+        ).annotate(
+            stock_packs=F("total_units") / F("units_per_pack"),
+        ).annotate(
+            stock_loose_units=F("total_units") - F("stock_packs") * F("units_per_pack"),
+        )
+
+    def with_stored_stock(self):
+        """
+        Annotate medicines with stock in packs and units from `sellable_units`.
+
+        Reads the stored column only, so listings neither join nor aggregate
+        batches. Expired batches are not counted.
+
+        Annotations:
+            stock_packs (int): Whole packs contained in sellable_units
+            stock_loose_units (int): Units left over after the whole packs
+        """
+        return self.annotate(
+            stock_packs=F("sellable_units") / F("units_per_pack"),
+        ).annotate(
+            stock_loose_units=F("sellable_units") - F("stock_packs") * F("units_per_pack"),
+        )
+
+    def with_barcodes(self):
+        """
+        Prefetch the barcodes of every batch into `batch_barcodes`.
+
+        Only the columns needed to render barcodes are loaded, so a page of
+        medicines costs a single extra query regardless of batch count.
+        """
+        return self.prefetch_related(
+            Prefetch(
+                "batches",
+                queryset=Batch.objects.only("id", "medicine_id", "barcode").order_by("id"),
+                to_attr="batch_barcodes",
+            )
+        )
+
+    def refresh_search_vector(self):
+        """
+        Recompute `search_vector` for every medicine in the queryset in one UPDATE.
+
+        The vector weights the medicine name (A) over the active ingredient (B),
+        category and manufacturer names (C). Related names are read through
+        correlated subqueries, so no rows are loaded into Python. This is a no-op
+        on backends without full-text search support.
+
+        Returns:
+            int: Number of medicines updated
+        """
+        if connections[self.db].vendor != "postgresql":
+            return 0
+
+        def related_name(model, column):
+            return Subquery(model.objects.filter(pk=OuterRef(column)).values("name")[:1])
+
+        return self.update(search_vector=(
+            SearchVector("name", weight="A", config="simple")
+            + SearchVector(related_name(ActiveIngredient, "active_ingredient_id"), weight="B", config="simple")
+            + SearchVector(related_name(Category, "category_id"), weight="C", config="simple")
+            + SearchVector(related_name(Manufacturer, "manufacturer_id"), weight="C", config="simple")
+        ))
+
+    def apply_stock_deltas(self, deltas):
+        """
+        Add per-medicine deltas to `sellable_units` and refresh `is_available`.
+
+        All medicines are updated by a single UPDATE with a CASE on the id, and
+        the arithmetic happens in SQL, so concurrent writers don't lose updates.
+
+        Args:
+            deltas (dict): Medicine id -> change in sellable units
+
+        Returns:
+            int: Number of medicines updated
+        """
+        deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+        if not deltas:
+            return 0
+        delta = Case(
+            *[When(pk=pk, then=Value(value)) for pk, value in deltas.items()],
+            default=Value(0),
+            output_field=models.IntegerField(),
+        )
+        units = Greatest(F("sellable_units") + delta, Value(0))
+        return self.filter(pk__in=deltas).update(
+            sellable_units=units,
+            is_available=Case(
+                When(GreaterThan(units, 0), then=Value(True)),
+                default=Value(False),
+            ),
+        )
+
+    def rebuild_stock(self):
+        """
+        Recompute `sellable_units` and `is_available` from the batches.
+
+        Sellable units are those in batches that have not expired yet. This
+        also rolls over batches that expired since the last rebuild.
+
+        Returns:
+            int: Number of medicines updated
+        """
+        units = Coalesce(
+            Subquery(
+                Batch.objects.filter(medicine=OuterRef("pk"), expiry_date__gt=now().date())
+                .values("medicine").annotate(total=Sum("stock_units")).values("total")
+            ),
+            Value(0),
+        )
+        return self.update(
+            sellable_units=units,
+            is_available=Case(When(GreaterThan(units, 0), then=Value(True)), default=Value(False)),
+        )
+
+    def stale_stock(self):
+        """Medicines whose stored `sellable_units`/`is_available` disagree with their batches."""
+        return self.with_stock().filter(
+            ~Q(sellable_units=F("unexpired_units"))
+            | Q(is_available=True, unexpired_units=0)
+            | Q(is_available=False, unexpired_units__gt=0)
+        )
     
     
 class Medicine(TimeStampedModel):
@@ -141,9 +336,15 @@ class Medicine(TimeStampedModel):
         manufacturer (ForeignKey): Producing company
         units_per_pack (PositiveSmallIntegerField): Quantity of units in one package
         price (DecimalField): Retail price for one pack (in cents)
-        
+        search_vector (SearchVectorField): Precomputed full-text vector used by search
+        sellable_units (PositiveIntegerField): Stored units in non-expired batches
+        is_available (BooleanField): Stored flag, whether any non-expired stock exists
+
+    Stored stock is kept current by Batch writes (see Batch.save and
+    medicine.signals) and rebuilt by the `rebuild_medicine_stock` command,
+    which should also run daily to roll over batches that expired.
+
     Properties:
-        is_available (bool): Whether any non-expired stock exists
         unit_price (Decimal): Calculated price per single unit
         stock (str): Current inventory level in "packs:units" format
     """
@@ -167,12 +368,24 @@ class Medicine(TimeStampedModel):
         validators=[MinValueValidator(0)],
         help_text="Price of pack"
     )
-   
-    @property
-    def is_available(self):
-        """Check if this medicine has any available non-expired stock."""
-        return self.batches.filter(stock_units__gt=0).exists()
-        
+    search_vector = SearchVectorField(null=True, editable=False)
+    sellable_units = models.PositiveIntegerField(default=0, editable=False)
+    is_available = models.BooleanField(default=False, editable=False)
+
+    objects = MedicineQuerySet.as_manager()
+
+    # maintained with SQL deltas only, never written back from a loaded instance
+    stock_fields = ("sellable_units", "is_available")
+    # fields embedded in search_vector
+    search_fields = ("name", "active_ingredient_id", "category_id", "manufacturer_id")
+
+    class Meta:
+        indexes = [
+            # availability filters ordered by name, and listings sorted by stock
+            models.Index(fields=["is_available", "name", "id"], name="medicine_available_name_idx"),
+            models.Index(fields=["sellable_units", "id"], name="medicine_sellable_idx"),
+        ]
+
     @property
     def unit_price(self):
         """Calculate and return the price per single unit."""
@@ -181,13 +394,57 @@ class Medicine(TimeStampedModel):
     
     @property
     def stock(self):
-        """Return current inventory level in 'packs:units' format."""
-        if self.batches:
-            total = sum(batch.stock_units for batch in self.batches.all())
-            packs = total // self.units_per_pack
-            units = total % self.units_per_pack
-            return f"{packs}:{units}"
-        return 0
+        """
+        Return current inventory level in 'packs:units' format.
+
+        Uses the annotations from MedicineQuerySet.with_stock() or
+        with_stored_stock() when present, otherwise falls back to a single
+        aggregate query.
+        """
+        if hasattr(self, "stock_packs"):
+            return f"{self.stock_packs}:{self.stock_loose_units}"
+        total = self.batches.aggregate(total=Coalesce(Sum("stock_units"), Value(0)))["total"]
+        packs = total // self.units_per_pack
+        units = total % self.units_per_pack
+        return f"{packs}:{units}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the searchable fields as stored, so saves can tell when the vector is stale."""
+        instance = super().from_db(db, field_names, values)
+        instance.mark_search_synced()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.mark_search_synced()
+
+    def search_source(self):
+        """The loaded values of the fields embedded in `search_vector`."""
+        return tuple(self.__dict__.get(field) for field in self.search_fields)
+
+    def mark_search_synced(self):
+        """Record the searchable fields as currently stored."""
+        self._synced_search = self.search_source()
+
+    def save(self, *args, **kwargs):
+        """
+        Save the medicine and refresh its stored search vector when a searchable field changed.
+
+        Updates leave the stored stock columns alone, so saving a stale
+        instance cannot overwrite deltas applied since it was loaded.
+        """
+        stale_search = self._state.adding or getattr(self, "_synced_search", None) != self.search_source()
+        if not self._state.adding and kwargs.get("update_fields") is None \
+                and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.stock_fields
+            ]
+        super().save(*args, **kwargs)
+        if stale_search:
+            Medicine.objects.filter(pk=self.pk).refresh_search_vector()
+            self.mark_search_synced()
 
     def __str__(self):
         return self.name
@@ -201,8 +458,109 @@ def generate_barcode():
         str: 16-digit random numeric string
     """
     return ''.join(secrets.choice(string.digits) for _ in range(16))
-        
-        
+
+
+def generate_unique_barcodes(count, reserved=()):
+    """
+    Generate `count` batch barcodes not used by any existing batch.
+
+    Candidates are checked with a single `IN` query per round; only the rare
+    collisions are regenerated and checked again.
+
+    Args:
+        count (int): Number of barcodes needed
+        reserved (Iterable[str]): Barcodes already taken by unsaved batches
+
+    Returns:
+        list[str]: Distinct unused barcodes
+    """
+    reserved = set(reserved)
+    barcodes = set()
+    while len(barcodes) < count:
+        candidates = set()
+        while len(candidates) < count - len(barcodes):
+            barcode = generate_barcode()
+            if barcode not in reserved and barcode not in barcodes:
+                candidates.add(barcode)
+        taken = set(Batch.objects.filter(barcode__in=candidates).values_list("barcode", flat=True))
+        barcodes |= candidates - taken
+    return list(barcodes)
+
+
+class BatchQuerySet(models.QuerySet):
+    """
+    Queryset for Batch.
+
+    Methods:
+        bulk_create_with_barcodes: Insert batches in chunks, assigning barcodes in bulk
+        with_stock_as_of: Annotate stock at a past moment from snapshots and the ledger
+        with_ledger_units: Annotate the sum of all recorded movements
+    """
+
+    def bulk_create_with_barcodes(self, batches, chunk_size=500):
+        """
+        Insert batches with `bulk_create`, generating missing barcodes per chunk.
+
+        Each chunk costs one collision check, one INSERT and one stored stock
+        UPDATE instead of the per-batch existence loop in `Batch.save`. Like
+        any bulk_create, this skips model signals; callers must wrap it in a
+        transaction when all batches should land together.
+
+        Returns:
+            list[Batch]: The created batches
+        """
+        created = []
+        for start in range(0, len(batches), chunk_size):
+            chunk = batches[start:start + chunk_size]
+            missing = [batch for batch in chunk if not batch.barcode]
+            reserved = [batch.barcode for batch in chunk if batch.barcode]
+            for batch, barcode in zip(missing, generate_unique_barcodes(len(missing), reserved)):
+                batch.barcode = barcode
+            created += self.bulk_create(chunk)
+
+            deltas = {}
+            for batch in chunk:
+                deltas[batch.medicine_id] = deltas.get(batch.medicine_id, 0) + batch.sellable_units
+                batch.mark_stock_synced()
+            Medicine.objects.apply_stock_deltas(deltas)
+            StockMovement.objects.bulk_create([
+                StockMovement.entry(batch, batch.stock_units, StockMovement.RECEIVING)
+                for batch in chunk if batch.stock_units
+            ])
+        return created
+
+    def with_stock_as_of(self, moment):
+        """
+        Annotate `stock_as_of` with each batch's units at `moment`.
+
+        Starts from the latest snapshot taken at or before `moment` and adds
+        only the movements recorded after it, so the full ledger is never
+        replayed. Batches without a snapshot add up all their movements.
+        """
+        snapshots = StockSnapshot.objects.filter(batch=OuterRef("pk"), taken_at__lte=moment)\
+            .order_by("-taken_at")
+        movements = StockMovement.objects.filter(
+            batch=OuterRef("pk"),
+            created__gt=OuterRef("snapshot_taken_at"),
+            created__lte=moment,
+        ).values("batch").annotate(total=Sum("delta")).values("total")
+        return self.annotate(
+            snapshot_taken_at=Coalesce(
+                Subquery(snapshots.values("taken_at")[:1]),
+                Value(StockSnapshot.EPOCH),
+            ),
+            snapshot_units=Coalesce(Subquery(snapshots.values("stock_units")[:1]), Value(0)),
+        ).annotate(
+            stock_as_of=F("snapshot_units") + Coalesce(Subquery(movements), Value(0)),
+        )
+
+    def with_ledger_units(self):
+        """Annotate `ledger_units`, the sum of every movement recorded for each batch."""
+        movements = StockMovement.objects.filter(batch=OuterRef("pk"))\
+            .values("batch").annotate(total=Sum("delta")).values("total")
+        return self.annotate(ledger_units=Coalesce(Subquery(movements), Value(0)))
+
+
 class Batch(TimeStampedModel):
     """
     Represents a specific lot or batch of a medicine with expiry tracking.
@@ -218,6 +576,7 @@ class Batch(TimeStampedModel):
         is_expired (bool): Whether batch has passed expiry date
         has_amount (bool): Whether any stock remains
         stock_packets (str): Inventory in "packs:units" format
+        sellable_units (int): Units counted in the medicine's stored stock
     """
     barcode = models.CharField(
         max_length=16,
@@ -232,7 +591,49 @@ class Batch(TimeStampedModel):
     
     class Meta:
         unique_together = ["expiry_date", "medicine"]
-    
+        indexes = [
+            # serves per-medicine listings and keyset pages ordered by expiry
+            models.Index(fields=["medicine", "expiry_date", "id"], name="batch_medicine_expiry_idx"),
+        ]
+
+    objects = BatchQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored stock contribution so saves can apply a delta."""
+        instance = super().from_db(db, field_names, values)
+        instance.mark_stock_synced()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.mark_stock_synced()
+
+    def mark_stock_synced(self):
+        """
+        Record the stock as currently stored: the medicine, the units counted in
+        Medicine.sellable_units and the batch's stock units.
+        """
+        if "stock_units" in self.__dict__ and "expiry_date" in self.__dict__:
+            self._synced_stock = (self.medicine_id, self.sellable_units, self.stock_units)
+
+    def stock_deltas(self):
+        """Changes to Medicine.sellable_units implied by this batch's unsaved state."""
+        medicine_id, units, _ = getattr(self, "_synced_stock", (None, 0, 0))
+        deltas = {medicine_id: -units} if medicine_id is not None else {}
+        deltas[self.medicine_id] = deltas.get(self.medicine_id, 0) + self.sellable_units
+        return deltas
+
+    def stored_stock(self):
+        """Read the (medicine id, sellable units, stock units) currently stored for this batch."""
+        stored = Batch.objects.filter(pk=self.pk).only("medicine_id", "stock_units", "expiry_date").first()
+        return stored._synced_stock if stored else (None, 0, 0)
+
+    @property
+    def sellable_units(self):
+        """Units this batch contributes to sellable stock (zero once expired)."""
+        return 0 if self.is_expired else self.stock_units
+
     def __str__(self):
         return f"{self.medicine.name}-{self.expiry_date}"
 
@@ -253,7 +654,7 @@ class Batch(TimeStampedModel):
     @property 
     def is_expired(self):
         """Check if this batch has expired."""
-        return self.expiry_date <= now().date()
+        return self._meta.get_field("expiry_date").to_python(self.expiry_date) <= now().date()
 
     @property 
     def has_amount(self):
@@ -272,11 +673,118 @@ class Batch(TimeStampedModel):
         Save the batch, generating a unique barcode if none exists.
         
         The barcode generation ensures uniqueness by checking against existing records.
+        Medicine.sellable_units is shifted by the change in this batch's sellable
+        units, and the change in stock units is recorded in the StockMovement
+        ledger (as receiving for a new batch, an adjustment otherwise), in the
+        same transaction.
         """
         if not self.barcode:
-            barcode = generate_barcode()
-            while Batch.objects.filter(barcode=barcode).exists():
-                barcode = generate_barcode()
-            self.barcode = barcode
+            self.barcode = generate_unique_barcodes(1)[0]
+
+        adding = self._state.adding
+        with transaction.atomic(using=kwargs.get("using")):
+            if not adding and not hasattr(self, "_synced_stock"):
+                self._synced_stock = self.stored_stock()
+            _, _, previous_units = getattr(self, "_synced_stock", (None, 0, 0))
+            super().save(*args, **kwargs)
+            Medicine.objects.apply_stock_deltas(self.stock_deltas())
+            delta = self.stock_units - previous_units
+            if delta:
+                reason = StockMovement.RECEIVING if adding else StockMovement.ADJUSTMENT
+                StockMovement.entry(self, delta, reason).save()
+        self.mark_stock_synced()
+
+
+# User attributed to stock movements recorded in the current context (see medicine.stock.acting_user).
+stock_user = ContextVar("stock_user", default=None)
+
 
-        return super().save(*args, **kwargs)
\ No newline at end of file
+class StockMovement(models.Model):
+    """
+    Append-only record of one change to a batch's stock.
+
+    The sum of a batch's deltas equals its `stock_units`; the
+    `reconcile_stock` command checks this.
+
+    Attributes:
+        batch (ForeignKey): The batch whose stock changed
+        delta (IntegerField): Units added (positive) or removed (negative)
+        reason (CharField): Why the stock changed
+        source_type, source_id: The document behind the change (invoice, order, ...)
+        user (ForeignKey): Who made the change, when known
+        created (DateTimeField): When the change was recorded
+    """
+    OPENING = "opening"
+    RECEIVING = "receiving"
+    ORDER = "order"
+    SALE = "sale"
+    REFUND = "refund"
+    ADJUSTMENT = "adjustment"
+    REASONS = [
+        (OPENING, "Opening balance"),
+        (RECEIVING, "Receiving"),
+        (ORDER, "Purchase order"),
+        (SALE, "Sale"),
+        (REFUND, "Refund"),
+        (ADJUSTMENT, "Adjustment"),
+    ]
+
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name="movements")
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASONS)
+    source_type = models.ForeignKey(ContentType, on_delete=models.SET_NULL, null=True, blank=True)
+    source_id = models.PositiveIntegerField(null=True, blank=True)
+    source = GenericForeignKey("source_type", "source_id")
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="stock_movements"
+    )
+    created = models.DateTimeField(default=now, editable=False)
+
+    class Meta:
+        indexes = [
+            # movements of a batch after a snapshot, and ledger sums
+            models.Index(fields=["batch", "created"], name="movement_batch_created_idx"),
+            models.Index(fields=["source_type", "source_id"], name="movement_source_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.batch_id}: {self.delta:+d} ({self.reason})"
+
+    def save(self, *args, **kwargs):
+        """Movements are never changed once recorded."""
+        if not self._state.adding:
+            raise ValidationError("Stock movements are append-only.")
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def entry(cls, batch, delta, reason, source=None):
+        """Build an unsaved movement, attributed to the current stock user."""
+        user = stock_user.get()
+        user_id = user.pk if user is not None and user.is_authenticated else None
+        return cls(batch=batch, delta=delta, reason=reason, source=source, user_id=user_id)
+
+
+class StockSnapshot(models.Model):
+    """
+    Stock of one batch at a moment, written daily by the `snapshot_stock` command.
+
+    Attributes:
+        batch (ForeignKey): The batch
+        taken_at (DateTimeField): When the stock was read
+        stock_units (PositiveIntegerField): Units held at that moment
+    """
+    # stands in for "no snapshot yet" in point-in-time queries
+    EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name="snapshots")
+    taken_at = models.DateTimeField()
+    stock_units = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["batch", "taken_at"], name="unique_batch_snapshot"),
+        ]
+
+    def __str__(self):
+        return f"{self.batch_id} @ {self.taken_at:%Y-%m-%d %H:%M}: {self.stock_units}"
\ No newline at end of file
@@ -1,25 +1,234 @@
 """
 Pagination:
     - MedicinePagination: Custom pagination settings for medicine listings
+    - KeysetPagination: Cursor (keyset) pagination over a fixed, unique ordering
+    - MedicineCursorPagination: Keyset pagination for medicines on (name, id)
+    - BatchCursorPagination: Keyset pagination for batches on (expiry_date, id)
+    - SelectablePaginationMixin: Lets clients pick page or cursor mode per request
 """
 
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-from rest_framework.pagination import PageNumberPagination
-from rest_framework import serializers 
-from medicine.models import Medicine, Batch, Supplier, ActiveIngredient, Category, Manufacturer
-from django.utils.timezone import now 
 
 class MedicinePagination(PageNumberPagination):
     """
     Custom pagination settings for medicine listings.
-    
+
     Attributes:
         page_size (int): Default items per page
         page_size_query_param (str): Query parameter to override page size
         max_page_size (int): Maximum allowed items per page
     """
-    page_size = 10 
+    page_size = 10
     page_size_query_param = "size"
     max_page_size = 10
 
 
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination.
+
+    Each page is fetched with `WHERE (ordering) > (last row)` instead of an
+    OFFSET, and no COUNT(*) is issued, so walking a whole table costs linear
+    time. The ordering must end in a unique column so positions are exact.
+
+    Attributes:
+        ordering (tuple): Fields to order by; prefix with '-' for descending
+        page_size (int): Default items per page
+        page_size_query_param (str): Query parameter to override page size
+        max_page_size (int): Maximum allowed items per page (large for sync jobs)
+        cursor_query_param (str): Query parameter carrying the opaque cursor
+    """
+    ordering = ("id",)
+    page_size = 10
+    page_size_query_param = "size"
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return the page of rows that follows the position encoded in the cursor."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request, queryset.model)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        """Read the page size from the query string, clamped to max_page_size."""
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def keyset_filter(self, position):
+        """Build the row-value comparison `(a, b) > (x, y)` as an OR of prefixes."""
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {
+                previous.lstrip("-"): position[i]
+                for i, previous in enumerate(self.ordering[:index])
+            }
+            condition |= Q(**equal, **{f"{name}__{lookup}": position[index]})
+        return condition
+
+    def get_position(self, obj):
+        """Return the ordering values of a row as JSON-safe values."""
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip("-"))
+            if isinstance(value, (datetime.date, datetime.datetime)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        return values
+
+    def encode_cursor(self, position):
+        payload = json.dumps(position, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(payload).decode()
+
+    def decode_cursor(self, request, model):
+        """
+        Decode the cursor from the query string, or None for the first page.
+
+        Every value is converted by its ordering field, so a tampered cursor
+        is rejected with a 404 instead of failing in the query.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError("cursor does not match the ordering")
+            position = [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+            if any(value is None for value in position):
+                raise ValueError("cursor values cannot be null")
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = self.encode_cursor(self.get_position(self.page[-1]))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class MedicineCursorPagination(KeysetPagination):
+    """Keyset pagination for medicine listings, ordered by (name, id)."""
+    ordering = ("name", "id")
+
+
+class BatchCursorPagination(KeysetPagination):
+    """Keyset pagination for batch listings, ordered by (expiry_date, id)."""
+    ordering = ("expiry_date", "id")
+
+
+class SelectablePaginationMixin:
+    """
+    View mixin choosing the paginator per request.
+
+    Requests with `?pagination=cursor` (or carrying a `cursor`) use
+    `cursor_pagination_class`; all others use `pagination_class`. Cursor
+    pages follow the paginator's fixed ordering, so query parameters that
+    order rows by something else (e.g. search relevance) are rejected with
+    a 400 in cursor mode rather than silently reordered.
+
+    Attributes:
+        cursor_pagination_class: Keyset pagination class for cursor mode
+        pagination_mode_query_param (str): Query parameter selecting the mode
+        cursor_excluded_params (tuple): Query parameters not allowed in cursor mode
+    """
+    cursor_pagination_class = None
+    pagination_mode_query_param = "pagination"
+    cursor_excluded_params = ()
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            if self.use_cursor_pagination():
+                self._paginator = self.cursor_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def use_cursor_pagination(self):
+        """Return True when the request asks for cursor mode and the view supports it."""
+        if self.cursor_pagination_class is None:
+            return False
+        params = self.request.query_params
+        cursor = (
+            params.get(self.pagination_mode_query_param) == "cursor"
+            or self.cursor_pagination_class.cursor_query_param in params
+        )
+        excluded = [param for param in self.cursor_excluded_params if params.get(param)]
+        if cursor and excluded:
+            raise ValidationError({
+                param: "Not supported with cursor pagination, whose pages follow a fixed ordering."
+                for param in excluded
+            })
+        return cursor
@@ -0,0 +1,80 @@
+"""
+Medicine Search
+
+Ranked medicine search used by the medicine listing endpoint.
+
+On PostgreSQL the search runs against the precomputed `Medicine.search_vector`
+(medicine, active ingredient, category and manufacturer names) using prefix
+matching, combined with trigram word similarity on the medicine name so that
+partial and misspelled brand names still match. Both conditions are served by
+GIN indexes created in migration 0002.
+
+Other database backends (SQLite test runs) fall back to case-insensitive
+containment over the same four names, ranking name prefixes first.
+
+Classes:
+    - MedicineSearchFilter: DRF filter backend performing the ranked search
+"""
+
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from rest_framework.filters import SearchFilter
+
+
+# Only word characters reach the raw tsquery, so user input can't inject operators.
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class MedicineSearchFilter(SearchFilter):
+    """
+    Ranked full-text and trigram search over medicines.
+
+    Attributes:
+        search_config (str): Text search configuration (no stemming of brand names)
+    """
+    search_config = "simple"
+
+    def filter_queryset(self, request, queryset, view):
+        """Filter and rank the queryset by the `search` query parameter."""
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        term = " ".join(terms)
+        if connections[queryset.db].vendor == "postgresql":
+            return self.postgres_search(queryset, term)
+        return self.fallback_search(queryset, term)
+
+    def postgres_search(self, queryset, term):
+        """Search the precomputed vector by prefix and the name by trigram similarity."""
+        tokens = TOKEN_RE.findall(term.lower())
+        name_match = Q(name__trigram_word_similar=term)
+        if not tokens:
+            return queryset.filter(name_match)
+
+        query = SearchQuery(
+            " & ".join(f"{token}:*" for token in tokens),
+            search_type="raw",
+            config=self.search_config,
+        )
+        return queryset.filter(Q(search_vector=query) | name_match).annotate(
+            search_rank=SearchRank(F("search_vector"), query),
+            name_similarity=TrigramWordSimilarity(term, "name"),
+        ).order_by("-search_rank", "-name_similarity", "name", "id")
+
+    def fallback_search(self, queryset, term):
+        """Case-insensitive containment over the four names, name prefixes first."""
+        match = Q()
+        for field in ("name", "active_ingredient__name", "category__name", "manufacturer__name"):
+            match |= Q(**{f"{field}__icontains": term})
+        return queryset.filter(match).annotate(
+            search_rank=Case(
+                When(name__istartswith=term, then=Value(0)),
+                When(name__icontains=term, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            ),
+        ).order_by("search_rank", "name", "id")
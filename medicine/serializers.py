@@ -8,12 +8,21 @@ Serializers:
     - MedicineOutSerializer: For medicine retrieval (output)
     - BatchInSerializer: For batch creation/updates (input)
     - BatchOutSerializer: For batch retrieval (output)
+    - BatchBulkItemSerializer: For one batch of a bulk creation (input)
+    - BatchBulkCreateSerializer: For creating many batches at once (input)
+    - BarcodeLookupSerializer: For barcode resolution results (output)
+    - MedicineImportRowSerializer: For one row of a bulk medicine import (input)
+    - MedicineImportSerializer: For bulk medicine import uploads (input)
 
 """
 
 from rest_framework import serializers 
 from medicine.models import Medicine, Batch, Supplier,ActiveIngredient,Category,Manufacturer
 from django.utils.timezone import now 
+from decimal import Decimal
+from django_countries import countries
+from django.db import transaction
+from medicine.barcodes import invalidate_barcodes
 
 
 
@@ -77,7 +86,14 @@ class MedicineOutSerializer(serializers.ModelSerializer):
     barcodes = serializers.SerializerMethodField()
     
     def get_barcodes(self, obj):
-        """Get all barcodes associated with this medicine's batches."""
+        """
+        Get all barcodes associated with this medicine's batches.
+
+        Reads the batches prefetched by MedicineQuerySet.with_barcodes() when
+        available, falling back to a per-medicine query otherwise.
+        """
+        if hasattr(obj, "batch_barcodes"):
+            return [batch.barcode for batch in obj.batch_barcodes]
         barcodes = obj.batches.values_list("barcode", flat=True)
         return list(barcodes)
                 
@@ -175,3 +191,142 @@ class BatchOutSerializer(serializers.ModelSerializer):
             "stock_packets",
             "barcode"
         ]
+
+
+class BatchBulkItemSerializer(BatchInSerializer):
+    """
+    Input serializer for one batch of a bulk creation.
+
+    The medicine is given by id and resolved for the whole request by
+    BatchBulkCreateSerializer, so validating an item costs no query.
+    """
+    medicine = serializers.IntegerField(write_only=True)
+
+    class Meta(BatchInSerializer.Meta):
+        fields = ["medicine", "expiry_date", "packs", "units"]
+        # (medicine, expiry_date) uniqueness is checked for the whole list at once
+        validators = []
+
+
+class BatchBulkCreateSerializer(serializers.Serializer):
+    """
+    Input serializer creating many batches, possibly across medicines, in one request.
+
+    Validation loads every referenced medicine with one query and checks
+    existing (medicine, expiry_date) lots with another. Creation assigns
+    barcodes in bulk and inserts all batches in one transaction through
+    Batch.objects.bulk_create_with_barcodes.
+    """
+    max_batches = 1000
+    batches = BatchBulkItemSerializer(many=True, allow_empty=False, max_length=max_batches)
+
+    def validate_batches(self, items):
+        """Resolve medicines, compute stock units and reject duplicate lots."""
+        medicines = Medicine.objects.in_bulk({item["medicine"] for item in items})
+        errors = []
+        lots = set()
+        for item in items:
+            medicine = medicines.get(item["medicine"])
+            if medicine is None:
+                errors.append({"medicine": [f"Invalid pk \"{item['medicine']}\" - object does not exist."]})
+                continue
+            if medicine.units_per_pack == 1 and item.get("units", 0) > 0:
+                errors.append({"units": ["You can't set units for medicine which has only one unit per pack"]})
+                continue
+            lot = (medicine.id, item["expiry_date"])
+            if lot in lots:
+                errors.append({"expiry_date": ["Duplicate batch for this medicine and expiry date."]})
+                continue
+            lots.add(lot)
+            item["medicine"] = medicine
+            errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        existing = set(
+            Batch.objects.filter(
+                medicine_id__in={medicine_id for medicine_id, _ in lots},
+                expiry_date__in={expiry_date for _, expiry_date in lots},
+            ).values_list("medicine_id", "expiry_date")
+        )
+        if existing & lots:
+            raise serializers.ValidationError([
+                {"expiry_date": ["A batch for this medicine and expiry date already exists."]}
+                if (item["medicine"].id, item["expiry_date"]) in existing else {}
+                for item in items
+            ])
+        return items
+
+    def create(self, validated_data):
+        """Insert all batches with bulk-generated barcodes in one transaction."""
+        batches = [
+            Batch(
+                medicine=item["medicine"],
+                expiry_date=item["expiry_date"],
+                stock_units=item.get("units", 0) + item["packs"] * item["medicine"].units_per_pack,
+            )
+            for item in validated_data["batches"]
+        ]
+        with transaction.atomic():
+            batches = Batch.objects.bulk_create_with_barcodes(batches)
+        # bulk_create skips signals: drop cached lookups of the restocked medicines
+        invalidate_barcodes(*{batch.medicine.international_barcode for batch in batches})
+        return batches
+
+
+class BarcodeLookupSerializer(serializers.Serializer):
+    """
+    Output serializer for a resolved barcode (medicine.barcodes.BarcodeMatch).
+
+    Returns everything the point of sale needs in a single response.
+    """
+    barcode = serializers.CharField()
+    kind = serializers.CharField()
+    batch_id = serializers.IntegerField(source="batch.id", default=None)
+    batch_barcode = serializers.CharField(source="batch.barcode", default=None)
+    medicine_id = serializers.IntegerField(source="medicine.id")
+    medicine = serializers.CharField(source="medicine.name")
+    international_barcode = serializers.CharField(source="medicine.international_barcode")
+    units_per_pack = serializers.IntegerField(source="medicine.units_per_pack")
+    price = serializers.DecimalField(source="medicine.price", max_digits=8, decimal_places=2)
+    unit_price = serializers.DecimalField(max_digits=8, decimal_places=2)
+    stock_units = serializers.IntegerField()
+    stock = serializers.CharField()
+    expiry_date = serializers.DateField(format="%Y-%m")
+    is_expired = serializers.BooleanField()
+
+
+class MedicineImportRowSerializer(serializers.Serializer):
+    """
+    Input serializer for one row of a bulk medicine import.
+
+    Related records are given by name and resolved (or created) by
+    medicine.importers.MedicineImporter, so no database lookups happen here.
+    """
+    name = serializers.CharField(max_length=50)
+    international_barcode = serializers.CharField(min_length=13, max_length=16)
+    active_ingredient = serializers.CharField(max_length=50)
+    category = serializers.CharField(max_length=100)
+    manufacturer = serializers.CharField(max_length=50)
+    manufacturer_country = serializers.ChoiceField(
+        choices=countries, required=False, allow_blank=True, default=""
+    )
+    units_per_pack = serializers.IntegerField(min_value=1, max_value=32767, default=1)
+    price = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=Decimal("0"))
+
+
+class MedicineImportSerializer(serializers.Serializer):
+    """Input serializer for a bulk medicine import upload (CSV or JSONL file)."""
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=["csv", "jsonl"], required=False)
+
+    def validate(self, attrs):
+        """Infer the format from the file extension when not given."""
+        if "format" not in attrs:
+            extension = attrs["file"].name.rsplit(".", 1)[-1].lower()
+            if extension not in ("csv", "jsonl"):
+                raise serializers.ValidationError(
+                    {"format": "Could not infer the format, expected a .csv or .jsonl file."}
+                )
+            attrs["format"] = extension
+        return attrs
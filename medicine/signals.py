@@ -0,0 +1,61 @@
+"""
+Medicine Signal Handlers
+
+Keeps cached barcode lookups (see medicine.barcodes), the similar medicines
+(see medicine.similars), the category tree (see medicine.categories)
+and stored medicine stock consistent with the database when batches,
+medicines and categories are written. Cached entries are dropped when the
+writing transaction commits (see the invalidate_* helpers), so concurrent
+readers cannot cache rows from before the commit.
+
+Handlers:
+    - invalidate_batch_lookups: Batch saved or deleted
+    - invalidate_medicine_barcodes: Medicine saved or deleted
+    - release_batch_stock: Batch deleted (saves are handled by Batch.save)
+    - invalidate_similars: Medicine or Category saved or deleted
+    - invalidate_categories: Category saved or deleted
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from medicine.barcodes import invalidate_barcodes, invalidate_batch_barcodes
+from medicine.categories import invalidate_category_tree
+from medicine.models import Batch, Category, Medicine
+from medicine.similars import invalidate_alternatives
+
+
+@receiver([post_save, post_delete], sender=Batch)
+def invalidate_batch_lookups(sender, instance, **kwargs):
+    """Drop the batch barcode and its medicine's barcode, whose stock and batch changed."""
+    invalidate_batch_barcodes(instance)
+
+
+@receiver([post_save, post_delete], sender=Medicine)
+def invalidate_medicine_barcodes(sender, instance, **kwargs):
+    """Drop the medicine barcode and the barcodes of its batches, which embed its price."""
+    batch_barcodes = Batch.objects.filter(medicine_id=instance.pk)\
+        .values_list("barcode", flat=True)
+    invalidate_barcodes(instance.international_barcode, *batch_barcodes)
+
+
+@receiver(post_delete, sender=Batch)
+def release_batch_stock(sender, instance, **kwargs):
+    """Remove the deleted batch's sellable units from its medicine's stored stock."""
+    medicine_id, units, _ = getattr(
+        instance, "_synced_stock", (instance.medicine_id, instance.sellable_units, instance.stock_units)
+    )
+    Medicine.objects.apply_stock_deltas({medicine_id: -units})
+
+
+@receiver([post_save, post_delete], sender=Medicine)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_similars(sender, instance, **kwargs):
+    """Drop the cached similar medicines, which follow medicine keys and the category tree."""
+    invalidate_alternatives()
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_categories(sender, instance, **kwargs):
+    """Drop the cached category tree."""
+    invalidate_category_tree()
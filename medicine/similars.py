@@ -0,0 +1,97 @@
+"""
+Similar Medicines
+
+Cached substitution lookups used to suggest alternative brands, e.g. when a
+medicine is out of stock.
+
+A medicine's substitutes share its active ingredient and belong to its
+category or one of that category's descendants: a medicine in "Oral" is
+offered those in "Oral > Tablets", but not the other way round. The subtree
+is matched with the MPTT range condition of
+`medicine.categories.descendants_filter`.
+
+Each medicine's alternatives are found with a few indexed queries and
+cached under its own id, so a lookup reads one small cache entry. Cache
+keys carry a version that `medicine.signals` replaces whenever a Medicine
+or Category is written, which drops every medicine's entry at once.
+
+Functions:
+    - find_alternatives: Query the ids of a medicine's substitutes
+    - get_alternatives: Return a medicine's cached substitute ids, finding them on a miss
+    - invalidate_alternatives: Drop every medicine's cached substitutes
+    - rank_alternatives: Order alternatives by sellable stock and unit price
+"""
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import DecimalField, F
+from django.db.models.functions import Cast
+
+from medicine.categories import descendants_filter
+from medicine.models import Medicine
+
+
+VERSION_KEY = "similars:version"
+
+
+def find_alternatives(medicine_id):
+    """
+    Query the ids of a medicine's substitutes, excluding itself.
+
+    Returns:
+        list[int] | None: The ids, by id; None when there is no such medicine
+    """
+    key = Medicine.objects.filter(pk=medicine_id).values_list("active_ingredient_id", "category_id").first()
+    if key is None:
+        return None
+    ingredient_id, category_id = key
+    return list(
+        Medicine.objects.filter(descendants_filter(category_id), active_ingredient_id=ingredient_id)
+        .exclude(pk=medicine_id).order_by("id").values_list("id", flat=True)
+    )
+
+
+def get_alternatives(medicine_id):
+    """Return the cached ids of a medicine's substitutes (see find_alternatives), finding them on a miss."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    key = f"similars:{version}:{medicine_id}"
+    # unknown medicines are cached as an empty tuple, told apart from a miss
+    alternatives = cache.get(key)
+    if alternatives is None:
+        alternatives = find_alternatives(medicine_id)
+        timeout = getattr(settings, "SIMILARS_CACHE_TIMEOUT", 3600)
+        cache.set(key, () if alternatives is None else alternatives, timeout)
+    return None if alternatives == () else alternatives
+
+
+def invalidate_alternatives():
+    """Drop every medicine's cached substitutes once the current transaction commits."""
+    transaction.on_commit(lambda: cache.set(VERSION_KEY, uuid.uuid4().hex, None))
+
+
+# Orderings for rank_alternatives; sellable medicines always come first.
+RANKINGS = {
+    "stock": ("-is_available", "-sellable_units", "price_per_unit", "name", "id"),
+    "price": ("-is_available", "price_per_unit", "-sellable_units", "name", "id"),
+}
+
+
+def rank_alternatives(queryset, ids, rank="stock"):
+    """
+    Restrict a medicine queryset to `ids`, ranked from the stored stock columns.
+
+    Args:
+        queryset: Medicine queryset to filter and order
+        ids (Iterable[int]): Alternative medicine ids
+        rank (str): 'stock' for most sellable units first, 'price' for cheapest unit first
+    """
+    return queryset.filter(id__in=ids).annotate(
+        price_per_unit=Cast(F("price"), DecimalField(max_digits=12, decimal_places=4))
+        / F("units_per_pack"),
+    ).order_by(*RANKINGS[rank])
@@ -0,0 +1,206 @@
+"""
+Stock Mutations
+
+Single place where batch stock is changed by sales, refunds and orders.
+
+Every change is one SQL UPDATE with an F() expression, so concurrent
+cashiers never overwrite each other's changes. Decrements are conditional
+(`WHERE stock_units >= n`): when fewer units are left, no row matches and
+InsufficientStock is raised, without reading the batch beforehand.
+
+Each mutation also records a StockMovement in the ledger, shifts the
+medicine's stored sellable units and drops the cached barcode lookups of the
+batch and its medicine once the transaction commits, so a rolled back or
+still uncommitted change can't be cached again by a concurrent lookup. Call
+these inside the transaction that records the sale, refund or order line, so
+a failed decrement rolls the line back too.
+
+Movements are attributed to the user set with `acting_user`; during API
+requests StockUserMiddleware sets it to the authenticated user.
+
+Classes:
+    - InsufficientStock: Raised when stock can't cover a requested quantity
+
+Functions:
+    - acting_user: Attribute stock movements recorded in a block to a user
+    - decrement: Atomically remove units from a batch if enough are left
+    - decrement_many: Remove units from several batches in one conditional UPDATE
+    - adjust_many: Add or remove units of several batches in one conditional UPDATE
+    - increment: Atomically add units to a batch
+    - increment_many: Add units to several batches in one UPDATE
+"""
+
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from medicine.barcodes import invalidate_batch_barcodes
+from medicine.models import Batch, Medicine, StockMovement, stock_user
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when stock can't cover a requested quantity.
+
+    Attributes:
+        requested (int): Units requested
+        available (int): Units that were available
+        batch_id (int | None): The batch being decremented, if any
+        medicine_id (int | None): The medicine being allocated, if any
+    """
+
+    def __init__(self, requested, available, batch_id=None, medicine_id=None):
+        self.requested = requested
+        self.available = available
+        self.batch_id = batch_id
+        self.medicine_id = medicine_id
+        subject = f"batch {batch_id}" if batch_id is not None else f"medicine {medicine_id}"
+        super().__init__(f"Only {available} of {requested} units of {subject} are available.")
+
+
+@contextmanager
+def acting_user(user):
+    """Attribute stock movements recorded inside the block to `user`."""
+    token = stock_user.set(user)
+    try:
+        yield
+    finally:
+        stock_user.reset(token)
+
+
+def decrement(batch, quantity, reason=StockMovement.SALE, source=None):
+    """
+    Remove `quantity` units from a batch with a conditional UPDATE.
+
+    The in-memory `batch.stock_units` is reduced by the same amount on success.
+
+    Args:
+        batch (Batch): Batch to take from
+        quantity (int): Units to remove
+        reason (str): StockMovement reason recorded in the ledger
+        source (Model | None): Document behind the change, e.g. the invoice
+
+    Raises:
+        InsufficientStock: When the batch holds fewer than `quantity` units
+    """
+    updated = Batch.objects.filter(pk=batch.pk, stock_units__gte=quantity)\
+        .update(stock_units=F("stock_units") - quantity)
+    if not updated:
+        available = Batch.objects.filter(pk=batch.pk).values_list("stock_units", flat=True).first()
+        raise InsufficientStock(quantity, available or 0, batch_id=batch.pk)
+    _applied(batch, -quantity, reason, source)
+
+
+def decrement_many(lines, reason=StockMovement.SALE, source=None):
+    """
+    Remove units from several batches with one conditional UPDATE.
+
+    Quantities of a batch listed more than once are added up. Either every
+    batch holds enough units and all are decremented, or none is. The
+    ledger, stored medicine stock and caches are then updated with one
+    query each, so the cost doesn't grow with the number of batches.
+
+    Args:
+        lines (Iterable[tuple[Batch, int]]): Batches and the units to take from each
+        reason (str): StockMovement reason recorded in the ledger
+        source (Model | None): Document behind the change, e.g. the invoice
+
+    Raises:
+        InsufficientStock: For the first batch holding fewer units than requested
+    """
+    adjust_many([(batch, -quantity) for batch, quantity in lines], reason, source)
+
+
+def adjust_many(lines, reason=StockMovement.ADJUSTMENT, source=None):
+    """
+    Add or remove units of several batches with one conditional UPDATE.
+
+    Like `decrement_many`, but each line carries a signed delta: batches
+    gaining units always match, batches losing units only when enough are
+    left. Batches whose deltas add up to zero aren't touched.
+
+    Raises:
+        InsufficientStock: For the first batch holding fewer units than it would lose
+    """
+    deltas, instances = _grouped(lines)
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    changes = _per_batch(deltas)
+    removed = _per_batch({pk: -delta for pk, delta in deltas.items()})
+    with transaction.atomic():
+        updated = Batch.objects.filter(pk__in=deltas, stock_units__gte=removed)\
+            .update(stock_units=F("stock_units") + changes)
+        if updated != len(deltas):
+            transaction.set_rollback(True)
+    if updated != len(deltas):
+        available = dict(Batch.objects.filter(pk__in=deltas).values_list("pk", "stock_units"))
+        short = next(pk for pk, delta in deltas.items() if available.get(pk, 0) < -delta)
+        raise InsufficientStock(-deltas[short], available.get(short, 0), batch_id=short)
+    _applied_many(deltas, {pk: instances[pk] for pk in deltas}, reason, source)
+
+
+def increment(batch, quantity, reason=StockMovement.ADJUSTMENT, source=None):
+    """Add `quantity` units to a batch with a single UPDATE (see `decrement` for the arguments)."""
+    Batch.objects.filter(pk=batch.pk).update(stock_units=F("stock_units") + quantity)
+    _applied(batch, quantity, reason, source)
+
+
+def increment_many(lines, reason=StockMovement.ADJUSTMENT, source=None):
+    """Add units to several batches with one UPDATE (see `decrement_many` for the arguments)."""
+    quantities, instances = _grouped(lines)
+    if not quantities:
+        return
+    added = _per_batch(quantities)
+    Batch.objects.filter(pk__in=quantities).update(stock_units=F("stock_units") + added)
+    _applied_many(quantities, instances, reason, source)
+
+
+def _applied(batch, delta, reason, source):
+    """Record a stock change in the ledger and mirror it on the instance, stored stock and caches."""
+    StockMovement.entry(batch, delta, reason, source).save()
+    batch.stock_units += delta
+    if not batch.is_expired:
+        Medicine.objects.apply_stock_deltas({batch.medicine_id: delta})
+    batch.mark_stock_synced()
+    invalidate_batch_barcodes(batch)
+
+
+def _grouped(lines):
+    """Add up quantities per batch id, keeping every distinct instance of each batch."""
+    quantities = {}
+    instances = {}
+    for batch, quantity in lines:
+        quantities[batch.pk] = quantities.get(batch.pk, 0) + quantity
+        same = instances.setdefault(batch.pk, [])
+        if not any(other is batch for other in same):
+            same.append(batch)
+    return quantities, instances
+
+
+def _per_batch(quantities):
+    """CASE expression giving each batch id its quantity."""
+    return Case(
+        *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _applied_many(deltas, instances, reason, source):
+    """`_applied` for several batches, with one query for the ledger and one for stored stock."""
+    medicine_deltas = {}
+    movements = []
+    for pk, delta in deltas.items():
+        batch = instances[pk][0]
+        movements.append(StockMovement.entry(batch, delta, reason, source))
+        if not batch.is_expired:
+            medicine_deltas[batch.medicine_id] = medicine_deltas.get(batch.medicine_id, 0) + delta
+    StockMovement.objects.bulk_create(movements)
+    Medicine.objects.apply_stock_deltas(medicine_deltas)
+    for pk, batches in instances.items():
+        for batch in batches:
+            batch.stock_units += deltas[pk]
+            batch.mark_stock_synced()
+    invalidate_batch_barcodes(*(batches[0] for batches in instances.values()))
@@ -42,10 +42,8 @@ class ManufacturerFactory(factory.django.DjangoModelFactory):
     phone_number = factory.LazyFunction(lambda: fake.phone_number())  # Random phone number
     address = factory.Faker("address")
 
-    @factory.lazy_attribute
-    def country(self):
-        country = factory.LazyAttribute(lambda x: fake.country_code())
-        return country
+    country = factory.Faker("country_code")
+
     @factory.lazy_attribute
     def website(self):
         website = f"https://www.{self.name}.com"
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+from django.db import connection, transaction
+from django.utils.timezone import now, timedelta
+
+from medicine.allocation import allocate
+from medicine.models import Batch
+from medicine.stock import InsufficientStock
+from medicine.tests.factories import BatchFactory, MedicineFactory
+
+
+def in_days(days):
+    return now().date() + timedelta(days=days)
+
+
+@pytest.mark.django_db
+class TestAllocate:
+    def setup_method(self):
+        self.med = MedicineFactory()
+        self.late = BatchFactory(medicine=self.med, stock_units=10, expiry_date=in_days(90))
+        self.early = BatchFactory(medicine=self.med, stock_units=4, expiry_date=in_days(30))
+        self.middle = BatchFactory(medicine=self.med, stock_units=5, expiry_date=in_days(60))
+        BatchFactory(medicine=self.med, stock_units=50, expiry_date=in_days(-1))
+        BatchFactory(medicine=self.med, stock_units=0, expiry_date=in_days(10))
+
+    def test_first_expiry_first_out(self):
+        with transaction.atomic():
+            allocations = allocate(self.med.id, 3)
+        assert [(a.batch, a.quantity) for a in allocations] == [(self.early, 3)]
+
+    def test_splits_across_batches(self, django_assert_num_queries):
+        with transaction.atomic(), django_assert_num_queries(1):
+            allocations = allocate(self.med.id, 12)
+        assert [(a.batch, a.quantity) for a in allocations] == [
+            (self.early, 4), (self.middle, 5), (self.late, 3),
+        ]
+        assert allocations[0].batch.medicine == self.med
+
+    def test_insufficient_stock(self):
+        with pytest.raises(InsufficientStock) as excinfo, transaction.atomic():
+            allocate(self.med.id, 20)
+        assert (excinfo.value.requested, excinfo.value.available) == (20, 19)
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="SKIP LOCKED needs PostgreSQL")
+@pytest.mark.django_db(transaction=True)
+def test_allocation_skips_batches_locked_by_other_sales():
+    med = MedicineFactory()
+    early = BatchFactory(medicine=med, stock_units=4, expiry_date=in_days(30))
+    later = BatchFactory(medicine=med, stock_units=10, expiry_date=in_days(60))
+    locked, release = threading.Event(), threading.Event()
+
+    def hold_early_batch():
+        with transaction.atomic():
+            list(Batch.objects.select_for_update().filter(pk=early.pk))
+            locked.set()
+            release.wait(10)
+        connection.close()
+
+    holder = threading.Thread(target=hold_early_batch)
+    holder.start()
+    try:
+        locked.wait(10)
+        with transaction.atomic():
+            allocations = allocate(med.id, 3)
+    finally:
+        release.set()
+        holder.join()
+    assert [(a.batch, a.quantity) for a in allocations] == [(later, 3)]
@@ -0,0 +1,85 @@
+import pytest
+from decimal import Decimal
+from django.utils.timezone import now, timedelta
+from medicine.barcodes import resolve_barcode, resolve_barcodes, resolver
+from medicine.tests.factories import MedicineFactory, BatchFactory
+
+
+@pytest.mark.django_db
+class TestBarcodeResolver:
+
+    def test_resolve_batch_barcode(self):
+        med = MedicineFactory(price=Decimal("30.00"), units_per_pack=3)
+        batch = BatchFactory(medicine=med, stock_units=7)
+
+        match = resolve_barcode(batch.barcode)
+        assert match.kind == "batch"
+        assert match.batch == batch
+        assert match.medicine == med
+        assert match.unit_price == Decimal("10.00")
+        assert match.stock_units == 7
+        assert match.stock == "2:1"
+        assert match.expiry_date == batch.expiry_date
+
+    def test_resolve_international_barcode_uses_first_expiring_batch(self):
+        med = MedicineFactory()
+        today = now().date()
+        BatchFactory(medicine=med, stock_units=5, expiry_date=today - timedelta(days=3))
+        first = BatchFactory(medicine=med, stock_units=4, expiry_date=today + timedelta(days=10))
+        BatchFactory(medicine=med, stock_units=6, expiry_date=today + timedelta(days=90))
+
+        match = resolve_barcode(med.international_barcode)
+        assert match.kind == "medicine"
+        assert match.batch == first
+        assert match.stock_units == 10
+
+    def test_unknown_barcode(self):
+        assert resolve_barcode("0000000000000000") is None
+
+    def test_cached_lookup_hits_no_database(self, django_assert_num_queries):
+        batch = BatchFactory()
+        resolve_barcode(batch.barcode)
+        with django_assert_num_queries(0):
+            assert resolve_barcode(batch.barcode).batch == batch
+
+    def test_shared_cache_survives_local_eviction(self, django_assert_num_queries):
+        batch = BatchFactory()
+        resolve_barcode(batch.barcode)
+        resolver.clear()
+        with django_assert_num_queries(0):
+            assert resolve_barcode(batch.barcode).batch == batch
+
+    def test_batch_save_invalidates(self, django_capture_on_commit_callbacks):
+        batch = BatchFactory(stock_units=10)
+        assert resolve_barcode(batch.barcode).stock_units == 10
+        batch.stock_units = 3
+        with django_capture_on_commit_callbacks(execute=True):
+            batch.save()
+        assert resolve_barcode(batch.barcode).stock_units == 3
+
+    def test_invalidation_waits_for_commit(self, django_capture_on_commit_callbacks):
+        batch = BatchFactory(stock_units=10)
+        with django_capture_on_commit_callbacks() as callbacks:
+            batch.stock_units = 3
+            batch.save()
+            # a lookup before the commit is cached and dropped again at commit
+            resolve_barcode(batch.barcode)
+        assert resolver.local.get(batch.barcode) is not None
+        for callback in callbacks:
+            callback()
+        assert resolver.local.get(batch.barcode) is None
+
+    def test_medicine_save_invalidates_batch_price(self, django_capture_on_commit_callbacks):
+        med = MedicineFactory(price=Decimal("10.00"), units_per_pack=1)
+        batch = BatchFactory(medicine=med)
+        assert resolve_barcode(batch.barcode).unit_price == Decimal("10.00")
+        med.price = Decimal("12.00")
+        with django_capture_on_commit_callbacks(execute=True):
+            med.save()
+        assert resolve_barcode(batch.barcode).unit_price == Decimal("12.00")
+
+    def test_resolve_many_in_one_query(self, django_assert_num_queries):
+        batches = BatchFactory.create_batch(5)
+        with django_assert_num_queries(1):
+            matches = resolve_barcodes([b.barcode for b in batches])
+        assert {m.batch for m in matches.values()} == set(batches)
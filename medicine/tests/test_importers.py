@@ -0,0 +1,120 @@
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+
+from medicine.barcodes import resolve_barcode
+from medicine.importers import MedicineImporter, iter_rows
+from medicine.models import ActiveIngredient, Category, Manufacturer, Medicine
+from medicine.tests.factories import *
+
+
+CSV_HEADER = "name,international_barcode,active_ingredient,category,manufacturer,units_per_pack,price\n"
+
+
+def csv_rows(*lines):
+    return iter_rows(io.StringIO(CSV_HEADER + "".join(line + "\n" for line in lines)), "csv")
+
+
+@pytest.mark.django_db
+class TestMedicineImporter:
+    def run(self, rows, chunk_size=500):
+        return list(MedicineImporter(chunk_size=chunk_size).run(rows))
+
+    def test_creates_medicines_and_missing_related_records(self):
+        reports = self.run(csv_rows(
+            "Panadol,1234567890123,Paracetamol,Analgesics,GSK,10,25.00",
+            "Brufen,1234567890124,Ibuprofen,Analgesics,Abbott,20,30.50",
+        ))
+        assert [(r.created, r.updated, r.errors) for r in reports] == [(2, 0, [])]
+        assert set(ActiveIngredient.objects.values_list("name", flat=True)) == {"Paracetamol", "Ibuprofen"}
+        assert Manufacturer.objects.count() == 2
+        category = Category.objects.get(name="Analgesics")
+        assert category.is_root_node() and category.rght == category.lft + 1
+        brufen = Medicine.objects.get(international_barcode="1234567890124")
+        assert brufen.active_ingredient.name == "Ibuprofen"
+        assert brufen.units_per_pack == 20
+
+    def test_reuses_existing_related_records(self):
+        ingredient = ActiveIngredientFactory(name="Paracetamol")
+        category = CategoryFactory(name="Analgesics")
+        manufacturer = ManufacturerFactory(name="GSK")
+        self.run(csv_rows("Panadol,1234567890123,Paracetamol,Analgesics,GSK,10,25.00"))
+        medicine = Medicine.objects.get()
+        assert (medicine.active_ingredient, medicine.category, medicine.manufacturer) == (ingredient, category, manufacturer)
+        assert ActiveIngredient.objects.count() == Category.objects.count() == Manufacturer.objects.count() == 1
+
+    def test_upserts_on_international_barcode(self, django_capture_on_commit_callbacks):
+        medicine = MedicineFactory(international_barcode="1234567890123", price=10)
+        batch = BatchFactory(medicine=medicine)
+        assert resolve_barcode(batch.barcode).unit_price == medicine.unit_price
+
+        with django_capture_on_commit_callbacks(execute=True):
+            reports = self.run(csv_rows("Panadol Extra,1234567890123,Paracetamol,Analgesics,GSK,1,99.00"))
+        assert (reports[0].created, reports[0].updated) == (0, 1)
+        medicine.refresh_from_db()
+        assert medicine.name == "Panadol Extra"
+        assert medicine.price == 99
+        assert resolve_barcode(batch.barcode).unit_price == 99
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        MedicineFactory(name="Panadol", international_barcode="9999999999999")
+        reports = self.run(csv_rows(
+            "Panadol,1234567890123,Paracetamol,Analgesics,GSK,10,25.00",
+            "Brufen,123,Ibuprofen,Analgesics,Abbott,20,30.50",
+            "Aspirin,1234567890125,Aspirin,Analgesics,Bayer,0,-1",
+            "Cataflam,1234567890126,Diclofenac,Analgesics,Novartis,10,40.00",
+        ))
+        errors = dict(reports[0].errors)
+        assert set(errors) == {1, 2, 3}
+        assert "name" in errors[1]
+        assert "international_barcode" in errors[2]
+        assert {"units_per_pack", "price"} <= set(errors[3])
+        assert reports[0].created == 1
+        assert Medicine.objects.filter(name="Cataflam").exists()
+
+    def test_processes_rows_in_chunks(self):
+        lines = [f"Medicine {i},{1234567890000 + i},Ingredient {i % 3},Category,Maker,1,5.00" for i in range(7)]
+        reports = self.run(csv_rows(*lines), chunk_size=3)
+        assert [r.rows for r in reports] == [3, 3, 1]
+        assert sum(r.created for r in reports) == Medicine.objects.count() == 7
+
+    def test_new_categories_rebuild_the_tree_once(self, monkeypatch):
+        CategoryFactory(name="Vitamins")
+        rebuilds = []
+        rebuild = Category.objects.rebuild
+        monkeypatch.setattr(Category.objects, "rebuild", lambda: rebuilds.append(1) or rebuild())
+        lines = [
+            f"Medicine {i},{1234567890000 + i},Ingredient,{name},Maker,1,5.00"
+            for i, name in enumerate(["Zinc", "Antibiotics", "Cough", "Analgesics"])
+        ]
+        self.run(csv_rows(*lines), chunk_size=1)
+
+        assert len(rebuilds) == 1
+        roots = Category.objects.root_nodes().order_by("tree_id")
+        assert [root.name for root in roots] == ["Analgesics", "Antibiotics", "Cough", "Vitamins", "Zinc"]
+        assert all((root.lft, root.rght, root.level) == (1, 2, 0) for root in roots)
+
+    def test_jsonl_rows(self):
+        lines = [
+            json.dumps({"name": "Panadol", "international_barcode": "1234567890123",
+                        "active_ingredient": "Paracetamol", "category": "Analgesics",
+                        "manufacturer": "GSK", "manufacturer_country": "GB",
+                        "units_per_pack": 10, "price": "25.00"}),
+            "",
+            "{not json",
+        ]
+        reports = self.run(iter_rows(io.StringIO("\n".join(lines)), "jsonl"))
+        assert reports[0].created == 1
+        assert [row for row, _ in reports[0].errors] == [2]
+        assert Manufacturer.objects.get(name="GSK").country == "GB"
+
+    def test_import_command(self, tmp_path, capsys):
+        path = tmp_path / "catalog.csv"
+        path.write_text(CSV_HEADER + "Panadol,1234567890123,Paracetamol,Analgesics,GSK,10,25.00\n")
+        call_command("import_medicines", str(path), "--chunk-size", "10")
+        out = capsys.readouterr().out
+        assert "Chunk 1: 1 rows (1 created, 0 updated, 0 errors)" in out
+        assert "rows/s" in out
+        assert Medicine.objects.filter(name="Panadol").exists()
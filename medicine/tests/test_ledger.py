@@ -0,0 +1,128 @@
+import pytest
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from django.utils.timezone import now, timedelta
+from rest_framework.test import APIClient
+
+from medicine import stock
+from medicine.models import Batch, StockMovement, StockSnapshot
+from medicine.tests.factories import BatchFactory, MedicineFactory
+from sales.models import Invoice
+from users.tests.factories import UserFactory
+
+
+def in_days(days):
+    return now().date() + timedelta(days=days)
+
+
+def ledger(batch):
+    return list(
+        StockMovement.objects.filter(batch=batch).order_by("id").values_list("delta", "reason")
+    )
+
+
+@pytest.mark.django_db
+class TestStockMovementRecording:
+    def test_new_batch_records_receiving(self):
+        batch = BatchFactory(stock_units=10, expiry_date=in_days(30))
+        assert ledger(batch) == [(10, StockMovement.RECEIVING)]
+
+    def test_saved_change_records_adjustment(self):
+        batch = BatchFactory(stock_units=10, expiry_date=in_days(30))
+        batch = Batch.objects.get(pk=batch.pk)
+        batch.stock_units = 7
+        batch.save()
+        batch.save()
+        assert ledger(batch) == [(10, StockMovement.RECEIVING), (-3, StockMovement.ADJUSTMENT)]
+
+    def test_mutations_record_reason_source_and_user(self):
+        user = UserFactory()
+        batch = BatchFactory(stock_units=10, expiry_date=in_days(30))
+        invoice = Invoice.objects.create(payment_status="paid", discount=0)
+        with stock.acting_user(user):
+            stock.decrement(batch, 4, StockMovement.SALE, source=invoice)
+        movement = StockMovement.objects.filter(batch=batch).latest("id")
+        assert (movement.delta, movement.reason) == (-4, StockMovement.SALE)
+        assert movement.source == invoice
+        assert movement.user == user
+
+    def test_failed_decrement_records_nothing(self):
+        batch = BatchFactory(stock_units=2, expiry_date=in_days(30))
+        with pytest.raises(stock.InsufficientStock):
+            stock.decrement(batch, 3)
+        assert ledger(batch) == [(2, StockMovement.RECEIVING)]
+
+    def test_bulk_create_records_movements(self):
+        med = MedicineFactory()
+        batches = [
+            Batch(medicine=med, stock_units=units, expiry_date=in_days(30 + units))
+            for units in (3, 0, 5)
+        ]
+        Batch.objects.bulk_create_with_barcodes(batches)
+        assert sorted(StockMovement.objects.filter(batch__medicine=med).values_list("delta", flat=True)) == [3, 5]
+
+    def test_movements_are_append_only(self):
+        batch = BatchFactory(stock_units=1, expiry_date=in_days(30))
+        movement = StockMovement.objects.get(batch=batch)
+        movement.delta = 100
+        with pytest.raises(ValidationError):
+            movement.save()
+
+    def test_api_sale_is_attributed_to_request_user(self):
+        cashier = UserFactory(role="cashier")
+        client = APIClient()
+        client.force_authenticate(user=cashier)
+        batch = BatchFactory(stock_units=5, expiry_date=in_days(30))
+
+        response = client.post(
+            reverse("invoice-list"),
+            {"items": [{"barcode": batch.barcode, "quantity": 2}], "payment_status": "paid", "discount": 0},
+            format="json",
+        )
+        assert response.status_code == 201
+        sale = StockMovement.objects.get(batch=batch, reason=StockMovement.SALE)
+        assert (sale.delta, sale.user) == (-2, cashier)
+
+
+@pytest.mark.django_db
+class TestStockAsOf:
+    def test_replays_movements_after_latest_snapshot(self):
+        batch = BatchFactory(stock_units=10, expiry_date=in_days(30))
+        start = now()
+        StockMovement.objects.filter(batch=batch).update(created=start - timedelta(days=3))
+        StockSnapshot.objects.create(batch=batch, taken_at=start - timedelta(days=2), stock_units=10)
+        StockMovement.objects.create(batch=batch, delta=-4, reason=StockMovement.SALE,
+                                     created=start - timedelta(days=1))
+        StockMovement.objects.create(batch=batch, delta=-1, reason=StockMovement.SALE, created=start)
+
+        def as_of(moment):
+            return Batch.objects.with_stock_as_of(moment).get(pk=batch.pk).stock_as_of
+
+        assert as_of(start - timedelta(days=2, hours=12)) == 10
+        assert as_of(start - timedelta(hours=12)) == 6
+        assert as_of(start) == 5
+
+    def test_without_snapshot_sums_ledger(self):
+        batch = BatchFactory(stock_units=10, expiry_date=in_days(30))
+        stock.decrement(batch, 3)
+        assert Batch.objects.with_stock_as_of(now()).get(pk=batch.pk).stock_as_of == 7
+
+
+@pytest.mark.django_db
+class TestStockCommands:
+    def test_snapshot_stock(self):
+        batches = BatchFactory.create_batch(3, stock_units=4, expiry_date=in_days(30))
+        call_command("snapshot_stock", chunk_size=2)
+        assert StockSnapshot.objects.filter(batch__in=batches, stock_units=4).count() == 3
+
+    def test_reconcile_stock_reports_drift(self, capsys):
+        batch = BatchFactory(stock_units=10, expiry_date=in_days(30))
+        stock.decrement(batch, 2)
+        call_command("reconcile_stock")
+
+        Batch.objects.filter(pk=batch.pk).update(stock_units=50)
+        with pytest.raises(CommandError):
+            call_command("reconcile_stock")
+        assert "stock 50, ledger 8" in capsys.readouterr().out
@@ -2,7 +2,8 @@
 
 import pytest
 from medicine.tests.factories import SupplierFactory, ManufacturerFactory, CategoryFactory, ActiveIngredientFactory, MedicineFactory, BatchFactory
-from medicine.models import Supplier, Manufacturer, Category, ActiveIngredient, Medicine, Batch, generate_barcode
+from medicine.models import Supplier, Manufacturer, Category, ActiveIngredient, Medicine, Batch, generate_barcode, generate_unique_barcodes
+import medicine.models as medicine_models
 from cities_light.models import Country, City
 from django.db import IntegrityError
 from phonenumber_field.phonenumber import PhoneNumber
@@ -124,6 +125,33 @@ class TestMedicineModel:
         with pytest.raises(IntegrityError):
             MedicineFactory(international_barcode=barcode)
 
+    def test_search_vector_refreshed_only_when_searchable_fields_change(self, monkeypatch):
+        refreshed = []
+        monkeypatch.setattr(
+            medicine_models.MedicineQuerySet, "refresh_search_vector",
+            lambda queryset: refreshed.append(list(queryset.values_list("pk", flat=True))),
+        )
+        med = Medicine.objects.get(pk=MedicineFactory().pk)
+        refreshed.clear()
+
+        med.price = Decimal("12.00")
+        med.save()
+        assert refreshed == []
+
+        med.name = "Renamed"
+        med.save()
+        med.category = CategoryFactory()
+        med.save()
+        assert refreshed == [[med.pk], [med.pk]]
+
+        manufacturer = med.manufacturer
+        manufacturer.country = "EG"
+        manufacturer.save()
+        assert len(refreshed) == 2
+        manufacturer.name = "Renamed Maker"
+        manufacturer.save()
+        assert len(refreshed) == 3
+
 
 @pytest.mark.django_db
 class TestBatchModel:
@@ -141,6 +169,23 @@ class TestBatchModel:
         batch2 = BatchFactory(medicine=med, stock_units=13, expiry_date=now() + timedelta(days=15))
         assert med.stock == "8:2"
 
+    def test_with_stock_annotations(self):
+        med = MedicineFactory(units_per_pack=3)
+        empty = MedicineFactory(units_per_pack=2)
+        BatchFactory(medicine=med, stock_units=13, expiry_date=now().date() + timedelta(days=10))
+        BatchFactory(medicine=med, stock_units=4, expiry_date=now().date() - timedelta(days=1))
+
+        annotated = Medicine.objects.with_stock().get(id=med.id)
+        assert annotated.total_units == 17
+        assert annotated.unexpired_units == 13
+        assert annotated.stock == "5:2"
+        assert annotated.is_available
+
+        annotated_empty = Medicine.objects.with_stock().get(id=empty.id)
+        assert annotated_empty.total_units == 0
+        assert annotated_empty.stock == "0:0"
+        assert not annotated_empty.is_available
+
     def test_negative_stock_units_fails(self):
         med = MedicineFactory(units_per_pack=2)
         batch = BatchFactory.build(medicine=med, stock_units=-5, expiry_date=now() + timedelta(days=10))
@@ -163,3 +208,99 @@ class TestBatchModel:
 
         with pytest.raises(ValidationError):
             batch.full_clean()
+
+    def test_generate_unique_barcodes_skips_taken(self, monkeypatch, django_assert_num_queries):
+        taken = BatchFactory(barcode="1" * 16).barcode
+        candidates = iter([taken, "2" * 16, "2" * 16, "3" * 16, "4" * 16])
+        monkeypatch.setattr(medicine_models, "generate_barcode", lambda: next(candidates))
+
+        # one IN query for the first round, one more for the regenerated collision
+        with django_assert_num_queries(2):
+            barcodes = generate_unique_barcodes(2, reserved=["3" * 16])
+        assert sorted(barcodes) == ["2" * 16, "4" * 16]
+
+    def test_bulk_create_with_barcodes(self, django_assert_num_queries):
+        med = MedicineFactory()
+        today = now().date()
+        batches = [
+            Batch(medicine=med, expiry_date=today + timedelta(days=30 * i), stock_units=i)
+            for i in range(1, 6)
+        ]
+        # per chunk: collision check, INSERT, stored stock UPDATE and ledger INSERT
+        with django_assert_num_queries(8):
+            created = Batch.objects.bulk_create_with_barcodes(batches, chunk_size=3)
+        barcodes = {batch.barcode for batch in created}
+        assert len(barcodes) == 5 and all(len(barcode) == 16 for barcode in barcodes)
+        assert set(Batch.objects.values_list("barcode", flat=True)) == barcodes
+        med.refresh_from_db()
+        assert med.sellable_units == 15 and med.is_available
+
+
+@pytest.mark.django_db
+class TestMedicineStoredStock:
+
+    def stored(self, med):
+        med.refresh_from_db()
+        return med.sellable_units, med.is_available
+
+    def test_batch_writes_update_stored_stock(self):
+        med = MedicineFactory()
+        assert self.stored(med) == (0, False)
+
+        batch = BatchFactory(medicine=med, stock_units=10, expiry_date=now().date() + timedelta(days=30))
+        BatchFactory(medicine=med, stock_units=7, expiry_date=now().date() + timedelta(days=60))
+        assert self.stored(med) == (17, True)
+
+        batch.stock_units -= 4
+        batch.save()
+        assert self.stored(med) == (13, True)
+
+        Batch.objects.get(pk=batch.pk).delete()
+        assert self.stored(med) == (7, True)
+
+        Batch.objects.filter(medicine=med).delete()
+        assert self.stored(med) == (0, False)
+
+    def test_expired_batches_are_not_sellable(self):
+        med = MedicineFactory()
+        BatchFactory(medicine=med, stock_units=5, expiry_date=now().date() - timedelta(days=1))
+        assert self.stored(med) == (0, False)
+
+    def test_moving_batch_between_medicines(self):
+        first, second = MedicineFactory(), MedicineFactory()
+        batch = BatchFactory(medicine=first, stock_units=5, expiry_date=now().date() + timedelta(days=30))
+        batch.medicine = second
+        batch.save()
+        assert self.stored(first) == (0, False)
+        assert self.stored(second) == (5, True)
+
+    def test_saving_stale_medicine_keeps_stored_stock(self):
+        med = MedicineFactory()
+        stale = Medicine.objects.get(pk=med.pk)
+        BatchFactory(medicine=med, stock_units=5, expiry_date=now().date() + timedelta(days=30))
+        stale.price = 42
+        stale.save()
+        assert self.stored(med) == (5, True)
+
+    def test_rebuild_and_verify(self):
+        med = MedicineFactory()
+        BatchFactory(medicine=med, stock_units=5, expiry_date=now().date() + timedelta(days=30))
+        Medicine.objects.filter(pk=med.pk).update(sellable_units=0, is_available=False)
+        assert list(Medicine.objects.stale_stock()) == [med]
+
+        assert Medicine.objects.rebuild_stock() == 1
+        assert self.stored(med) == (5, True)
+        assert not Medicine.objects.stale_stock().exists()
+
+    def test_rebuild_command(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        med = MedicineFactory()
+        BatchFactory(medicine=med, stock_units=5, expiry_date=now().date() + timedelta(days=30))
+        Medicine.objects.filter(pk=med.pk).update(sellable_units=1)
+        with pytest.raises(CommandError):
+            call_command("rebuild_medicine_stock", "--verify")
+        call_command("rebuild_medicine_stock")
+        call_command("rebuild_medicine_stock", "--verify")
+        assert self.stored(med) == (5, True)
@@ -0,0 +1,59 @@
+import pytest
+from django.utils.timezone import now, timedelta
+
+from medicine.models import Medicine
+from medicine.similars import get_alternatives, rank_alternatives
+from medicine.tests.factories import ActiveIngredientFactory, BatchFactory, CategoryFactory, MedicineFactory
+
+
+@pytest.mark.django_db
+class TestAlternatives:
+    def setup_method(self):
+        self.ingredient = ActiveIngredientFactory(name="Paracetamol")
+        self.oral = CategoryFactory(name="Oral")
+        self.tablets = CategoryFactory(name="Tablets", parent=self.oral)
+        self.coated = CategoryFactory(name="Coated", parent=self.tablets)
+        self.syrups = CategoryFactory(name="Syrups", parent=self.oral)
+        self.topical = CategoryFactory(name="Topical")
+
+    def test_groups_include_descendant_categories(self):
+        parent = MedicineFactory(active_ingredient=self.ingredient, category=self.oral)
+        tablet = MedicineFactory(active_ingredient=self.ingredient, category=self.tablets)
+        coated = MedicineFactory(active_ingredient=self.ingredient, category=self.coated)
+        syrup = MedicineFactory(active_ingredient=self.ingredient, category=self.syrups)
+        MedicineFactory(active_ingredient=self.ingredient, category=self.topical)
+        MedicineFactory(category=self.tablets)
+
+        assert get_alternatives(parent.id) == sorted([tablet.id, coated.id, syrup.id])
+        assert get_alternatives(tablet.id) == [coated.id]
+        assert get_alternatives(coated.id) == []
+        assert get_alternatives(0) is None
+
+    def test_cached_until_medicine_write(self, django_assert_num_queries, django_capture_on_commit_callbacks):
+        med = MedicineFactory(active_ingredient=self.ingredient, category=self.oral)
+        assert get_alternatives(med.id) == []
+        with django_assert_num_queries(0):
+            assert get_alternatives(med.id) == []
+
+        with django_capture_on_commit_callbacks(execute=True):
+            other = MedicineFactory(active_ingredient=self.ingredient, category=self.tablets)
+        assert get_alternatives(med.id) == [other.id]
+
+        other.category = self.topical
+        with django_capture_on_commit_callbacks(execute=True):
+            other.save()
+        assert get_alternatives(med.id) == []
+
+    def test_rank_by_stock_and_price(self):
+        expiry = now().date() + timedelta(days=60)
+        cheap = MedicineFactory(active_ingredient=self.ingredient, category=self.oral, price=10, units_per_pack=10)
+        stocked = MedicineFactory(active_ingredient=self.ingredient, category=self.oral, price=30, units_per_pack=10)
+        empty = MedicineFactory(active_ingredient=self.ingredient, category=self.oral, price=1, units_per_pack=10)
+        BatchFactory(medicine=cheap, stock_units=5, expiry_date=expiry)
+        BatchFactory(medicine=stocked, stock_units=50, expiry_date=expiry)
+        ids = [cheap.id, stocked.id, empty.id]
+
+        by_stock = rank_alternatives(Medicine.objects.all(), ids, "stock")
+        assert list(by_stock) == [stocked, cheap, empty]
+        by_price = rank_alternatives(Medicine.objects.all(), ids, "price")
+        assert list(by_price) == [cheap, stocked, empty]
@@ -0,0 +1,135 @@
+import threading
+
+import pytest
+from django.db import connection, transaction
+from django.utils.timezone import now, timedelta
+
+from medicine import stock
+from medicine.barcodes import resolve_barcode, resolver
+from medicine.models import Batch, Medicine
+from medicine.tests.factories import BatchFactory, MedicineFactory
+
+
+def in_days(days):
+    return now().date() + timedelta(days=days)
+
+
+@pytest.mark.django_db
+class TestStockMutations:
+    def test_decrement_and_increment(self, django_capture_on_commit_callbacks):
+        batch = BatchFactory(stock_units=10, expiry_date=in_days(30))
+        assert resolve_barcode(batch.barcode).stock_units == 10
+
+        with django_capture_on_commit_callbacks(execute=True):
+            stock.decrement(batch, 4)
+        assert batch.stock_units == 6
+        assert Batch.objects.get(pk=batch.pk).stock_units == 6
+        assert Medicine.objects.get(pk=batch.medicine_id).sellable_units == 6
+        assert resolve_barcode(batch.barcode).stock_units == 6
+
+        stock.increment(batch, 2)
+        assert Batch.objects.get(pk=batch.pk).stock_units == 8
+        assert Medicine.objects.get(pk=batch.medicine_id).sellable_units == 8
+
+    def test_decrement_uses_database_value_not_instance(self):
+        batch = BatchFactory(stock_units=5, expiry_date=in_days(30))
+        stale = Batch.objects.get(pk=batch.pk)
+        Batch.objects.filter(pk=batch.pk).update(stock_units=2)
+
+        with pytest.raises(stock.InsufficientStock) as excinfo:
+            stock.decrement(stale, 3)
+        assert (excinfo.value.requested, excinfo.value.available) == (3, 2)
+        assert Batch.objects.get(pk=batch.pk).stock_units == 2
+
+    def test_expired_batch_does_not_touch_sellable_units(self):
+        med = MedicineFactory()
+        batch = BatchFactory(medicine=med, stock_units=5, expiry_date=in_days(-1))
+        stock.increment(batch, 5)
+        assert Medicine.objects.get(pk=med.pk).sellable_units == 0
+
+    def test_saving_after_mutation_does_not_double_count(self):
+        batch = BatchFactory(stock_units=10, expiry_date=in_days(30))
+        stock.decrement(batch, 3)
+        batch.save()
+        assert Medicine.objects.get(pk=batch.medicine_id).sellable_units == 7
+
+    def test_decrement_many_in_one_update(self, django_assert_num_queries):
+        med = MedicineFactory()
+        first = BatchFactory(medicine=med, stock_units=10, expiry_date=in_days(30))
+        second = BatchFactory(medicine=med, stock_units=5, expiry_date=in_days(60))
+
+        # savepoint, UPDATE, release, ledger INSERT, stored stock UPDATE
+        with django_assert_num_queries(5):
+            stock.decrement_many([(first, 2), (second, 5), (first, 1)])
+        assert dict(Batch.objects.filter(medicine=med).values_list("pk", "stock_units")) == {
+            first.pk: 7, second.pk: 0,
+        }
+        assert first.stock_units == 7
+        assert Medicine.objects.get(pk=med.pk).sellable_units == 7
+
+    def test_decrement_many_is_all_or_nothing(self):
+        first = BatchFactory(stock_units=10, expiry_date=in_days(30))
+        second = BatchFactory(stock_units=2, expiry_date=in_days(30))
+
+        with pytest.raises(stock.InsufficientStock) as excinfo:
+            stock.decrement_many([(first, 4), (second, 3)])
+        assert (excinfo.value.batch_id, excinfo.value.available) == (second.pk, 2)
+        assert Batch.objects.get(pk=first.pk).stock_units == 10
+        assert first.stock_units == 10
+
+    def test_cached_lookups_dropped_on_commit_only(self, django_capture_on_commit_callbacks):
+        first = BatchFactory(stock_units=10, expiry_date=in_days(30))
+        second = BatchFactory(stock_units=5, expiry_date=in_days(30))
+        assert resolve_barcode(first.barcode).stock_units == 10
+
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                stock.decrement_many([(Batch.objects.get(pk=first.pk), 4), (second, 1)])
+                transaction.set_rollback(True)
+        assert callbacks == []
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            stock.decrement_many([(first, 4), (second, 1)])
+        # until the commit, other workers keep reading the committed stock
+        assert resolver.local.get(first.barcode) is not None
+        callback, = callbacks
+        callback()
+        assert resolver.local.get(first.barcode) is None
+        assert resolve_barcode(first.barcode).stock_units == 6
+        assert resolve_barcode(second.barcode).stock_units == 4
+
+
+@pytest.mark.skipif(connection.vendor != "postgresql", reason="needs concurrent connections")
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_decrements_never_oversell():
+    batch = BatchFactory(stock_units=20, expiry_date=in_days(30))
+    workers, quantity = 16, 3
+    start = threading.Barrier(workers, timeout=10)
+    sold, refused, errors = [], [], []
+
+    def sell():
+        try:
+            instance = Batch.objects.get(pk=batch.pk)
+            start.wait()
+            with transaction.atomic():
+                stock.decrement(instance, quantity)
+            sold.append(quantity)
+        except stock.InsufficientStock:
+            refused.append(quantity)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=sell) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    batch.refresh_from_db()
+    assert errors == []
+    assert len(sold) == 20 // quantity
+    assert len(refused) == workers - len(sold)
+    assert batch.stock_units == 20 - sum(sold)
+    assert Medicine.objects.get(pk=batch.medicine_id).sellable_units == batch.stock_units
@@ -3,11 +3,14 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 from medicine.models import Medicine
+from medicine.paginations import BatchCursorPagination, MedicineCursorPagination
 from users.tests.factories import UserFactory 
 from medicine.tests.factories import * 
 from django.utils.timezone import now , timedelta
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
 
 
 
@@ -56,6 +59,17 @@ class TestMedicineAPI:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data["results"]) == 3
 
+    def test_list_medicines_query_count_is_constant(self, django_assert_num_queries):
+        for med in MedicineFactory.create_batch(10):
+            BatchFactory.create_batch(3, medicine=med)
+
+        # count + page + prefetched barcodes, whatever the number of batches
+        with django_assert_num_queries(3):
+            response = self.client.get(self.url)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["results"]) == 10
+        assert all(len(m["barcodes"]) == 3 for m in response.data["results"])
+
     def test_get_medicine(self):
         med = MedicineFactory()
         url = reverse("medicine-detail",kwargs={"pk":med.id})
@@ -87,6 +101,27 @@ class TestMedicineAPI:
         response = self.client.get(url)
         assert response.status_code == 200
         assert len(response.data['similars']) == 1
+
+    def test_similar_medicines_ranked_and_cached(self, django_assert_num_queries):
+        active = ActiveIngredientFactory(name="Paracetamol")
+        category = CategoryFactory(name="oral")
+        child = CategoryFactory(name="tablets", parent=category)
+        med = MedicineFactory(active_ingredient=active, category=category)
+        low = MedicineFactory(active_ingredient=active, category=child)
+        high = MedicineFactory(active_ingredient=active, category=category)
+        BatchFactory(medicine=low, stock_units=3, expiry_date=now().date() + timedelta(days=60))
+        BatchFactory(medicine=high, stock_units=30, expiry_date=now().date() + timedelta(days=60))
+        url = reverse("medicine-similars", kwargs={"id": med.id})
+
+        self.client.get(url)
+        # with cached alternatives: the alternatives and their barcodes only
+        with django_assert_num_queries(2):
+            response = self.client.get(url)
+        assert [row["id"] for row in response.data["similars"]] == [high.id, low.id]
+
+    def test_similar_medicines_unknown(self):
+        url = reverse("medicine-similars", kwargs={"id": 999999})
+        assert self.client.get(url).status_code == 404
       
 @pytest.mark.django_db
 class TestBatchAPI:
@@ -109,6 +144,27 @@ class TestBatchAPI:
         assert res.status_code == 200 
         assert (res.data["count"]) == 2 
 
+    def test_list_batches_cursor_pagination(self):
+        med = MedicineFactory()
+        today = now().date()
+        batches = [
+            BatchFactory(medicine=med, expiry_date=today + timedelta(days=30 * i))
+            for i in (3, 1, 2)
+        ]
+        url = reverse("medicine-batches", kwargs={"id": med.id}) + "?pagination=cursor&size=2"
+        res = self.client.get(url)
+        assert res.status_code == 200
+        assert len(res.data["results"]) == 2
+        res2 = self.client.get(res.data["next"])
+        assert res2.data["next"] is None
+        barcodes = [b["barcode"] for b in res.data["results"] + res2.data["results"]]
+        assert barcodes == [b.barcode for b in sorted(batches, key=lambda b: b.expiry_date)]
+
+        for position in (["2024-01-01", "abc"], ["not-a-date", 1]):
+            cursor = BatchCursorPagination().encode_cursor(position)
+            res = self.client.get(reverse("medicine-batches", kwargs={"id": med.id}) + f"?cursor={cursor}")
+            assert res.status_code == 404
+
     def test_create_batches(self):
         med = MedicineFactory()
         data = {
@@ -216,6 +272,42 @@ class TestMedicineAPIExtended:
         response2 = self.client.get(self.url + "?page=2")
         assert response2.status_code == 200
 
+    def test_medicine_cursor_pagination_walks_catalog(self):
+        meds = MedicineFactory.create_batch(25)
+        url = self.url + "?pagination=cursor&size=10"
+        names = []
+        while url:
+            response = self.client.get(url)
+            assert response.status_code == 200
+            assert "count" not in response.data
+            names += [m["name"] for m in response.data["results"]]
+            url = response.data["next"]
+        assert len(names) == len(meds)
+        assert names == list(Medicine.objects.order_by("name", "id").values_list("name", flat=True))
+
+    def test_cursor_pagination_allows_large_pages(self):
+        MedicineFactory.create_batch(30)
+        response = self.client.get(self.url + "?pagination=cursor&size=100")
+        assert len(response.data["results"]) == 30
+        assert response.data["next"] is None
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url + "?cursor=not-a-cursor")
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize("position", [["Panadol", "abc"], ["Panadol", None], ["Panadol"]])
+    def test_tampered_cursor(self, position):
+        cursor = MedicineCursorPagination().encode_cursor(position)
+        response = self.client.get(self.url + f"?cursor={cursor}")
+        assert response.status_code == 404
+
+    def test_cursor_pagination_rejects_search(self):
+        MedicineFactory(name="Zyrtec")
+        response = self.client.get(self.url + "?search=zyr&pagination=cursor")
+        assert response.status_code == 400
+        assert "search" in response.data
+        assert self.client.get(self.url + "?search=zyr").status_code == 200
+
     def test_search_by_name(self):
         med = MedicineFactory(name="Zyrtec")
         response = self.client.get(self.url + "?search=zyr")
@@ -235,3 +327,233 @@ class TestMedicineAPIExtended:
         response = self.client.get(self.url + "?search=pain")
         assert response.status_code == 200
         assert any(m["name"] == med.name for m in response.data["results"])
+
+    def test_search_by_manufacturer(self):
+        manufacturer = ManufacturerFactory(name="Pharco")
+        med = MedicineFactory(manufacturer=manufacturer)
+        response = self.client.get(self.url + "?search=pharco")
+        assert response.status_code == 200
+        assert [m["name"] for m in response.data["results"]] == [med.name]
+
+    def test_search_ranks_name_matches_first(self):
+        ibuprofen = ActiveIngredientFactory(name="Ibuprofen")
+        MedicineFactory(name="Brufen", active_ingredient=ibuprofen)
+        MedicineFactory(name="Ibuprofen Forte")
+        response = self.client.get(self.url + "?search=ibuprofen")
+        assert response.status_code == 200
+        assert [m["name"] for m in response.data["results"]] == ["Ibuprofen Forte", "Brufen"]
+
+
+@pytest.mark.django_db
+class TestBarcodeLookupAPI:
+    def setup_method(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=UserFactory(role="cashier"))
+
+    def test_lookup_batch_barcode(self):
+        med = MedicineFactory(units_per_pack=2)
+        batch = BatchFactory(medicine=med, stock_units=5)
+        url = reverse("barcode-lookup", kwargs={"barcode": batch.barcode})
+        res = self.client.get(url)
+        assert res.status_code == 200
+        assert res.data["kind"] == "batch"
+        assert res.data["batch_id"] == batch.id
+        assert res.data["medicine"] == med.name
+        assert res.data["unit_price"] == str(med.unit_price)
+        assert res.data["stock"] == "2:1"
+        assert res.data["expiry_date"] == batch.expiry_date.strftime("%Y-%m")
+
+    def test_lookup_international_barcode(self):
+        med = MedicineFactory()
+        res = self.client.get(reverse("barcode-lookup", kwargs={"barcode": med.international_barcode}))
+        assert res.status_code == 200
+        assert res.data["kind"] == "medicine"
+        assert res.data["batch_id"] is None
+        assert res.data["stock_units"] == 0
+
+    def test_lookup_unknown_barcode(self):
+        res = self.client.get(reverse("barcode-lookup", kwargs={"barcode": "123"}))
+        assert res.status_code == 404
+
+
+@pytest.mark.django_db
+class TestMedicineImportAPI:
+    def setup_method(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=UserFactory(role="pharmacist"))
+        self.url = reverse("medicine-import")
+
+    def upload(self, name, content):
+        return self.client.post(
+            self.url, {"file": SimpleUploadedFile(name, content.encode())}, format="multipart"
+        )
+
+    def test_import_csv(self):
+        response = self.upload(
+            "catalog.csv",
+            "name,international_barcode,active_ingredient,category,manufacturer,units_per_pack,price\n"
+            "Panadol,1234567890123,Paracetamol,Analgesics,GSK,10,25.00\n"
+            "Brufen,123,Ibuprofen,Analgesics,Abbott,20,30.50\n",
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["rows"] == 2
+        assert response.data["created"] == 1
+        assert response.data["errors"][0]["row"] == 2
+        assert Medicine.objects.filter(name="Panadol").exists()
+
+    def test_unknown_format_rejected(self):
+        response = self.upload("catalog.txt", "name\n")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_cashier_forbidden(self):
+        self.client.force_authenticate(user=UserFactory(role="cashier"))
+        response = self.upload("catalog.csv", "name\n")
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestBatchBulkCreateAPI:
+    def setup_method(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=UserFactory(role="pharmacist"))
+        self.url = reverse("batch-bulk-create")
+        self.expiry = (now().date() + timedelta(days=400)).strftime("%Y-%m")
+
+    def test_bulk_create_across_medicines(self, django_assert_max_num_queries):
+        medicines = MedicineFactory.create_batch(3, units_per_pack=10)
+        data = {"batches": [
+            {"medicine": med.id, "expiry_date": self.expiry, "packs": 2, "units": 3}
+            for med in medicines
+        ]}
+        # medicines, existing lots, collision check and one INSERT, whatever the size
+        with django_assert_max_num_queries(8):
+            response = self.client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(response.data) == 3
+        assert {row["stock_packets"] for row in response.data} == {"2:3"}
+        assert Batch.objects.filter(stock_units=23).count() == 3
+
+    def test_many_batches_in_one_request(self):
+        related = {
+            "active_ingredient": ActiveIngredientFactory(),
+            "category": CategoryFactory(),
+            "manufacturer": ManufacturerFactory(),
+        }
+        medicines = [MedicineFactory(name=f"Medicine {i}", **related) for i in range(300)]
+        data = {"batches": [
+            {"medicine": med.id, "expiry_date": self.expiry, "packs": 1}
+            for med in medicines
+        ]}
+        response = self.client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Batch.objects.values("barcode").distinct().count() == 300
+
+    def test_invalid_batch_rolls_back_everything(self):
+        med = MedicineFactory()
+        BatchFactory(medicine=med, expiry_date=(now().date() + timedelta(days=400)).replace(day=1))
+        other = MedicineFactory()
+        data = {"batches": [
+            {"medicine": other.id, "expiry_date": self.expiry, "packs": 1},
+            {"medicine": med.id, "expiry_date": self.expiry, "packs": 1},
+        ]}
+        response = self.client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["batches"][1]["expiry_date"]
+        assert Batch.objects.count() == 1
+
+    def test_duplicate_lots_and_unknown_medicine_rejected(self):
+        med = MedicineFactory()
+        data = {"batches": [
+            {"medicine": med.id, "expiry_date": self.expiry, "packs": 1},
+            {"medicine": med.id, "expiry_date": self.expiry, "packs": 2},
+            {"medicine": 999999, "expiry_date": self.expiry, "packs": 2},
+        ]}
+        response = self.client.post(self.url, data, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        errors = response.data["batches"]
+        assert not errors[0] and errors[1]["expiry_date"] and errors[2]["medicine"]
+        assert not Batch.objects.exists()
+
+
+@pytest.mark.django_db
+class TestMedicineAvailabilityFilter:
+    def setup_method(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=UserFactory(role="pharmacist"))
+        self.url = reverse("medicine-list")
+
+    def test_filter_and_sort_on_stored_stock(self):
+        empty = MedicineFactory(name="Empty")
+        low = MedicineFactory(name="Low")
+        high = MedicineFactory(name="High")
+        BatchFactory(medicine=low, stock_units=2, expiry_date=now().date() + timedelta(days=30))
+        BatchFactory(medicine=high, stock_units=50, expiry_date=now().date() + timedelta(days=30))
+
+        res = self.client.get(self.url, {"available": "true"})
+        assert [row["name"] for row in res.data["results"]] == ["High", "Low"]
+
+        res = self.client.get(self.url, {"available": "false"})
+        assert [row["name"] for row in res.data["results"]] == [empty.name]
+
+        res = self.client.get(self.url, {"ordering": "-stock"})
+        assert [row["name"] for row in res.data["results"]] == ["High", "Low", "Empty"]
+
+    def test_listing_reads_stored_stock_without_aggregating_batches(self):
+        medicine = MedicineFactory(name="Stocked", units_per_pack=3)
+        BatchFactory(medicine=medicine, stock_units=7, expiry_date=now().date() + timedelta(days=30))
+        BatchFactory(medicine=medicine, stock_units=4, expiry_date=now().date() - timedelta(days=1))
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(self.url, {"available": "true"})
+        assert res.data["results"][0]["stock"] == "2:1"
+        assert not any("GROUP BY" in query["sql"] for query in context.captured_queries)
+
+        res = self.client.get(reverse("medicine-detail", kwargs={"pk": medicine.pk}))
+        assert res.data["stock"] == "2:1"
+
+
+@pytest.mark.django_db
+class TestCategoryTree:
+    def setup_method(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=UserFactory(role="pharmacist"))
+        self.oral = CategoryFactory(name="Oral")
+        self.tablets = CategoryFactory(name="Tablets", parent=self.oral)
+        self.coated = CategoryFactory(name="Coated", parent=self.tablets)
+        self.syrups = CategoryFactory(name="Syrups", parent=self.oral)
+        self.topical = CategoryFactory(name="Topical")
+
+    def test_nested_tree_is_cached(self, django_assert_num_queries, django_capture_on_commit_callbacks):
+        url = reverse("category-tree")
+        with django_assert_num_queries(1):
+            response = self.client.get(url)
+        assert response.status_code == 200
+        assert response.data == [
+            {"id": self.oral.id, "name": "Oral", "children": [
+                {"id": self.syrups.id, "name": "Syrups", "children": []},
+                {"id": self.tablets.id, "name": "Tablets", "children": [
+                    {"id": self.coated.id, "name": "Coated", "children": []},
+                ]},
+            ]},
+            {"id": self.topical.id, "name": "Topical", "children": []},
+        ]
+        with django_assert_num_queries(0):
+            self.client.get(url)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            CategoryFactory(name="Creams", parent=self.topical)
+        response = self.client.get(url)
+        assert response.data[1]["children"][0]["name"] == "Creams"
+
+    def test_medicine_category_filter_includes_descendants(self):
+        coated = MedicineFactory(name="Coated one", category=self.coated)
+        syrup = MedicineFactory(name="Syrup one", category=self.syrups)
+        MedicineFactory(name="Cream one", category=self.topical)
+        url = reverse("medicine-list")
+
+        res = self.client.get(url, {"category": self.oral.id})
+        assert [row["id"] for row in res.data["results"]] == [coated.id, syrup.id]
+        res = self.client.get(url, {"category": self.tablets.id})
+        assert [row["id"] for row in res.data["results"]] == [coated.id]
+        res = self.client.get(url, {"category": 999999})
+        assert res.data["results"] == []
@@ -8,11 +8,15 @@ URL Patterns:
     - active_ingredients/: ActiveIngredient CRUD operations
     - manufacturers/: Manufacturer CRUD operations
     - categories/: Category CRUD operations
+    - categories/tree/: Nested category hierarchy
     - /: Medicine list and creation
     - <pk>/: Medicine detail, update, delete
     - <id>/similars/: Find similar medicines
     - <id>/batches/: Batch operations for specific medicine
     - <medicine_id>/<batch_id>/: Specific batch operations
+    - barcodes/<barcode>/: Resolve a batch or international barcode
+    - import/: Bulk medicine import from a CSV or JSONL upload
+    - batches/bulk/: Create many batches in one request
 """
 
 from django.urls import path
@@ -23,9 +27,13 @@ from medicine.views import (
     BatchRetrieveUpdateDestroyAPIView,
     MedicineRetrieveUpdateDestroyAPIView,
     CategoryListCreateAPIView,
+    CategoryTreeAPIView,
     ActiveIngredientListCreateAPIView,
     SupplierListCreateAPIView,
-    ManufacturerListCreateAPIView
+    ManufacturerListCreateAPIView,
+    BarcodeLookupAPIView,
+    MedicineImportAPIView,
+    BatchBulkCreateAPIView
 )
 
 urlpatterns = [
@@ -35,6 +43,7 @@ urlpatterns = [
     path("manufacturers/", ManufacturerListCreateAPIView.as_view(), 
          name="manufacturer-list"),
     path("categories/", CategoryListCreateAPIView.as_view(), name="category-list"),
+    path("categories/tree/", CategoryTreeAPIView.as_view(), name="category-tree"),
     path("", MedicineListCreateAPIView.as_view(), name="medicine-list"),
     path("<int:pk>/", MedicineRetrieveUpdateDestroyAPIView.as_view(), 
          name="medicine-detail"),
@@ -45,4 +54,8 @@ urlpatterns = [
     path("<int:medicine_id>/<int:batch_id>/", 
          BatchRetrieveUpdateDestroyAPIView.as_view(), 
          name="batch-detail"),
+    path("barcodes/<str:barcode>/", BarcodeLookupAPIView.as_view(),
+         name="barcode-lookup"),
+    path("import/", MedicineImportAPIView.as_view(), name="medicine-import"),
+    path("batches/bulk/", BatchBulkCreateAPIView.as_view(), name="batch-bulk-create"),
 ]
\ No newline at end of file
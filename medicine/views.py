@@ -1,18 +1,34 @@
 """ Views:
     - CRUD views for all medicine-related models
-    - Specialized views for medicine batches and similar medicines """
+    - Specialized views for medicine batches and similar medicines
+    - Barcode lookup for point-of-sale scanning
+    - Bulk medicine catalog import and bulk batch receiving """
+import io
+
 from django.shortcuts import render, get_object_or_404
 
 
 
-from users.permissions import IsPharmacist
+from users.permissions import IsPharmacist, IsCashier
 from medicine.models import Medicine, Batch, ActiveIngredient, Manufacturer, Supplier, Category
-from medicine.serializers import MedicineInSerializer, MedicineOutSerializer, BatchInSerializer, BatchOutSerializer,ActiveIngredientSerializer,CategorySerializer,ManufacturerSerializer,SupplierSerializer
+from medicine.serializers import MedicineInSerializer, MedicineOutSerializer, BatchInSerializer, BatchOutSerializer,ActiveIngredientSerializer,CategorySerializer,ManufacturerSerializer,SupplierSerializer,BarcodeLookupSerializer,MedicineImportSerializer,BatchBulkCreateSerializer
+from medicine.barcodes import resolve_barcode
+from medicine.importers import MedicineImporter, iter_rows
+from medicine.similars import RANKINGS, get_alternatives, rank_alternatives
+from medicine.categories import get_category_tree
 from rest_framework import generics
-from medicine.paginations import MedicinePagination
+from rest_framework.parsers import MultiPartParser
+from medicine.paginations import (
+    MedicinePagination,
+    MedicineCursorPagination,
+    BatchCursorPagination,
+    SelectablePaginationMixin,
+)
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.filters import SearchFilter
+from medicine.search import MedicineSearchFilter
+from medicine.filters import MedicineFilter
+from django_filters.rest_framework import DjangoFilterBackend
 from django.http import Http404
 
 # Create your views here.
@@ -46,20 +62,41 @@ class CategoryListCreateAPIView(generics.ListCreateAPIView):
     serializer_class = CategorySerializer
 
 
-class MedicineListCreateAPIView(generics.ListCreateAPIView):
+class CategoryTreeAPIView(generics.GenericAPIView):
+    """
+    API endpoint returning the whole category hierarchy as a nested tree.
+
+    Served from the cache (see medicine.categories); a miss costs one query.
+    """
+    permission_classes = [IsPharmacist]
+
+    def get(self, request):
+        """Return the root categories with their nested children."""
+        return Response(get_category_tree(), status=status.HTTP_200_OK)
+
+
+class MedicineListCreateAPIView(SelectablePaginationMixin, generics.ListCreateAPIView):
     """
     API endpoint for listing and creating Medicines.
     
     Features:
-    - Search functionality
-    - Custom pagination
+    - Ranked full-text/trigram search (see medicine.search)
+    - ?available= filter and ?ordering=stock sorts on stored stock (see medicine.filters)
+    - Stock read from the stored sellable units, without aggregating batches
+    - ?category= filter including subcategories
+    - Page-number pagination, or keyset pagination on (name, id) with
+      ?pagination=cursor; ranked search results are paged by number only
     - Different serializers for GET vs POST
     """
-    filter_backends = [SearchFilter]
-    search_fields = ['name', 'active_ingredient', 'category']
+    filter_backends = [DjangoFilterBackend, MedicineSearchFilter]
+    filterset_class = MedicineFilter
     permission_classes = [IsPharmacist]
     pagination_class = MedicinePagination
-    queryset = Medicine.objects.select_related("active_ingredient", "category")
+    cursor_pagination_class = MedicineCursorPagination
+    cursor_excluded_params = (MedicineSearchFilter.search_param,)
+    queryset = Medicine.objects.with_stored_stock().with_barcodes().select_related(
+        "active_ingredient", "category", "manufacturer"
+    ).order_by("name", "id")
 
     def get_serializer_class(self):
         """Use MedicineOutSerializer for GET, MedicineInSerializer for POST."""
@@ -73,7 +110,9 @@ class MedicineRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView
     API endpoint for retrieving, updating, and deleting individual Medicines.
     """
     permission_classes = [IsPharmacist]
-    queryset = Medicine.objects.select_related("active_ingredient", "category")
+    queryset = Medicine.objects.with_stored_stock().with_barcodes().select_related(
+        "active_ingredient", "category", "manufacturer"
+    )
 
     def get_serializer_class(self):
         """Use MedicineOutSerializer for GET, MedicineInSerializer for others."""
@@ -85,20 +124,30 @@ class MedicineRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView
 class SimilarMedicinesAPIView(generics.GenericAPIView):
     """
     API endpoint for finding medicines with the same active ingredient and category.
+
+    Alternatives are cached per medicine (see medicine.similars) and include
+    medicines in descendant categories. They are ranked by stored sellable
+    stock, or by unit price with ?rank=price.
     """
     permission_classes = [IsPharmacist]
     
     def get(self, request, id):
         """Get similar medicines based on active ingredient and category."""
-        medicine = get_object_or_404(Medicine, id=id)
-        active_ingredient = medicine.active_ingredient
-        category = medicine.category
-        
-        similars = Medicine.objects.select_related("active_ingredient", "category")\
-            .exclude(id=id)\
-            .filter(active_ingredient=active_ingredient, category=category)
+        alternatives = get_alternatives(id)
+        if alternatives is None:
+            raise Http404("No Medicine matches the given query.")
+
+        rank = request.query_params.get("rank", "stock")
+        if rank not in RANKINGS:
+            rank = "stock"
+        similars = list(rank_alternatives(
+            Medicine.objects.with_stored_stock().with_barcodes()
+            .select_related("active_ingredient", "category", "manufacturer"),
+            alternatives,
+            rank,
+        ))
         
-        if similars.exists():
+        if similars:
             serializer = MedicineOutSerializer(similars, many=True)
             return Response(
                 {"similars": serializer.data},
@@ -110,18 +159,21 @@ class SimilarMedicinesAPIView(generics.GenericAPIView):
         )
 
 
-class MedicineBatchesListCreateAPIView(generics.ListCreateAPIView):
+class MedicineBatchesListCreateAPIView(SelectablePaginationMixin, generics.ListCreateAPIView):
     """
     API endpoint for listing and creating Batches for a specific Medicine.
+
+    Supports keyset pagination on (expiry_date, id) with ?pagination=cursor.
     """
     permission_classes = [IsPharmacist]
     pagination_class = MedicinePagination
+    cursor_pagination_class = BatchCursorPagination
     
     def get_queryset(self):
         """Get batches for the specified medicine ID."""
         id = self.kwargs.get("id", None)
         medicine = get_object_or_404(Medicine, id=id)
-        return medicine.batches.all()
+        return medicine.batches.select_related("medicine").order_by("expiry_date", "id")
 
     def get_serializer_class(self):
         """Use BatchOutSerializer for GET, BatchInSerializer for POST."""
@@ -136,6 +188,24 @@ class MedicineBatchesListCreateAPIView(generics.ListCreateAPIView):
         serializer.save(medicine=medicine)
 
 
+class BatchBulkCreateAPIView(generics.GenericAPIView):
+    """
+    API endpoint receiving many batches, for any number of medicines, at once.
+
+    All batches are validated together and inserted in one transaction with
+    bulk-generated barcodes (see Batch.objects.bulk_create_with_barcodes).
+    """
+    permission_classes = [IsPharmacist]
+    serializer_class = BatchBulkCreateSerializer
+
+    def post(self, request):
+        """Create all batches or none, returning the created batches."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        batches = serializer.save()
+        return Response(BatchOutSerializer(batches, many=True).data, status=status.HTTP_201_CREATED)
+
+
 class BatchRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     """
     API endpoint for retrieving, updating, and deleting individual Batches.
@@ -162,4 +232,51 @@ class BatchRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
         """Ensure batch remains associated with the same medicine on update."""
         med_id = self.kwargs.get("medicine_id")
         medicine = get_object_or_404(Medicine, id=med_id)
-        serializer.save(medicine=medicine)
\ No newline at end of file
+        serializer.save(medicine=medicine)
+
+
+class BarcodeLookupAPIView(generics.GenericAPIView):
+    """
+    API endpoint resolving a scanned batch or international barcode.
+
+    Returns batch, medicine, unit price, stock and expiry in one response,
+    served from the barcode cache (see medicine.barcodes) when warm.
+    """
+    permission_classes = [IsCashier]
+    serializer_class = BarcodeLookupSerializer
+
+    def get(self, request, barcode):
+        """Resolve the barcode or return 404."""
+        match = resolve_barcode(barcode)
+        if match is None:
+            raise Http404("Unknown barcode.")
+        serializer = self.get_serializer(match)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class MedicineImportAPIView(generics.GenericAPIView):
+    """
+    API endpoint importing a medicine catalog from an uploaded CSV or JSONL file.
+
+    The upload is streamed through medicine.importers.MedicineImporter, so
+    rows are validated and upserted (keyed on international_barcode) in
+    chunks without loading the whole file into memory.
+    """
+    permission_classes = [IsPharmacist]
+    serializer_class = MedicineImportSerializer
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        """Import the file and return created/updated counts and row errors."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+
+        summary = {"rows": 0, "created": 0, "updated": 0, "errors": []}
+        for report in MedicineImporter().run(iter_rows(stream, serializer.validated_data["format"])):
+            summary["rows"] += report.rows
+            summary["created"] += report.created
+            summary["updated"] += report.updated
+            summary["errors"] += [{"row": row, "errors": errors} for row, errors in report.errors]
+        return Response(summary, status=status.HTTP_200_OK)
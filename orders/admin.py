@@ -12,7 +12,7 @@ class OrderItemInline(admin.StackedInline):
     """Inline admin for OrderItems within Order admin."""
     model = OrderItem
     extra = 1  # Number of empty forms shown by default
-    readonly_fields = ['price_item_after']  # Show calculated fields
+    readonly_fields = ['unit_cost', 'line_total_before', 'line_total_after']  # Show stored prices
 
 
 @admin.register(Order)
@@ -26,4 +26,5 @@ class OrderAdmin(admin.ModelAdmin):
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     """Admin interface for OrderItem model."""
-    list_display = ['order', 'batch', 'quantity', 'discount', 'price_item_before', 'price_item_after']
\ No newline at end of file
+    list_display = ['order', 'batch', 'quantity', 'discount', 'line_total_before', 'line_total_after']
+    list_select_related = ['batch__medicine']
\ No newline at end of file
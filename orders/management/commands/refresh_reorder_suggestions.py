@@ -0,0 +1,25 @@
+"""
+Management command recomputing the reorder suggestions.
+
+Computes the draft purchase orders for the whole catalog (see
+orders.reorder.build_drafts) and caches them for the dashboard. Run it
+daily, after the sales rollups are complete for the previous day.
+
+Usage:
+    python manage.py refresh_reorder_suggestions
+"""
+
+from django.core.management.base import BaseCommand
+
+from orders.reorder import refresh_reorder_drafts
+
+
+class Command(BaseCommand):
+    help = "Recompute and cache the reorder suggestions of the whole catalog."
+
+    def handle(self, *args, **options):
+        drafts = refresh_reorder_drafts()["drafts"]
+        lines = sum(len(draft["lines"]) for draft in drafts)
+        self.stdout.write(self.style.SUCCESS(
+            f"Suggested {lines} medicines to reorder from {len(drafts)} suppliers."
+        ))
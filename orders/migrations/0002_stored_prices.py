@@ -0,0 +1,79 @@
+# Generated by Django 5.2 on 2026-10-18 02:06
+
+from decimal import Decimal, ROUND_HALF_UP
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_prices(apps, schema_editor):
+    """Price existing order items from their medicine's current price in chunks, then total the orders."""
+    Order = apps.get_model("orders", "Order")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    chunk_size = 1000
+    last_id = 0
+    while True:
+        rows = list(
+            OrderItem.objects.filter(pk__gt=last_id).order_by("pk")
+            .values_list("pk", "quantity", "discount", "batch__medicine__price", "batch__medicine__units_per_pack")
+            [:chunk_size]
+        )
+        if not rows:
+            break
+        items = []
+        for pk, quantity, discount, price, units_per_pack in rows:
+            unit_cost = (Decimal(price) / Decimal(units_per_pack)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            total = Decimal(quantity) * unit_cost
+            items.append(OrderItem(
+                pk=pk,
+                unit_cost=unit_cost,
+                line_total_before=total.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
+                line_total_after=(total * (1 - Decimal(discount) / 100)).quantize(
+                    Decimal("0.01"), rounding=ROUND_HALF_UP),
+            ))
+        OrderItem.objects.bulk_update(items, ["unit_cost", "line_total_before", "line_total_after"])
+        last_id = rows[-1][0]
+
+    def lines_total(field):
+        totals = OrderItem.objects.filter(order=OuterRef("pk")).values("order")\
+            .annotate(total=Sum(field)).values("total")
+        output = models.DecimalField(max_digits=8, decimal_places=2)
+        return Coalesce(Subquery(totals, output_field=output), Value(Decimal("0")), output_field=output)
+
+    Order.objects.update(
+        total_before=lines_total("line_total_before"),
+        total_after=lines_total("line_total_after"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_before',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='line_total_after',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='line_total_before',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_cost',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+    ]
@@ -4,15 +4,52 @@ Order Management Models
 This module contains models for handling medicine orders from suppliers.
 
 Models:
+    - OrderQuerySet: Queryset helpers for order listings and stored totals
     - Order: Represents a purchase order to a supplier
     - OrderItem: Individual items within an order with quantity and discount
 """
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DecimalField, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
 from medicine.models import TimeStampedModel
 from django.core.validators import MinValueValidator, MaxValueValidator
 from medicine.models import Medicine, Batch, Supplier, Manufacturer
 from decimal import Decimal, ROUND_HALF_UP
+from reports import rollups
+
+
+class OrderQuerySet(models.QuerySet):
+    """
+    Queryset for Order.
+
+    Methods:
+        with_items: Prefetch items with their batches and medicines
+        recompute_totals: Set the stored totals from the items in one UPDATE
+    """
+
+    def with_items(self):
+        """Prefetch items, their batches and medicines in one extra query."""
+        items = OrderItem.objects.select_related("batch__medicine")\
+            .defer("batch__medicine__search_vector").order_by("id")
+        return self.prefetch_related(Prefetch("items", queryset=items))
+
+    @staticmethod
+    def lines_total(field):
+        """Subquery summing `field` over the items of the outer order, 0 without items."""
+        totals = OrderItem.objects.filter(order=OuterRef("pk"))\
+            .values("order").annotate(total=Sum(field)).values("total")
+        output = DecimalField(max_digits=8, decimal_places=2)
+        return Coalesce(Subquery(totals, output_field=output), Value(Decimal("0")), output_field=output)
+
+    def recompute_totals(self):
+        """Set total_before and total_after of every order from its items; returns the rows updated."""
+        return self.update(
+            total_before=self.lines_total("line_total_before"),
+            total_after=self.lines_total("line_total_after"),
+            modified=now(),
+        )
 
 
 class Order(TimeStampedModel):
@@ -21,27 +58,33 @@ class Order(TimeStampedModel):
     
     Attributes:
         supplier (ForeignKey): Supplier being ordered from
+        total_before (DecimalField): Order total before discounts
         total_after (DecimalField): Final order total after discounts
+
+    The totals are the sums of the items' stored line totals, set when
+    items are received or changed (see orders.receiving and
+    refresh_totals), never re-summed on save.
     """
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name="orders")
+    total_before = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        default=0,
+        validators=[MinValueValidator(0)]
+    )
     total_after = models.DecimalField(
         max_digits=8,
         decimal_places=2,
         default=0,
         validators=[MinValueValidator(0)]
     )
-    
-    def save(self, *args, **kwargs):
-        """Calculate and update order total when saving."""
-        if self.pk and hasattr(self, 'items'):
-            self.total_after = round(sum(item.price_item_after for item in self.items.all()), 2)
-        super().save(*args, **kwargs)
-    
-    @property
-    def total_before(self):
-        """Calculate order total before any discounts."""
-        total = sum(item.price_item_before for item in self.items.all())
-        return Decimal(total).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    objects = OrderQuerySet.as_manager()
+
+    def refresh_totals(self):
+        """Recompute the stored totals from the items with one UPDATE, then reload them."""
+        Order.objects.filter(pk=self.pk).recompute_totals()
+        self.refresh_from_db(fields=["total_before", "total_after", "modified"])
 
 
 class OrderItem(models.Model):
@@ -53,6 +96,9 @@ class OrderItem(models.Model):
         batch (ForeignKey): Medicine batch being ordered
         quantity (PositiveIntegerField): Number of units ordered
         discount (DecimalField): Percentage discount applied
+        unit_cost (DecimalField): Price of one unit when the item was received
+        line_total_before (DecimalField): Line price before discount when received
+        line_total_after (DecimalField): Line price after discount when received
     """
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
     batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name="items")
@@ -62,20 +108,66 @@ class OrderItem(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(0)]
     )
+    unit_cost = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False
+    )
+    line_total_before = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False
+    )
+    line_total_after = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False
+    )
 
     @property
     def price_item_after(self):
-        """Calculate item price after discount."""
-        discount_multiplier = (Decimal(1) - Decimal(self.discount) / Decimal(100))
-        total = Decimal(self.quantity) * self.batch.medicine.unit_price * discount_multiplier
-        return total.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        """Item price after discount, as priced when it was received."""
+        return self.line_total_after
     
     @property
     def price_item_before(self):
-        """Calculate item price before discount."""
-        total = Decimal(self.quantity) * self.batch.medicine.unit_price
-        return total.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        """Item price before discount, as priced when it was received."""
+        return self.line_total_before
+
+    def set_price(self):
+        """Copy the current unit price of the batch's medicine onto the item and price the line."""
+        self.unit_cost = self.batch.medicine.unit_price
+        self.price_line()
+
+    def price_line(self):
+        """Compute the line totals from the stored unit cost, quantity and discount."""
+        total = Decimal(self.quantity) * self.unit_cost
+        discount_multiplier = (Decimal(1) - Decimal(self.discount) / Decimal(100))
+        self.line_total_before = total.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        self.line_total_after = (total * discount_multiplier).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    def save(self, *args, **kwargs):
+        """Price a new item, refresh the order's totals and add it to the supplier's purchases."""
+        adding = self._state.adding
+        if adding:
+            self.set_price()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                rollups.record_purchases(self.order, added=[self])
+            self.order.refresh_totals()
+
+    def delete(self, *args, **kwargs):
+        """Delete the item and take its line off the order's totals and the supplier's purchases."""
+        with transaction.atomic():
+            rollups.record_purchases(self.order, removed=[self])
+            result = super().delete(*args, **kwargs)
+            self.order.refresh_totals()
+        return result
     
     class Meta:
         """Ensure same medicine appears only once per order."""
-        unique_together = ["order", "batch"]
\ No newline at end of file
+        unique_together = ["order", "batch"]
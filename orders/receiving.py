@@ -0,0 +1,214 @@
+"""
+Order Receiving
+
+Books the lines of a supplier delivery with a fixed number of queries,
+whatever the number of lines:
+    - medicines are resolved by name with one query before validation
+      (see OrderCreationSerializer)
+    - the batches of all lines are upserted with one INSERT ... ON CONFLICT
+      on the (expiry_date, medicine) unique constraint, so a batch created
+      concurrently by another delivery is reused instead of failing
+    - the upserted batches are read back with one query
+    - the order totals are computed in memory and saved with the order
+    - the received units are added with one UPDATE, and recorded in the
+      stock ledger with one insert (see medicine.stock.increment_many)
+    - order items are priced from their medicines and inserted with one
+      bulk_create; they keep that price when the catalog changes
+    - the supplier's monthly purchases take the new lines with one UPDATE
+      (see reports.rollups.record_purchases)
+
+Run `receive` inside `transaction.atomic()` so a failing line leaves no
+batch, stock or item behind.
+
+Edits and deletions of an order go through the same grouped stock update
+(see medicine.stock.adjust_many). An edit compares the old and new lines by
+(medicine, expiry date) and only writes what differs: removed items take
+their units back out of stock, added items bring theirs in, and items whose
+quantity changed move the difference. A deletion takes out all the units
+the order brought. When units were sold since, InsufficientStock is raised
+and nothing changes. The monthly purchases follow the same differences, and
+move to the new supplier when an order changes supplier.
+
+Functions:
+    - receive: Save an order with its items and received stock
+    - revise: Replace the lines of an order, applying only the differences
+    - cancel: Delete an order, taking its units back out of stock
+    - change_supplier: Move an order and its purchases to another supplier
+    - upsert_batches: Get or create the batches of (medicine, expiry date) pairs
+"""
+
+import copy
+from decimal import Decimal
+
+from django.db import transaction
+
+from medicine import stock
+from medicine.models import Batch, StockMovement, generate_unique_barcodes
+from orders.models import OrderItem
+from reports import rollups
+
+
+def receive(order, lines):
+    """
+    Save `order` with order items for validated `lines`.
+
+    Items are priced from their medicine's current unit price. A new order
+    is inserted with its totals already computed; an existing one has them
+    recomputed from its items in SQL.
+
+    Args:
+        order (Order): The order receiving the lines
+        lines (list[dict]): Validated lines, each with a `medicine`
+            instance, an `expiry_date`, a `quantity` in units and a `discount`
+
+    Returns:
+        list[OrderItem]: The created order items, in line order
+    """
+    batches = upsert_batches({(line["medicine"], line["expiry_date"]) for line in lines})
+    items = [
+        OrderItem(
+            batch=batches[line["medicine"].pk, line["expiry_date"]],
+            quantity=line["quantity"],
+            discount=line["discount"],
+        )
+        for line in lines
+    ]
+    for item in items:
+        item.set_price()
+    adding = order._state.adding
+    if adding:
+        order.total_before = sum((item.line_total_before for item in items), Decimal("0"))
+        order.total_after = sum((item.line_total_after for item in items), Decimal("0"))
+        order.save()
+    for item in items:
+        item.order = order
+    stock.increment_many([(item.batch, item.quantity) for item in items], StockMovement.ORDER, source=order)
+    items = OrderItem.objects.bulk_create(items)
+    rollups.record_purchases(order, added=items)
+    if not adding:
+        order.refresh_totals()
+    return items
+
+
+def revise(order, lines):
+    """
+    Replace the lines of an existing order, applying only the differences.
+
+    Args:
+        order (Order): The order being edited
+        lines (list[dict]): The validated lines the order should have, as for `receive`
+
+    Returns:
+        list[OrderItem]: The order's items after the edit, in line order
+
+    Raises:
+        InsufficientStock: When a batch no longer holds the units to take out
+    """
+    current = {
+        (item.batch.medicine_id, item.batch.expiry_date): item
+        for item in order.items.select_related("batch__medicine").defer("batch__medicine__search_vector")
+    }
+    wanted = {(line["medicine"].pk, line["expiry_date"]): line for line in lines}
+
+    removed = [item for key, item in current.items() if key not in wanted]
+    deltas = [(item.batch, -item.quantity) for item in removed]
+    changed, previous = [], []
+    for key, item in current.items():
+        line = wanted.get(key)
+        if line is None or (item.quantity, item.discount) == (line["quantity"], line["discount"]):
+            continue
+        deltas.append((item.batch, line["quantity"] - item.quantity))
+        previous.append(copy.copy(item))
+        item.quantity, item.discount = line["quantity"], line["discount"]
+        # keep the unit cost of the original delivery
+        item.price_line()
+        changed.append(item)
+
+    added = [line for key, line in wanted.items() if key not in current]
+    batches = upsert_batches({(line["medicine"], line["expiry_date"]) for line in added}) if added else {}
+    new_items = [
+        OrderItem(
+            order=order,
+            batch=batches[line["medicine"].pk, line["expiry_date"]],
+            quantity=line["quantity"],
+            discount=line["discount"],
+        )
+        for line in added
+    ]
+    for item in new_items:
+        item.set_price()
+    deltas += [(item.batch, item.quantity) for item in new_items]
+
+    stock.adjust_many(deltas, StockMovement.ORDER, source=order)
+    if removed:
+        OrderItem.objects.filter(pk__in=[item.pk for item in removed]).delete()
+    if changed:
+        OrderItem.objects.bulk_update(changed, ["quantity", "discount", "line_total_before", "line_total_after"])
+    created = {
+        (item.batch.medicine_id, item.batch.expiry_date): item
+        for item in OrderItem.objects.bulk_create(new_items)
+    }
+    rollups.record_purchases(order, added=changed + new_items, removed=removed + previous)
+    if removed or changed or new_items:
+        order.refresh_totals()
+    return [current.get(key) or created[key] for key in wanted]
+
+
+def cancel(order):
+    """
+    Delete an order, taking the units it brought back out of stock.
+
+    Raises:
+        InsufficientStock: When units of the order were sold since
+    """
+    with transaction.atomic():
+        items = list(order.items.select_related("batch__medicine").defer("batch__medicine__search_vector"))
+        stock.adjust_many([(item.batch, -item.quantity) for item in items], StockMovement.ORDER, source=order)
+        rollups.record_purchases(order, removed=items)
+        order.delete()
+
+
+def change_supplier(order, supplier):
+    """
+    Point `order` at `supplier`, moving its items' purchases to the new supplier.
+
+    The order itself is not saved; run inside the transaction saving it.
+    """
+    if supplier.pk == order.supplier_id:
+        return
+    items = list(order.items.select_related("batch"))
+    rollups.record_purchases(order, removed=items)
+    order.supplier = supplier
+    rollups.record_purchases(order, added=items)
+
+
+def upsert_batches(keys):
+    """
+    Get or create the batches of (medicine, expiry date) pairs with three queries.
+
+    Missing batches are created empty, so the ledger attributes all their
+    units to the order that brings them.
+
+    Returns:
+        dict: (medicine id, expiry date) -> Batch, with its medicine attached
+    """
+    medicines = {medicine.pk: medicine for medicine, _ in keys}
+    Batch.objects.bulk_create(
+        [
+            Batch(medicine=medicine, expiry_date=expiry_date, stock_units=0, barcode=barcode)
+            for (medicine, expiry_date), barcode in zip(keys, generate_unique_barcodes(len(keys)))
+        ],
+        update_conflicts=True,
+        unique_fields=["expiry_date", "medicine"],
+        update_fields=["modified"],
+    )
+    wanted = {(medicine.pk, expiry_date) for medicine, expiry_date in keys}
+    batches = {}
+    # the IN filters may match a few other pairs of the same medicines and dates
+    rows = Batch.objects.filter(medicine_id__in=medicines, expiry_date__in={expiry for _, expiry in keys})
+    for batch in rows:
+        if (batch.medicine_id, batch.expiry_date) in wanted:
+            batch.medicine = medicines[batch.medicine_id]
+            batches[batch.medicine_id, batch.expiry_date] = batch
+    return batches
+
@@ -0,0 +1,244 @@
+"""
+Reorder Suggestions
+
+Suggests what to order before medicines run out, as draft purchase orders
+grouped by the supplier each medicine was last bought from.
+
+Daily sales velocity comes from the medicine daily sales rollups (see
+reports.models), net of refunds, over exponentially weighted windows: the
+last 7, 14, 28 and 56 closed days, each window twice as long as the one
+before and weighted half as much. Recent sales count in every window, so
+the velocity follows a change in demand within days while a single busy
+day is smoothed out by the longer windows.
+
+Days of cover is a medicine's sellable stock divided by its velocity. A
+medicine is suggested when its cover falls below the supplier lead time plus
+a safety margin, for enough whole packs to cover the lead time and the
+target cover after it arrives.
+
+The whole catalog is processed with a fixed number of set-based queries:
+one grouped query over the rollups for every velocity, then one query per
+batch of selling medicines for their stock, last supplier and last unit
+cost, and one for the supplier names. The drafts are cached and recomputed
+by the `refresh_reorder_suggestions` command (run it daily), on a cache
+miss, or on a POST to the suggestions endpoint. Nothing is written: a draft becomes an order once a pharmacist
+submits it with the expiry dates of the delivered batches.
+
+Settings (optional):
+    - REORDER_LEAD_TIME_DAYS: Days a supplier takes to deliver (default: 7)
+    - REORDER_SAFETY_DAYS: Extra days of cover kept as a margin (default: 7)
+    - REORDER_COVER_DAYS: Days of sales an order should cover (default: 30)
+    - REORDER_CACHE_TIMEOUT: Seconds the drafts stay cached (default: one day)
+
+Classes:
+    - Suggestion: A medicine to reorder and how much
+    - DraftOrder: The suggestions for one supplier
+
+Functions:
+    - sales_velocity: Weighted daily units sold per medicine
+    - build_drafts: Compute the draft orders for the whole catalog
+    - get_reorder_drafts: Return the cached drafts, computing them on a miss
+    - refresh_reorder_drafts: Recompute and cache the drafts
+"""
+
+import datetime
+import math
+from decimal import Decimal, ROUND_HALF_UP
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.utils.timezone import localdate, now
+
+from medicine.models import Medicine, Supplier
+from orders.models import OrderItem
+from reports.models import MedicineDailySales
+
+
+CACHE_KEY = "reorder:drafts"
+
+# (days, weight): each window twice as long as the previous, weighted half as much
+WINDOWS = [(7, 8), (14, 4), (28, 2), (56, 1)]
+
+
+class Suggestion:
+    """
+    A medicine to reorder and how much.
+
+    Attributes:
+        medicine_id (int): The medicine to reorder
+        name (str): Its name
+        sellable_units (int): Units in stock that have not expired
+        velocity (Decimal): Weighted units sold per day
+        days_of_cover (Decimal): Days the sellable units last at that velocity
+        packs (int): Packs to order
+        quantity (int): Units to order, whole packs
+        unit_cost (Decimal): Unit cost of the last delivery, or the current unit price
+    """
+
+    def __init__(self, medicine_id, name, sellable_units, velocity, days_of_cover, packs, quantity, unit_cost):
+        self.medicine_id = medicine_id
+        self.name = name
+        self.sellable_units = sellable_units
+        self.velocity = velocity
+        self.days_of_cover = days_of_cover
+        self.packs = packs
+        self.quantity = quantity
+        self.unit_cost = unit_cost
+
+    @property
+    def estimated_cost(self):
+        """Cost of the suggested units at the unit cost, before any discount."""
+        return (self.unit_cost * self.quantity).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    def as_dict(self):
+        return {
+            "medicine": self.medicine_id,
+            "name": self.name,
+            "sellable_units": self.sellable_units,
+            "velocity": self.velocity,
+            "days_of_cover": self.days_of_cover,
+            "packs": self.packs,
+            "quantity": self.quantity,
+            "unit_cost": self.unit_cost,
+            "estimated_cost": self.estimated_cost,
+        }
+
+
+class DraftOrder:
+    """
+    The suggestions for one supplier.
+
+    Attributes:
+        supplier_id (int | None): The supplier last bought from; None for
+            medicines never ordered
+        supplier_name (str | None): Its name
+        lines (list[Suggestion]): The medicines to order, shortest cover first
+    """
+
+    def __init__(self, supplier_id, supplier_name, lines):
+        self.supplier_id = supplier_id
+        self.supplier_name = supplier_name
+        self.lines = lines
+
+    @property
+    def estimated_total(self):
+        """Estimated cost of all the draft's lines."""
+        return sum((line.estimated_cost for line in self.lines), Decimal("0.00"))
+
+    def as_dict(self):
+        return {
+            "supplier": self.supplier_id,
+            "supplier_name": self.supplier_name,
+            "estimated_total": self.estimated_total,
+            "lines": [line.as_dict() for line in self.lines],
+        }
+
+
+def sales_velocity(today=None):
+    """
+    Weighted daily units sold per medicine, net of refunds, with one query.
+
+    Args:
+        today (date | None): The day computed for; its own sales are not
+            counted (default: today)
+
+    Returns:
+        dict: Medicine id -> units per day, for medicines with net sales
+    """
+    today = today or localdate()
+    longest = max(days for days, _ in WINDOWS)
+    units = F("units_sold") - F("refunded_units")
+    rows = MedicineDailySales.objects\
+        .filter(date__gte=today - datetime.timedelta(days=longest), date__lt=today)\
+        .values("medicine_id")\
+        .annotate(**{
+            f"last_{days}": Sum(units, filter=Q(date__gte=today - datetime.timedelta(days=days)))
+            for days, _ in WINDOWS
+        }).order_by()
+
+    total_weight = sum(weight for _, weight in WINDOWS)
+    velocities = {}
+    for row in rows:
+        rate = sum(Decimal(weight * (row[f"last_{days}"] or 0)) / days for days, weight in WINDOWS) / total_weight
+        if rate > 0:
+            velocities[row["medicine_id"]] = rate.quantize(Decimal("0.001"), rounding=ROUND_HALF_UP)
+    return velocities
+
+
+def build_drafts(today=None, batch_size=1000):
+    """
+    Compute the draft orders for the whole catalog.
+
+    Args:
+        today (date | None): The day computed for (default: today)
+        batch_size (int): Medicines read per query
+
+    Returns:
+        list[DraftOrder]: One draft per supplier, by supplier name; the
+            draft of medicines never ordered comes last
+    """
+    lead_time = getattr(settings, "REORDER_LEAD_TIME_DAYS", 7)
+    reorder_point = lead_time + getattr(settings, "REORDER_SAFETY_DAYS", 7)
+    horizon = lead_time + getattr(settings, "REORDER_COVER_DAYS", 30)
+
+    velocities = sales_velocity(today)
+    last_item = OrderItem.objects.filter(batch__medicine=OuterRef("pk")).order_by("-order__created", "-pk")
+    by_supplier = {}
+    ids = iter(sorted(velocities))
+    while batch := list(islice(ids, batch_size)):
+        medicines = Medicine.objects.filter(pk__in=batch)\
+            .annotate(
+                last_supplier_id=Subquery(last_item.values("order__supplier_id")[:1]),
+                last_unit_cost=Subquery(last_item.values("unit_cost")[:1]),
+            ).values("id", "name", "units_per_pack", "price", "sellable_units", "last_supplier_id", "last_unit_cost")
+        for medicine in medicines:
+            velocity = velocities[medicine["id"]]
+            cover = (Decimal(medicine["sellable_units"]) / velocity).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+            if cover >= reorder_point:
+                continue
+            missing = math.ceil(velocity * horizon - medicine["sellable_units"])
+            packs = math.ceil(max(missing, 0) / medicine["units_per_pack"])
+            if packs <= 0:
+                # the stock already covers the horizon, e.g. when the safety margin exceeds the cover
+                continue
+            unit_cost = medicine["last_unit_cost"]
+            if unit_cost is None:
+                unit_cost = (Decimal(medicine["price"]) / medicine["units_per_pack"])\
+                    .quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+            by_supplier.setdefault(medicine["last_supplier_id"], []).append(Suggestion(
+                medicine_id=medicine["id"],
+                name=medicine["name"],
+                sellable_units=medicine["sellable_units"],
+                velocity=velocity,
+                days_of_cover=cover,
+                packs=packs,
+                quantity=packs * medicine["units_per_pack"],
+                unit_cost=unit_cost,
+            ))
+
+    names = dict(Supplier.objects.filter(pk__in=[pk for pk in by_supplier if pk]).values_list("id", "name"))
+    drafts = [
+        DraftOrder(supplier_id, names.get(supplier_id), sorted(lines, key=lambda line: (line.days_of_cover, line.name)))
+        for supplier_id, lines in by_supplier.items()
+    ]
+    return sorted(drafts, key=lambda draft: (draft.supplier_id is None, draft.supplier_name or ""))
+
+
+def get_reorder_drafts():
+    """Return the cached drafts as dicts with the time they were computed, computing them on a miss."""
+    drafts = cache.get(CACHE_KEY)
+    if drafts is None:
+        drafts = refresh_reorder_drafts()
+    return drafts
+
+
+def refresh_reorder_drafts():
+    """Recompute the drafts for the whole catalog and cache them."""
+    drafts = {
+        "computed_at": now(),
+        "drafts": [draft.as_dict() for draft in build_drafts()],
+    }
+    cache.set(CACHE_KEY, drafts, getattr(settings, "REORDER_CACHE_TIMEOUT", 24 * 3600))
+    return drafts
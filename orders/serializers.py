@@ -4,9 +4,22 @@ Order Serializers
 Defines serializers for order-related API endpoints.
 """
 
+from django.db import transaction
 from rest_framework import serializers
 from orders.models import Order, OrderItem
-from medicine.models import Batch, Medicine
+from orders.receiving import change_supplier, receive, revise
+from medicine.stock import InsufficientStock
+from medicine.models import Medicine
+
+
+class MedicineNameField(serializers.SlugRelatedField):
+    """Medicine by name, taken from the medicines preloaded by OrderCreationSerializer when possible."""
+
+    def to_internal_value(self, data):
+        medicines = self.context.get("medicines_by_name")
+        if medicines is not None and data in medicines:
+            return medicines[data]
+        return super().to_internal_value(data)
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -18,7 +31,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         input_formats=["%Y-%m"],
         write_only=True
     )
-    medicine = serializers.SlugRelatedField(
+    medicine = MedicineNameField(
         queryset=Medicine.objects.all(),
         slug_field="name",
         write_only=True
@@ -44,25 +57,9 @@ class OrderItemSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        """Create or update batch when creating order item."""
-        medicine = validated_data.pop("medicine")
-        packs = validated_data.pop("packs")
-        units = validated_data.pop("units", None)
-        expiry_date = validated_data.pop("expiry_date")
-        quantity = validated_data.get("quantity")
-        
-        batch, created = Batch.objects.get_or_create(
-            medicine=medicine,
-            expiry_date=expiry_date,
-            defaults={"stock_units": quantity}
-        )
-        
-        if not created:
-            batch.stock_units += quantity
-            batch.save()
-            
-        validated_data["batch"] = batch
-        return super().create(validated_data)
+        """Receive the item's units into its batch, creating the batch if needed."""
+        with transaction.atomic():
+            return receive(validated_data["order"], [validated_data])[0]
 
     def update(self, instance, validated_data):
         """Prevent updates to order items."""
@@ -78,33 +75,58 @@ class OrderCreationSerializer(serializers.ModelSerializer):
         fields = ["supplier", "items", "total_before", "total_after"]
         read_only_fields = ["total_before", "total_after"]
     
+    def to_internal_value(self, data):
+        """Resolve the medicines of all items by name with one query before validating them."""
+        items = data.get("items") if hasattr(data, "get") else None
+        if isinstance(items, list):
+            names = {
+                item["medicine"] for item in items
+                if isinstance(item, dict) and isinstance(item.get("medicine"), str)
+            }
+            self.context["medicines_by_name"] = Medicine.objects.defer("search_vector")\
+                .in_bulk(names, field_name="name")
+        return super().to_internal_value(data)
+
+    def validate_items(self, items):
+        """Reject lines repeating a medicine and expiry date, which share one batch."""
+        seen = set()
+        for item in items:
+            key = (item["medicine"].pk, item["expiry_date"])
+            if key in seen:
+                raise serializers.ValidationError(
+                    f"{item['medicine'].name} expiring {item['expiry_date']:%Y-%m} appears more than once."
+                )
+            seen.add(key)
+        return items
+
+    @transaction.atomic
     def create(self, validated_data):
-        """Create order with its items."""
+        """Create the order with its items through the receiving pipeline, all or nothing."""
         items_data = validated_data.pop("items")
-        order = Order.objects.create(**validated_data)
-        
-        for item_data in items_data:
-            serializer = OrderItemSerializer(data=item_data)
-            serializer.is_valid(raise_exception=True)
-            serializer.save(order=order)
-            
-        order.save()
+        order = Order(**validated_data)
+        receive(order, items_data)
         return order
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Update order by replacing all items."""
-        supplier = validated_data.get("supplier", instance.supplier)
+        """
+        Update the order, replacing its items when given.
+
+        Only the differences between the old and new items are written and
+        applied to stock (see orders.receiving.revise). A new supplier takes
+        over the order's purchases in the rollups.
+        """
         items_data = validated_data.pop("items", None)
-        
         if items_data is not None:
-            instance.items.all().delete()
-            for item_data in items_data:
-                serializer = OrderItemSerializer(data=item_data)
-                serializer.is_valid(raise_exception=True)
-                serializer.save(order=instance)
-                
-        instance.save()
-        return instance
+            try:
+                revise(instance, items_data)
+            except InsufficientStock as error:
+                raise serializers.ValidationError(
+                    f"Units of this order were already sold, only {error.available} are left in stock."
+                )
+        if "supplier" in validated_data:
+            change_supplier(instance, validated_data["supplier"])
+        return super().update(instance, validated_data)
 
 
 class OrderItemReadSerializer(serializers.ModelSerializer):
@@ -117,7 +139,15 @@ class OrderItemReadSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = OrderItem
-        fields = ["medicine_info", "quantity", "discount", "batch_expiry"]
+        fields = [
+            "medicine_info",
+            "quantity",
+            "discount",
+            "batch_expiry",
+            "unit_cost",
+            "line_total_before",
+            "line_total_after"
+        ]
 
 
 class OrderReadSerializer(serializers.ModelSerializer):
@@ -76,3 +76,30 @@ def test_unique_order_item():
     # Attempting to create a duplicate OrderItem should raise an IntegrityError
     with pytest.raises(IntegrityError):
         OrderItemFactory.create(order=order, batch=batch)
+
+
+@pytest.mark.django_db
+def test_catalog_price_change_keeps_order_prices():
+    """Items keep the price they were received at"""
+    order = OrderFactory.create()
+    item = OrderItemFactory.create(order=order, quantity=4, discount=Decimal("25"))
+    before, after = item.price_item_before, item.price_item_after
+
+    medicine = item.batch.medicine
+    medicine.price = medicine.price * 3
+    medicine.save()
+
+    item = OrderItem.objects.get(pk=item.pk)
+    order.refresh_from_db()
+    assert (item.price_item_before, item.price_item_after) == (before, after)
+    assert (order.total_before, order.total_after) == (before, after)
+
+
+@pytest.mark.django_db
+def test_deleting_item_updates_order_totals():
+    """Order totals follow their items"""
+    order = OrderFactory.create()
+    kept = OrderItemFactory.create(order=order, quantity=2, discount=Decimal("0"))
+    OrderItemFactory.create(order=order, quantity=3, discount=Decimal("0")).delete()
+    order.refresh_from_db()
+    assert order.total_before == kept.price_item_before
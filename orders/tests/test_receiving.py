@@ -0,0 +1,157 @@
+import pytest
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from medicine.models import Batch, Medicine, StockMovement
+from medicine.tests.factories import BatchFactory, MedicineFactory, SupplierFactory
+from orders.models import Order
+from orders.serializers import OrderCreationSerializer
+from users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def order_data(medicines, supplier, expiry_date="2030-01", packs=2):
+    return {
+        "supplier": supplier.id,
+        "items": [
+            {"medicine": medicine.name, "packs": packs, "discount": Decimal("10.00"), "expiry_date": expiry_date}
+            for medicine in medicines
+        ],
+    }
+
+
+def revise(order, data):
+    serializer = OrderCreationSerializer(order, data=data, partial=True)
+    assert serializer.is_valid(), serializer.errors
+    return serializer.save()
+
+
+def units(medicine, expiry_date="2030-01-01"):
+    return Batch.objects.get(medicine=medicine, expiry_date=expiry_date).stock_units
+
+
+def place(data):
+    serializer = OrderCreationSerializer(data=data)
+    assert serializer.is_valid(), serializer.errors
+    return serializer.save()
+
+
+class TestReceiving:
+    def test_existing_batches_receive_units(self):
+        medicine = MedicineFactory(units_per_pack=1, price=Decimal("4.00"))
+        batch = BatchFactory(medicine=medicine, expiry_date="2030-01-01", stock_units=5)
+        other = MedicineFactory(units_per_pack=1, price=Decimal("2.00"))
+
+        order = place(order_data([medicine, other], SupplierFactory()))
+        batch.refresh_from_db()
+        assert batch.stock_units == 7
+        created = Batch.objects.get(medicine=other, expiry_date="2030-01-01")
+        assert created.stock_units == 2
+        assert len(created.barcode) == 16
+        assert order.total_after == Decimal("10.80")
+        assert Order.objects.get(pk=order.pk).total_after == Decimal("10.80")
+        assert Medicine.objects.get(pk=medicine.pk).sellable_units == 7
+        movements = StockMovement.objects.filter(reason=StockMovement.ORDER, source_id=order.pk)
+        assert sorted(movements.values_list("delta", flat=True)) == [2, 2]
+
+    def test_query_count_does_not_grow_with_lines(self):
+        supplier = SupplierFactory()
+
+        def queries(count, expiry_date):
+            medicines = [MedicineFactory(units_per_pack=1) for _ in range(count)]
+            data = order_data(medicines, supplier, expiry_date)
+            with CaptureQueriesContext(connection) as captured:
+                place(data)
+            return len(captured)
+
+        assert queries(2, "2030-02") == queries(8, "2030-03")
+
+    def test_repeated_batch_lines_are_rejected(self):
+        medicine = MedicineFactory(units_per_pack=1)
+        data = order_data([medicine, medicine], SupplierFactory())
+        serializer = OrderCreationSerializer(data=data)
+        assert not serializer.is_valid()
+        assert "appears more than once" in str(serializer.errors)
+        assert not Batch.objects.filter(medicine=medicine).exists()
+
+
+class TestRevision:
+    def test_edit_applies_only_differences(self):
+        kept, changed, removed, added = [MedicineFactory(units_per_pack=1) for _ in range(4)]
+        supplier = SupplierFactory()
+        order = place(order_data([kept, changed, removed], supplier))
+
+        data = order_data([kept, changed, added], supplier)
+        data["items"][1]["packs"] = 5
+        order = revise(order, data)
+
+        assert [units(medicine) for medicine in (kept, changed, removed, added)] == [2, 5, 0, 2]
+        assert sorted(order.items.values_list("quantity", flat=True)) == [2, 2, 5]
+        deltas = StockMovement.objects.filter(reason=StockMovement.ORDER, source_id=order.pk)\
+            .order_by("pk").values_list("delta", flat=True)
+        assert sorted(deltas[3:]) == [-2, 2, 3]
+
+    def test_unchanged_edit_writes_nothing(self):
+        medicines = [MedicineFactory(units_per_pack=1) for _ in range(3)]
+        data = order_data(medicines, SupplierFactory())
+        order = place(data)
+        movements = StockMovement.objects.count()
+
+        revise(order, data)
+        assert StockMovement.objects.count() == movements
+        assert [units(medicine) for medicine in medicines] == [2, 2, 2]
+
+    def test_edit_query_count_does_not_grow_with_lines(self):
+        supplier = SupplierFactory()
+
+        def queries(count, expiry_date):
+            medicines = [MedicineFactory(units_per_pack=1) for _ in range(count)]
+            order = place(order_data(medicines, supplier, expiry_date))
+            data = order_data(medicines[1:] + [MedicineFactory(units_per_pack=1)], supplier, expiry_date, packs=3)
+            with CaptureQueriesContext(connection) as captured:
+                revise(order, data)
+            return len(captured)
+
+        assert queries(2, "2030-02") == queries(8, "2030-03")
+
+
+    def test_edit_keeps_received_unit_cost(self):
+        medicine = MedicineFactory(units_per_pack=1, price=Decimal("4.00"))
+        supplier = SupplierFactory()
+        order = place(order_data([medicine], supplier))
+        Medicine.objects.filter(pk=medicine.pk).update(price=Decimal("9.00"))
+
+        order = revise(order, order_data([medicine], supplier, packs=5))
+        item = order.items.get()
+        assert item.unit_cost == Decimal("4.00")
+        assert order.total_before == Decimal("20.00")
+        assert order.total_after == Decimal("18.00")
+
+class TestOrderDeletion:
+    def setup_method(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=UserFactory(role="pharmacist"))
+
+    def test_delete_reverses_stock(self):
+        medicine = MedicineFactory(units_per_pack=1)
+        BatchFactory(medicine=medicine, expiry_date="2030-01-01", stock_units=5)
+        order = place(order_data([medicine], SupplierFactory()))
+
+        response = self.client.delete(reverse("order-detail", args=[order.pk]))
+        assert response.status_code == 204
+        assert units(medicine) == 5
+        assert Medicine.objects.get(pk=medicine.pk).sellable_units == 5
+
+    def test_delete_after_units_were_sold(self):
+        medicine = MedicineFactory(units_per_pack=1)
+        order = place(order_data([medicine], SupplierFactory()))
+        Batch.objects.filter(medicine=medicine).update(stock_units=1)
+
+        response = self.client.delete(reverse("order-detail", args=[order.pk]))
+        assert response.status_code == 400
+        assert Order.objects.filter(pk=order.pk).exists()
+        assert units(medicine) == 1
@@ -0,0 +1,160 @@
+import pytest
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import localdate, timedelta
+from rest_framework.test import APIClient
+
+from medicine.models import Medicine
+from medicine.tests.factories import BatchFactory, MedicineFactory, SupplierFactory
+from orders.reorder import build_drafts, get_reorder_drafts, sales_velocity
+from orders.tests.factories import OrderFactory, OrderItemFactory
+from reports.models import MedicineDailySales
+from users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def sell_daily(medicine, units, days=56, refunded=0):
+    """Roll up `units` sold a day over the closed days before today."""
+    today = localdate()
+    MedicineDailySales.objects.bulk_create([
+        MedicineDailySales(
+            date=today - timedelta(days=ago), medicine=medicine, units_sold=units, refunded_units=refunded,
+        )
+        for ago in range(1, days + 1)
+    ])
+
+
+def stocked(medicine, units):
+    Medicine.objects.filter(pk=medicine.pk).update(sellable_units=units)
+
+
+def bought(medicine, supplier):
+    OrderItemFactory(order=OrderFactory(supplier=supplier), batch=BatchFactory(medicine=medicine), quantity=1)
+
+
+class TestSalesVelocity:
+    def test_steady_sales(self):
+        medicine = MedicineFactory()
+        sell_daily(medicine, 7)
+        assert sales_velocity() == {medicine.pk: Decimal("7.000")}
+
+    def test_recent_sales_weigh_more(self):
+        medicine = MedicineFactory()
+        sell_daily(medicine, 7)
+        MedicineDailySales.objects.filter(date__gte=localdate() - timedelta(days=7)).update(units_sold=14)
+        MedicineDailySales.objects.create(date=localdate(), medicine=medicine, units_sold=500)
+        # windows of 7, 14, 28 and 56 days: 14, 10.5, 8.75 and 7.875 units a day
+        assert sales_velocity()[medicine.pk] == Decimal("11.958")
+
+    def test_refunds_are_netted(self):
+        steady, refunded = MedicineFactory(), MedicineFactory()
+        sell_daily(steady, 4, refunded=1)
+        sell_daily(refunded, 1, days=3, refunded=1)
+        assert sales_velocity() == {steady.pk: Decimal("3.000")}
+
+
+class TestBuildDrafts:
+    @pytest.fixture
+    def catalog(self):
+        supplier = SupplierFactory()
+        low = MedicineFactory(price=Decimal("20.00"), units_per_pack=10)
+        plenty = MedicineFactory(price=Decimal("5.00"), units_per_pack=1)
+        never_ordered = MedicineFactory(price=Decimal("3.00"), units_per_pack=1)
+        bought(low, supplier)
+        bought(plenty, supplier)
+        sell_daily(low, 10)
+        sell_daily(plenty, 1)
+        sell_daily(never_ordered, 2)
+        stocked(low, 50)
+        stocked(plenty, 100)
+        stocked(never_ordered, 0)
+        return supplier, low, plenty, never_ordered
+
+    def test_drafts_by_last_supplier(self, catalog):
+        supplier, low, _, never_ordered = catalog
+        drafts = build_drafts()
+
+        assert [draft.supplier_id for draft in drafts] == [supplier.pk, None]
+        line, = drafts[0].lines
+        assert line.medicine_id == low.pk
+        assert line.days_of_cover == Decimal("5.0")
+        # 37 days of sales (lead time and cover) less the 50 units in stock, in packs of 10
+        assert (line.packs, line.quantity) == (32, 320)
+        assert line.unit_cost == Decimal("2.00")
+        assert drafts[0].estimated_total == Decimal("640.00")
+
+        line, = drafts[1].lines
+        assert (line.medicine_id, line.days_of_cover, line.quantity) == (never_ordered.pk, Decimal("0.0"), 74)
+        assert line.unit_cost == Decimal("3.00")
+
+    def test_last_supplier_wins(self, catalog):
+        _, low, _, _ = catalog
+        latest = SupplierFactory()
+        bought(low, latest)
+        assert build_drafts()[0].supplier_id == latest.pk
+
+    def test_no_lines_when_stock_covers_the_horizon(self, catalog, settings):
+        settings.REORDER_SAFETY_DAYS = 60
+        _, low, plenty, never_ordered = catalog
+        stocked(low, 380)
+        lines = [line.medicine_id for draft in build_drafts() for line in draft.lines]
+        assert low.pk not in lines
+        assert plenty.pk not in lines
+        assert never_ordered.pk in lines
+
+    def test_query_count_does_not_grow_with_catalog(self):
+        def queries(count):
+            supplier = SupplierFactory()
+            for _ in range(count):
+                medicine = MedicineFactory(units_per_pack=1)
+                bought(medicine, supplier)
+                sell_daily(medicine, 5, days=7)
+                stocked(medicine, 0)
+            with CaptureQueriesContext(connection) as context:
+                build_drafts()
+            MedicineDailySales.objects.all().delete()
+            return len(context.captured_queries)
+
+        assert queries(1) == queries(3)
+
+
+class TestReorderSuggestions:
+    def test_drafts_are_cached(self):
+        medicine = MedicineFactory(units_per_pack=1)
+        sell_daily(medicine, 5, days=7)
+        stocked(medicine, 0)
+        first = get_reorder_drafts()
+
+        with CaptureQueriesContext(connection) as context:
+            assert get_reorder_drafts() == first
+        assert len(context.captured_queries) == 0
+
+    def test_endpoint(self):
+        medicine = MedicineFactory(units_per_pack=1)
+        stocked(medicine, 0)
+        client = APIClient()
+        client.force_authenticate(user=UserFactory(role="pharmacist"))
+        url = reverse("reorder-suggestions")
+
+        assert client.get(url).data["drafts"] == []
+        sell_daily(medicine, 5, days=7)
+        assert client.get(url).data["drafts"] == []
+        response = client.post(url)
+        assert response.status_code == 200
+        assert response.data["drafts"][0]["lines"][0]["medicine"] == medicine.pk
+
+    def test_endpoint_requires_pharmacist(self):
+        client = APIClient()
+        client.force_authenticate(user=UserFactory(role="cashier"))
+        assert client.get(reverse("reorder-suggestions")).status_code == 403
+
+    def test_command(self):
+        medicine = MedicineFactory(units_per_pack=1)
+        sell_daily(medicine, 5, days=7)
+        stocked(medicine, 0)
+        call_command("refresh_reorder_suggestions")
+        assert get_reorder_drafts()["drafts"][0]["lines"][0]["medicine"] == medicine.pk
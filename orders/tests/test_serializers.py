@@ -83,7 +83,8 @@ class TestOrderCreationSerializer:
         """Test updating the items of an order"""
         order = OrderFactory.create()
         medicine = MedicineFactory.create(units_per_pack=10)
-        order_item = OrderItemFactory(order=order)
+        # the replaced item's units are taken back out of its batch
+        order_item = OrderItemFactory(order=order, batch=BatchFactory(stock_units=100), quantity=10)
 
         data = {
             "items": [
@@ -5,6 +5,8 @@ from orders.models import Order
 from medicine.tests.factories import MedicineFactory, SupplierFactory
 from orders.tests.factories import OrderFactory, OrderItemFactory
 from rest_framework import status
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from users.tests.factories import UserFactory
 
 
@@ -57,6 +59,18 @@ class TestOrderAPI:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data) == 3
 
+    def test_list_orders_query_count(self):
+        def queries(count):
+            for _ in range(count):
+                order = OrderFactory()
+                OrderItemFactory.create_batch(2, order=order)
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(reverse("order-list"))
+            assert len(response.data) == Order.objects.count()
+            return len(captured)
+
+        assert queries(1) == queries(3)
+
     def test_retrieve_order(self):
         order = OrderFactory()
         url = reverse("order-detail", args=[order.id])
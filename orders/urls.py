@@ -5,10 +5,11 @@ Defines URL routes for order-related API endpoints.
 """
 
 from django.urls import path
-from orders.views import OrderListCreateAPIView, OrderRetrieveUpdateDestroyAPIView
+from orders.views import OrderListCreateAPIView, OrderRetrieveUpdateDestroyAPIView, ReorderSuggestionsAPIView
 
 
 urlpatterns = [
     path("", OrderListCreateAPIView.as_view(), name="order-list"),
     path("<int:pk>/", OrderRetrieveUpdateDestroyAPIView.as_view(), name="order-detail"),
+    path("reorder-suggestions/", ReorderSuggestionsAPIView.as_view(), name="reorder-suggestions"),
 ]
\ No newline at end of file
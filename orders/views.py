@@ -7,10 +7,16 @@ Defines views for order-related API endpoints.
 from rest_framework import status, generics
 from orders.models import Order
 from orders.serializers import OrderCreationSerializer, OrderReadSerializer
-from users.permissions import IsPharmacist
+from users.permissions import IsPharmacist, IsPharmacistOnly
 from django_filters.rest_framework import DjangoFilterBackend
 from orders.filters import OrderFilter
 from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+from orders.receiving import cancel
+from orders.reorder import get_reorder_drafts, refresh_reorder_drafts
+from medicine.stock import InsufficientStock
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 
 class OrderListCreateAPIView(generics.ListCreateAPIView):
@@ -21,9 +27,10 @@ class OrderListCreateAPIView(generics.ListCreateAPIView):
     - Pharmacist permission required
     - Date filtering capabilities
     - Different serializers for read vs write operations
+    - Stored totals and prefetched items, so listing takes a fixed number of queries
     """
     permission_classes = [IsPharmacist]
-    queryset = Order.objects.all()
+    queryset = Order.objects.with_items()
     filter_backends = [DjangoFilterBackend]
     filterset_class = OrderFilter
     
@@ -40,12 +47,40 @@ class OrderRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
     Features:
     - Pharmacist permission required
     - Different serializers for read vs write operations
-    - Complete replacement of order items on update
+    - Replacement of order items on update, applying only the differences to stock
+    - Deleting an order takes its units back out of stock
     """
     permission_classes = [IsPharmacist]
-    queryset = Order.objects.all()
+    queryset = Order.objects.with_items()
     
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
             return OrderReadSerializer
-        return OrderCreationSerializer
\ No newline at end of file
+        return OrderCreationSerializer
+
+    def perform_destroy(self, instance):
+        try:
+            cancel(instance)
+        except InsufficientStock as error:
+            raise ValidationError(
+                f"Units of this order were already sold, only {error.available} are left in stock."
+            )
+
+
+class ReorderSuggestionsAPIView(APIView):
+    """
+    API endpoint returning draft purchase orders for medicines running low.
+
+    Features:
+    - Pharmacists and admins only
+    - Drafts grouped by the supplier each medicine was last bought from
+      (see orders.reorder)
+    - GET serves them from the cache; POST recomputes them for the whole catalog
+    """
+    permission_classes = [IsPharmacistOnly]
+
+    def get(self, request):
+        return Response(get_reorder_drafts())
+
+    def post(self, request):
+        return Response(refresh_reorder_drafts())
@@ -0,0 +1,161 @@
+"""
+Rollup Backfill
+
+Recomputes the rollup tables (see reports.models) from history, for days
+sold or months ordered before the rollups existed or changed outside the
+incremental path (deleted invoices or orders, raw SQL).
+
+A range is rebuilt from three grouped queries, over invoices, sale items and
+refund movements of the stock ledger (refunds are dated by the ledger, the
+only record of when units came back). Amounts are rounded per line as in
+reports.rollups, so rebuilt rows match incrementally maintained ones. The
+range's rollup rows are then replaced in one transaction. Sales committed
+while a range is rebuilt may be missed, so rebuild days that are closed.
+
+Monthly purchases are rebuilt the same way, from one grouped query summing
+the stored line totals of order items by month, supplier and medicine.
+
+Functions:
+    - rebuild_rollups: Recompute the sales rollups of a range of days
+    - rebuild_purchases: Recompute the monthly purchases of a range of months
+"""
+
+import datetime
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, DateField, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Round, TruncDate, TruncMonth
+from django.utils.timezone import make_aware
+
+from medicine.models import StockMovement
+from orders.models import OrderItem
+from reports.models import (
+    CategoryDailySales, DailySales, MedicineDailySales, SalesRollup, SupplierMonthlyPurchases,
+)
+from sales.models import Invoice, SaleItem
+
+
+def rebuild_rollups(start, end, batch_size=1000):
+    """
+    Recompute the rollups of the days from `start` to `end`, inclusive.
+
+    Args:
+        start (date): First day to rebuild
+        end (date): Last day to rebuild
+        batch_size (int): Rollup rows inserted per query
+
+    Returns:
+        int: Number of days with sales or refunds in the range
+    """
+    since = make_aware(datetime.datetime.combine(start, datetime.time.min))
+    until = make_aware(datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min))
+    amount = DecimalField(max_digits=14, decimal_places=2)
+
+    invoices = Invoice.objects.filter(created__gte=since, created__lt=until)\
+        .annotate(day=TruncDate("created")).values("day")\
+        .annotate(invoices=Count("id")).order_by()
+
+    sold = SaleItem.objects.filter(invoice__created__gte=since, invoice__created__lt=until)\
+        .annotate(day=TruncDate("invoice__created"))\
+        .values("day", "batch__medicine_id", "batch__medicine__category_id")\
+        .annotate(
+            units_sold=Sum("quantity"),
+            revenue=Sum("line_total"),
+            discounted_revenue=Sum(Round(
+                F("line_total") * (Value(100) - F("invoice__discount")) / Value(100), 2, output_field=amount,
+            )),
+        ).order_by()
+
+    unit_price = SaleItem.objects.filter(invoice_id=OuterRef("source_id"), batch_id=OuterRef("batch_id"))\
+        .order_by("pk").values("unit_price")[:1]
+    discount = Invoice.objects.filter(pk=OuterRef("source_id")).order_by().values("discount")[:1]
+    refunded = StockMovement.objects.filter(
+        reason=StockMovement.REFUND,
+        source_type=ContentType.objects.get_for_model(Invoice),
+        created__gte=since,
+        created__lt=until,
+    ).annotate(day=TruncDate("created"))\
+        .values("day", "batch__medicine_id", "batch__medicine__category_id")\
+        .annotate(
+            refunded_units=Sum("delta"),
+            refunded_amount=Sum(Round(
+                F("delta") * Subquery(unit_price) * (Value(100) - Subquery(discount)) / Value(100),
+                2, output_field=amount,
+            )),
+        ).order_by()
+
+    daily, medicines, categories = {}, {}, {}
+    for row in invoices:
+        _add(daily, row["day"], {"invoices": row["invoices"]})
+    for row in [*sold, *refunded]:
+        amounts = {field: row[field] for field in SalesRollup.AMOUNTS if field in row}
+        _add(daily, row["day"], amounts)
+        _add(medicines, (row["day"], row["batch__medicine_id"]), amounts)
+        _add(categories, (row["day"], row["batch__medicine__category_id"]), amounts)
+
+    # reports never see the range half rebuilt
+    with transaction.atomic():
+        for model in (DailySales, MedicineDailySales, CategoryDailySales):
+            model.objects.filter(date__gte=start, date__lte=end).delete()
+        DailySales.objects.bulk_create(
+            [DailySales(date=day, **amounts) for day, amounts in daily.items()],
+            batch_size=batch_size,
+        )
+        MedicineDailySales.objects.bulk_create(
+            [MedicineDailySales(date=day, medicine_id=pk, **amounts) for (day, pk), amounts in medicines.items()],
+            batch_size=batch_size,
+        )
+        CategoryDailySales.objects.bulk_create(
+            [CategoryDailySales(date=day, category_id=pk, **amounts) for (day, pk), amounts in categories.items()],
+            batch_size=batch_size,
+        )
+    return len(daily)
+
+
+def rebuild_purchases(start, end, batch_size=1000):
+    """
+    Recompute the monthly purchases of the months from `start` to `end`, inclusive.
+
+    Args:
+        start (date): A day of the first month to rebuild
+        end (date): A day of the last month to rebuild
+        batch_size (int): Rollup rows inserted per query
+
+    Returns:
+        int: Number of months with purchases in the range
+    """
+    start, end = start.replace(day=1), end.replace(day=1)
+    following = (end + datetime.timedelta(days=31)).replace(day=1)
+    since = make_aware(datetime.datetime.combine(start, datetime.time.min))
+    until = make_aware(datetime.datetime.combine(following, datetime.time.min))
+
+    rows = OrderItem.objects.filter(order__created__gte=since, order__created__lt=until)\
+        .annotate(month=TruncMonth("order__created", output_field=DateField()))\
+        .values("month", "order__supplier_id", "batch__medicine_id")\
+        .annotate(
+            quantity=Sum("quantity"),
+            spend_before=Sum("line_total_before"),
+            spend_after=Sum("line_total_after"),
+        ).order_by()
+    purchases = [
+        SupplierMonthlyPurchases(
+            date=row["month"],
+            supplier_id=row["order__supplier_id"],
+            medicine_id=row["batch__medicine_id"],
+            **{field: row[field] for field in SupplierMonthlyPurchases.AMOUNTS},
+        )
+        for row in rows
+    ]
+
+    # reports never see the range half rebuilt
+    with transaction.atomic():
+        SupplierMonthlyPurchases.objects.filter(date__gte=start, date__lte=end).delete()
+        SupplierMonthlyPurchases.objects.bulk_create(purchases, batch_size=batch_size)
+    return len({purchase.date for purchase in purchases})
+
+
+def _add(rows, key, amounts):
+    row = rows.setdefault(key, {})
+    for field, value in amounts.items():
+        row[field] = row.get(field, 0) + (value or 0)
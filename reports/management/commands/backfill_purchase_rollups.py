@@ -0,0 +1,71 @@
+"""
+Management command rebuilding the monthly supplier purchases from history.
+
+Months are rebuilt in chunks of --chunk-months, each chunk in its own
+transaction (see reports.backfill.rebuild_purchases), so a backfill over
+years of orders never holds one long transaction. Without --start it begins
+at the month of the first order; without --end it stops at the current month.
+
+Usage:
+    python manage.py backfill_purchase_rollups
+    python manage.py backfill_purchase_rollups --start 2024-01 --end 2024-12 --chunk-months 3
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import localdate
+
+from orders.models import Order
+from reports.backfill import rebuild_purchases
+
+
+class Command(BaseCommand):
+    help = "Rebuild the monthly supplier purchases of a range of months from orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First month to rebuild, YYYY-MM (default: first order)")
+        parser.add_argument("--end", help="Last month to rebuild, YYYY-MM (default: this month)")
+        parser.add_argument(
+            "--chunk-months", type=int, default=12,
+            help="Months rebuilt per transaction (default: 12)",
+        )
+
+    def handle(self, *args, **options):
+        start = self.month(options["start"], "--start")
+        end = self.month(options["end"], "--end") or localdate().replace(day=1)
+        if start is None:
+            first = Order.objects.order_by("created").values_list("created", flat=True).first()
+            if first is None:
+                self.stdout.write("No orders to roll up.")
+                return
+            start = localdate(first).replace(day=1)
+        if options["chunk_months"] < 1:
+            raise CommandError("--chunk-months must be at least 1.")
+        if start > end:
+            raise CommandError(f"--start {start:%Y-%m} is after --end {end:%Y-%m}.")
+
+        months = 0
+        while start <= end:
+            last = start
+            for _ in range(options["chunk_months"] - 1):
+                if last == end:
+                    break
+                last = next_month(last)
+            months += rebuild_purchases(start, last)
+            self.stdout.write(f"Rebuilt {start:%Y-%m} to {last:%Y-%m}.")
+            start = next_month(last)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt supplier purchases of {months} months with orders."))
+
+    def month(self, value, option):
+        if value is None:
+            return None
+        try:
+            return datetime.datetime.strptime(value, "%Y-%m").date()
+        except ValueError:
+            raise CommandError(f"{option} must be a month as YYYY-MM.")
+
+
+def next_month(month):
+    """First day of the month after `month`."""
+    return (month.replace(day=1) + datetime.timedelta(days=31)).replace(day=1)
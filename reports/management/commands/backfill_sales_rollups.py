@@ -0,0 +1,68 @@
+"""
+Management command rebuilding the daily sales rollups from history.
+
+Days are rebuilt in chunks of --chunk-days, each chunk in its own
+transaction (see reports.backfill.rebuild_rollups), so a backfill over
+years of invoices never holds one long transaction. Without --start it
+begins at the first invoice; without --end it stops yesterday, the last
+closed day.
+
+Usage:
+    python manage.py backfill_sales_rollups
+    python manage.py backfill_sales_rollups --start 2024-01-01 --end 2024-12-31 --chunk-days 7
+"""
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localdate
+
+from reports.backfill import rebuild_rollups
+from sales.models import Invoice
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollups of a range of days from invoices and refunds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="First day to rebuild, YYYY-MM-DD (default: first invoice)")
+        parser.add_argument("--end", help="Last day to rebuild, YYYY-MM-DD (default: yesterday)")
+        parser.add_argument(
+            "--chunk-days", type=int, default=31,
+            help="Days rebuilt per transaction (default: 31)",
+        )
+
+    def handle(self, *args, **options):
+        start = self.day(options["start"], "--start")
+        end = self.day(options["end"], "--end") or localdate() - datetime.timedelta(days=1)
+        if start is None:
+            first = Invoice.objects.order_by("created").values_list("created", flat=True).first()
+            if first is None:
+                self.stdout.write("No invoices to roll up.")
+                return
+            start = localdate(first)
+        if options["chunk_days"] < 1:
+            raise CommandError("--chunk-days must be at least 1.")
+        if start > end:
+            raise CommandError(f"--start {start} is after --end {end}.")
+
+        days = 0
+        chunk = datetime.timedelta(days=options["chunk_days"])
+        while start <= end:
+            last = min(start + chunk - datetime.timedelta(days=1), end)
+            days += rebuild_rollups(start, last)
+            self.stdout.write(f"Rebuilt {start} to {last}.")
+            start = last + datetime.timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollups of {days} days with sales."))
+
+    def day(self, value, option):
+        if value is None:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise CommandError(f"{option} must be a date as YYYY-MM-DD.")
+        return day
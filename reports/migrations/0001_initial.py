@@ -0,0 +1,71 @@
+# Generated by Django 5.2 on 2026-10-18 01:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('medicine', '0005_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discounted_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refunded_units', models.IntegerField(default=0)),
+                ('refunded_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('invoices', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Daily Sales',
+                'verbose_name_plural': 'Daily Sales',
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('date',), name='unique_daily_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discounted_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refunded_units', models.IntegerField(default=0)),
+                ('refunded_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='medicine.category')),
+            ],
+            options={
+                'verbose_name': 'Category Daily Sales',
+                'verbose_name_plural': 'Category Daily Sales',
+                'constraints': [models.UniqueConstraint(fields=('date', 'category'), name='unique_category_daily_sales')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MedicineDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('discounted_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refunded_units', models.IntegerField(default=0)),
+                ('refunded_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='medicine.medicine')),
+            ],
+            options={
+                'verbose_name': 'Medicine Daily Sales',
+                'verbose_name_plural': 'Medicine Daily Sales',
+                'constraints': [models.UniqueConstraint(fields=('date', 'medicine'), name='unique_medicine_daily_sales')],
+            },
+        ),
+    ]
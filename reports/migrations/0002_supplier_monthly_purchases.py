@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 02:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicine', '0005_stock_ledger'),
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierMonthlyPurchases',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('spend_before', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('spend_after', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_purchases', to='medicine.medicine')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_purchases', to='medicine.supplier')),
+            ],
+            options={
+                'verbose_name': 'Supplier Monthly Purchases',
+                'verbose_name_plural': 'Supplier Monthly Purchases',
+                'indexes': [models.Index(fields=['supplier', 'date'], name='purchases_supplier_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'supplier', 'medicine'), name='unique_supplier_monthly_purchases')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_supplier_monthly_purchases'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='dailysales',
+            options={'ordering': ['date', 'shard'], 'verbose_name': 'Daily Sales', 'verbose_name_plural': 'Daily Sales'},
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailysales',
+            name='unique_daily_sales',
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('date', 'shard'), name='unique_daily_sales_shard'),
+        ),
+    ]
@@ -0,0 +1,224 @@
+"""
+Rollup Models
+
+Sales and purchase totals kept alongside the invoices and orders, so reports
+read a few hundred pre-aggregated rows instead of scanning invoices, orders
+and their items.
+
+Rows are updated incrementally as invoices are sold and refunded and as
+orders are received, edited and deleted (see reports.rollups). They can be
+rebuilt from history with the `backfill_sales_rollups` and
+`backfill_purchase_rollups` commands (see reports.backfill).
+
+Revenue is the sum of line totals at their sold prices; discounted revenue
+applies each invoice's discount to its lines, rounded per line. Sales are
+dated by their invoice, refunds by the day the units came back. Purchases
+are the stored line totals of order items, dated by the month of their order.
+
+Models:
+    - RollupQuerySet: Sums of rollup rows over a range of dates
+    - SalesRollup: Abstract base holding the rolled-up sales amounts
+    - DailySales: Sales of one day, in shards
+    - MedicineDailySales: Sales of one medicine on one day
+    - CategoryDailySales: Sales of one category's medicines on one day
+    - SupplierMonthlyPurchases: Purchases of one medicine from one supplier in one month
+
+Functions:
+    - weighted_discount: Spend-weighted average discount of purchases
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import models
+from django.db.models import Sum
+
+from medicine.models import Category, Medicine, Supplier
+
+
+class RollupQuerySet(models.QuerySet):
+    """
+    Queryset for rollup reports.
+
+    Methods:
+        between: Rows dated from start to end, inclusive
+        totals: Sums of the rows' amounts
+        summed_by: Sums of the rows' amounts per group
+    """
+
+    def between(self, start, end):
+        """Rows dated from `start` to `end`, inclusive."""
+        return self.filter(date__gte=start, date__lte=end)
+
+    def sums(self):
+        """Sum aggregates of the model's amounts, by field name."""
+        return {field: Sum(field) for field in self.model.AMOUNTS}
+
+    def totals(self):
+        """Sums of the rows' amounts, zero without rows."""
+        totals = self.aggregate(**self.sums())
+        return {field: value or 0 for field, value in totals.items()}
+
+    def summed_by(self, *fields):
+        """Sums of the rows' amounts per distinct value of `fields`."""
+        return self.values(*fields).annotate(**self.sums()).order_by(*fields)
+
+
+class SalesRollup(models.Model):
+    """
+    Abstract base for sales rollups.
+
+    Attributes:
+        date (DateField): The day rolled up
+        units_sold (IntegerField): Units sold
+        revenue (DecimalField): Line totals before discount
+        discounted_revenue (DecimalField): Line totals after the invoice discount
+        refunded_units (IntegerField): Units returned
+        refunded_amount (DecimalField): Amount paid back for returned units
+    """
+    # amounts updated by reports.rollups
+    AMOUNTS = ["units_sold", "revenue", "discounted_revenue", "refunded_units", "refunded_amount"]
+
+    date = models.DateField()
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    discounted_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunded_units = models.IntegerField(default=0)
+    refunded_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @property
+    def net_revenue(self):
+        """Discounted revenue less refunds."""
+        return self.discounted_revenue - self.refunded_amount
+
+
+class DailySales(SalesRollup):
+    """
+    Sales of one day, spread over a few shard rows.
+
+    Every sale of the day would otherwise update the same row, so terminals
+    would wait for each other's transactions. Each invoice is counted in
+    one shard (see reports.rollups) and reports sum a day's shards.
+
+    Attributes:
+        shard (PositiveSmallIntegerField): Which of the day's rows this is
+        invoices (IntegerField): Invoices created that day
+    """
+    AMOUNTS = ["invoices", *SalesRollup.AMOUNTS]
+
+    shard = models.PositiveSmallIntegerField(default=0)
+    invoices = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Daily Sales"
+        verbose_name_plural = "Daily Sales"
+        ordering = ["date", "shard"]
+        constraints = [
+            models.UniqueConstraint(fields=["date", "shard"], name="unique_daily_sales_shard"),
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.discounted_revenue}"
+
+
+class MedicineDailySales(SalesRollup):
+    """
+    Sales of one medicine on one day.
+
+    Attributes:
+        medicine (ForeignKey): The medicine sold
+    """
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name="daily_sales")
+
+    class Meta:
+        verbose_name = "Medicine Daily Sales"
+        verbose_name_plural = "Medicine Daily Sales"
+        constraints = [
+            models.UniqueConstraint(fields=["date", "medicine"], name="unique_medicine_daily_sales"),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.medicine_id}: {self.discounted_revenue}"
+
+
+class CategoryDailySales(SalesRollup):
+    """
+    Sales of the medicines of one category on one day.
+
+    Medicines count towards their own category only; reports summing a
+    subtree add up its categories' rows.
+
+    Attributes:
+        category (ForeignKey): The category of the medicines sold
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="daily_sales")
+
+    class Meta:
+        verbose_name = "Category Daily Sales"
+        verbose_name_plural = "Category Daily Sales"
+        constraints = [
+            models.UniqueConstraint(fields=["date", "category"], name="unique_category_daily_sales"),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.category_id}: {self.discounted_revenue}"
+
+
+class SupplierMonthlyPurchases(models.Model):
+    """
+    Purchases of one medicine from one supplier in one month.
+
+    The average discount of a group of rows is weighted by spend: one minus
+    the ratio of their summed spend after and before discount.
+
+    Attributes:
+        date (DateField): First day of the month rolled up
+        supplier (ForeignKey): The supplier ordered from
+        medicine (ForeignKey): The medicine ordered
+        quantity (IntegerField): Units ordered
+        spend_before (DecimalField): Line totals before the order discounts
+        spend_after (DecimalField): Line totals after the order discounts
+    """
+    # amounts updated by reports.rollups
+    AMOUNTS = ["quantity", "spend_before", "spend_after"]
+
+    date = models.DateField()
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name="monthly_purchases")
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name="monthly_purchases")
+    quantity = models.IntegerField(default=0)
+    spend_before = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    spend_after = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Supplier Monthly Purchases"
+        verbose_name_plural = "Supplier Monthly Purchases"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "supplier", "medicine"], name="unique_supplier_monthly_purchases",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["supplier", "date"], name="purchases_supplier_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.date:%Y-%m} {self.supplier_id} {self.medicine_id}: {self.spend_after}"
+
+    @property
+    def average_discount(self):
+        """Discount percentage over the row's spend."""
+        return weighted_discount(self.spend_before, self.spend_after)
+
+
+def weighted_discount(spend_before, spend_after):
+    """Spend-weighted discount percentage of purchases, rounded to cents; zero without spend."""
+    if not spend_before:
+        return Decimal("0.00")
+    discount = (Decimal(1) - Decimal(spend_after) / Decimal(spend_before)) * 100
+    return discount.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
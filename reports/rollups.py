@@ -0,0 +1,172 @@
+"""
+Incremental Rollups
+
+Keeps the rollup tables (see reports.models) current as invoices are sold
+and refunded and as supplier orders are received, edited and deleted. Every
+change adds deltas to the affected rows: missing
+rows are inserted first (ignoring rows that already exist), then each
+rollup table gets one UPDATE of the form `units_sold = units_sold + CASE
+...`. Concurrent sales of the same day therefore add up instead of
+overwriting each other, and the number of queries doesn't depend on the
+number of lines.
+
+An invoice's changes to the day's totals go to one of the day's
+`DAILY_SALES_SHARDS` DailySales rows (default: 8), picked from the invoice
+id, so concurrent sales mostly lock different rows and a transaction never
+locks more than one of them.
+
+These functions are called inside the transaction writing the sale, refund
+or order, so a rolled-back change leaves no trace in the rollups.
+
+Functions:
+    - discounted: Apply a discount percentage to an amount, rounded to cents
+    - record_invoice: Count a new invoice on its day
+    - retract_invoice: Stop counting a deleted invoice on its day
+    - record_sale: Add sale items to the rollups of their invoice's day
+    - retract_sale: Take sale items off the rollups of their invoice's day
+    - record_refund: Add returned units to today's rollups
+    - record_purchases: Add and take order items off their order's monthly purchases
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db.models import Case, F, Value, When
+from django.utils.timezone import localdate
+
+from reports.models import CategoryDailySales, DailySales, MedicineDailySales, SupplierMonthlyPurchases
+
+
+def discounted(amount, discount):
+    """`amount` less `discount` percent, rounded to cents."""
+    amount = Decimal(amount) * (Decimal(100) - Decimal(discount)) / Decimal(100)
+    return amount.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def record_invoice(invoice):
+    """Count a newly created invoice on the day it was created."""
+    _apply(DailySales, {None: {"invoices": 1}}, date=localdate(invoice.created), shard=_shard(invoice))
+
+
+def retract_invoice(invoice):
+    """Stop counting a deleted invoice on the day it was created."""
+    _apply(DailySales, {None: {"invoices": -1}}, date=localdate(invoice.created), shard=_shard(invoice))
+
+
+def record_sale(invoice, items):
+    """Add sold `items` of `invoice` to the rollups of the invoice's day."""
+    _record_sale(invoice, items, 1)
+
+
+def retract_sale(invoice, items):
+    """Take `items` of `invoice` off the rollups, e.g. before they are replaced."""
+    _record_sale(invoice, items, -1)
+
+
+def record_refund(invoice, returned):
+    """
+    Add returned units to today's rollups.
+
+    Args:
+        invoice (Invoice): The refunded invoice
+        returned (list[tuple[SaleItem, int]]): Sale items and the units returned
+    """
+    _apply_lines(localdate(), _shard(invoice), [
+        (item.batch.medicine, {
+            "refunded_units": quantity,
+            "refunded_amount": discounted(item.unit_price * quantity, invoice.discount),
+        })
+        for item, quantity in returned
+    ])
+
+
+def record_purchases(order, added=(), removed=()):
+    """
+    Update the monthly purchases of an order's supplier with one UPDATE.
+
+    Items are counted at their stored line totals, in the month the order
+    was created. An edited item is taken off at its old values and added at
+    its new ones.
+
+    Args:
+        order (Order): The order of the items
+        added (list[OrderItem]): Items received or edited into the order
+        removed (list[OrderItem]): Items deleted or edited out of the order
+    """
+    medicines = {}
+    for items, sign in ((added, 1), (removed, -1)):
+        for item in items:
+            row = medicines.setdefault(item.batch.medicine_id, {field: 0 for field in SupplierMonthlyPurchases.AMOUNTS})
+            row["quantity"] += sign * item.quantity
+            row["spend_before"] += sign * item.line_total_before
+            row["spend_after"] += sign * item.line_total_after
+    _apply(
+        SupplierMonthlyPurchases, medicines, "medicine_id",
+        date=localdate(order.created).replace(day=1), supplier_id=order.supplier_id,
+    )
+
+
+def _shard(invoice):
+    """The DailySales shard taking `invoice`'s changes."""
+    return invoice.pk % getattr(settings, "DAILY_SALES_SHARDS", 8)
+
+
+def _record_sale(invoice, items, sign):
+    _apply_lines(localdate(invoice.created), _shard(invoice), [
+        (item.batch.medicine, {
+            "units_sold": sign * item.quantity,
+            "revenue": sign * item.line_total,
+            "discounted_revenue": sign * discounted(item.line_total, invoice.discount),
+        })
+        for item in items
+    ])
+
+
+def _apply_lines(day, shard, lines):
+    """Add (medicine, amounts) lines to the day's total (in `shard`), medicine and category rows."""
+    total, medicines, categories = {}, {}, {}
+    for medicine, amounts in lines:
+        for deltas, key in ((total, None), (medicines, medicine.pk), (categories, medicine.category_id)):
+            row = deltas.setdefault(key, {})
+            for field, amount in amounts.items():
+                row[field] = row.get(field, 0) + amount
+    _apply(DailySales, total, date=day, shard=shard)
+    _apply(MedicineDailySales, medicines, "medicine_id", date=day)
+    _apply(CategoryDailySales, categories, "category_id", date=day)
+
+
+def _apply(model, deltas, key=None, **scope):
+    """
+    Add `deltas` to the rows of `model` within `scope`.
+
+    Args:
+        model: The rollup model
+        deltas (dict): Key value -> {field: delta}; the key value is None
+            for DailySales, which has one row per day and shard
+        key (str | None): Field holding the key value, e.g. 'medicine_id'
+        scope: Values shared by all the rows, e.g. their date
+    """
+    deltas = {value: changes for value, changes in deltas.items() if any(changes.values())}
+    if not deltas:
+        return
+    model.objects.bulk_create(
+        [model(**scope, **({key: value} if key else {})) for value in deltas],
+        ignore_conflicts=True,
+    )
+    rows = model.objects.filter(**scope)
+    if key:
+        rows = rows.filter(**{f"{key}__in": list(deltas)})
+
+    updates = {}
+    for field in {field for changes in deltas.values() for field in changes}:
+        output = model._meta.get_field(field)
+        if key is None:
+            change = Value(deltas[None].get(field, 0), output_field=output)
+        else:
+            change = Case(
+                *[When(**{key: value}, then=Value(changes.get(field, 0))) for value, changes in deltas.items()],
+                default=Value(0),
+                output_field=output,
+            )
+        updates[field] = F(field) + change
+    rows.update(**updates)
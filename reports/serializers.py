@@ -0,0 +1,124 @@
+"""
+Serializers for the revenue and supplier purchase reports.
+
+Serializers:
+    - RevenueQuerySerializer: For revenue report query parameters (input)
+    - RevenueSerializer: For summed rollup amounts (output)
+    - RevenueRowSerializer: For one row of a revenue report (output)
+    - PurchasesQuerySerializer: For supplier purchase report query parameters (input)
+    - PurchasesSerializer: For summed purchase amounts (output)
+    - PurchasesRowSerializer: For one row of a supplier purchase report (output)
+"""
+
+import datetime
+
+from django.utils.timezone import localdate
+from rest_framework import serializers
+
+from reports.models import weighted_discount
+
+
+class RevenueQuerySerializer(serializers.Serializer):
+    """
+    Input serializer for revenue report query parameters.
+
+    The range defaults to the last 30 days, today included.
+    """
+    GROUPS = ["day", "month", "medicine", "category"]
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    by = serializers.ChoiceField(choices=GROUPS, default="day")
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=50)
+
+    def validate(self, data):
+        data.setdefault("end", localdate())
+        data.setdefault("start", data["end"] - datetime.timedelta(days=29))
+        if data["start"] > data["end"]:
+            raise serializers.ValidationError("start must be on or before end.")
+        return data
+
+
+class RevenueSerializer(serializers.Serializer):
+    """
+    Output serializer for summed rollup amounts.
+
+    `invoices` is only present for daily totals; `net_revenue` is the
+    discounted revenue less refunds.
+    """
+    invoices = serializers.IntegerField(required=False)
+    units_sold = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    discounted_revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    refunded_units = serializers.IntegerField()
+    refunded_amount = serializers.DecimalField(max_digits=14, decimal_places=2)
+    net_revenue = serializers.SerializerMethodField()
+
+    def get_net_revenue(self, row):
+        net = (row["discounted_revenue"] or 0) - (row["refunded_amount"] or 0)
+        return serializers.DecimalField(max_digits=14, decimal_places=2).to_representation(net)
+
+
+class RevenueRowSerializer(RevenueSerializer):
+    """
+    Output serializer for one row of a revenue report.
+
+    Rows grouped by day or month carry the `period`; rows grouped by
+    medicine or category carry its id and `name`.
+    """
+    period = serializers.DateField(required=False)
+    medicine = serializers.IntegerField(source="medicine_id", required=False)
+    category = serializers.IntegerField(source="category_id", required=False)
+    name = serializers.CharField(required=False)
+
+
+class PurchasesQuerySerializer(serializers.Serializer):
+    """
+    Input serializer for supplier purchase report query parameters.
+
+    Months are given as YYYY-MM (a full date selects its month). The range
+    defaults to the last 12 months, this month included.
+    """
+    GROUPS = ["month", "medicine"]
+
+    start = serializers.DateField(required=False, input_formats=["%Y-%m", "iso-8601"])
+    end = serializers.DateField(required=False, input_formats=["%Y-%m", "iso-8601"])
+    by = serializers.ChoiceField(choices=GROUPS, default="month")
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=50)
+
+    def validate(self, data):
+        end = data.get("end", localdate()).replace(day=1)
+        start = data.get("start", (end - datetime.timedelta(days=335)).replace(day=1)).replace(day=1)
+        if start > end:
+            raise serializers.ValidationError("start must be on or before end.")
+        data["start"], data["end"] = start, end
+        return data
+
+
+class PurchasesSerializer(serializers.Serializer):
+    """
+    Output serializer for summed purchase amounts.
+
+    `average_discount` is the discount percentage weighted by spend.
+    """
+    quantity = serializers.IntegerField()
+    spend_before = serializers.DecimalField(max_digits=14, decimal_places=2)
+    spend_after = serializers.DecimalField(max_digits=14, decimal_places=2)
+    average_discount = serializers.SerializerMethodField()
+
+    def get_average_discount(self, row):
+        discount = weighted_discount(row["spend_before"] or 0, row["spend_after"] or 0)
+        return serializers.DecimalField(max_digits=5, decimal_places=2).to_representation(discount)
+
+
+class PurchasesRowSerializer(PurchasesSerializer):
+    """
+    Output serializer for one row of a supplier purchase report.
+
+    Rows grouped by month carry the `period`; rows grouped by supplier or
+    medicine carry its id and `name`.
+    """
+    period = serializers.DateField(required=False)
+    supplier = serializers.IntegerField(source="supplier_id", required=False)
+    medicine = serializers.IntegerField(source="medicine_id", required=False)
+    name = serializers.CharField(required=False)
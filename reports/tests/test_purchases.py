@@ -0,0 +1,150 @@
+import pytest
+from decimal import Decimal
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils.timezone import localdate
+
+from medicine.tests.factories import BatchFactory, MedicineFactory, SupplierFactory
+from orders.models import Order
+from orders.receiving import cancel
+from orders.serializers import OrderCreationSerializer
+from orders.tests.factories import OrderFactory, OrderItemFactory
+from reports.backfill import rebuild_purchases
+from reports.models import SupplierMonthlyPurchases
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def medicines():
+    return [MedicineFactory(price=Decimal(price), units_per_pack=1) for price in ("10.00", "2.50")]
+
+
+def lines(*items):
+    return [
+        {"medicine": medicine.name, "packs": packs, "discount": discount, "expiry_date": "2030-01"}
+        for medicine, packs, discount in items
+    ]
+
+
+def place(supplier, items):
+    serializer = OrderCreationSerializer(data={"supplier": supplier.id, "items": items})
+    assert serializer.is_valid(), serializer.errors
+    return serializer.save()
+
+
+def edit(order, data):
+    serializer = OrderCreationSerializer(order, data=data, partial=True)
+    assert serializer.is_valid(), serializer.errors
+    return serializer.save()
+
+
+def purchases():
+    return {
+        (row.supplier_id, row.medicine_id): (row.quantity, row.spend_before, row.spend_after)
+        for row in SupplierMonthlyPurchases.objects.all()
+    }
+
+
+class TestIncrementalPurchases:
+    def test_order_updates_purchases(self, medicines):
+        first, second = medicines
+        supplier = SupplierFactory()
+        place(supplier, lines((first, 2, "10.00"), (second, 4, "0.00")))
+        place(supplier, lines((first, 1, "0.00")))
+
+        row = SupplierMonthlyPurchases.objects.get(supplier=supplier, medicine=first)
+        assert row.date == localdate().replace(day=1)
+        assert (row.quantity, row.spend_before, row.spend_after) == (3, Decimal("30.00"), Decimal("28.00"))
+        assert row.average_discount == Decimal("6.67")
+        assert purchases()[supplier.pk, second.pk] == (4, Decimal("10.00"), Decimal("10.00"))
+
+    def test_edit_applies_differences(self, medicines):
+        first, second = medicines
+        supplier = SupplierFactory()
+        order = place(supplier, lines((first, 2, "10.00"), (second, 4, "0.00")))
+
+        edit(order, {"items": lines((first, 5, "20.00"))})
+
+        assert purchases() == {
+            (supplier.pk, first.pk): (5, Decimal("50.00"), Decimal("40.00")),
+            (supplier.pk, second.pk): (0, Decimal("0.00"), Decimal("0.00")),
+        }
+
+    def test_supplier_change_moves_purchases(self, medicines):
+        first, _ = medicines
+        old, new = SupplierFactory(), SupplierFactory()
+        order = place(old, lines((first, 2, "10.00")))
+
+        edit(order, {"supplier": new.id})
+
+        assert purchases() == {
+            (old.pk, first.pk): (0, Decimal("0.00"), Decimal("0.00")),
+            (new.pk, first.pk): (2, Decimal("20.00"), Decimal("18.00")),
+        }
+
+    def test_cancel_takes_purchases_off(self, medicines):
+        first, _ = medicines
+        supplier = SupplierFactory()
+        order = place(supplier, lines((first, 2, "10.00")))
+
+        cancel(order)
+
+        assert purchases() == {(supplier.pk, first.pk): (0, Decimal("0.00"), Decimal("0.00"))}
+
+    def test_order_item_save_and_delete(self, medicines):
+        first, _ = medicines
+        order = OrderFactory()
+        item = OrderItemFactory(order=order, batch=BatchFactory(medicine=first), quantity=3, discount=Decimal("0"))
+        assert purchases() == {(order.supplier_id, first.pk): (3, Decimal("30.00"), Decimal("30.00"))}
+
+        item.delete()
+        assert purchases() == {(order.supplier_id, first.pk): (0, Decimal("0.00"), Decimal("0.00"))}
+
+
+class TestRebuildPurchases:
+    def test_rebuild_matches_incremental_rows(self, medicines):
+        first, second = medicines
+        supplier = SupplierFactory()
+        order = place(supplier, lines((first, 2, "10.00"), (second, 4, "15.00")))
+        edit(order, {"items": lines((first, 3, "10.00"))})
+        incremental = {key: value for key, value in purchases().items() if value[0]}
+
+        SupplierMonthlyPurchases.objects.all().delete()
+        assert rebuild_purchases(localdate(), localdate()) == 1
+        assert purchases() == incremental
+
+    def test_rebuild_replaces_only_its_range(self, medicines):
+        first, _ = medicines
+        supplier = SupplierFactory()
+        place(supplier, lines((first, 2, "10.00")))
+        month = localdate().replace(day=1)
+        SupplierMonthlyPurchases.objects.create(
+            date=month.replace(year=month.year - 1), supplier=supplier, medicine=first, quantity=7,
+        )
+
+        rebuild_purchases(month, month)
+
+        assert SupplierMonthlyPurchases.objects.count() == 2
+        assert SupplierMonthlyPurchases.objects.get(date=month).quantity == 2
+
+    def test_backfill_command_in_chunks(self, medicines):
+        first, second = medicines
+        supplier = SupplierFactory()
+        old = place(supplier, lines((first, 2, "10.00")))
+        place(supplier, lines((second, 4, "0.00")))
+        month = localdate().replace(day=1)
+        Order.objects.filter(pk=old.pk).update(created=old.created.replace(year=old.created.year - 1))
+        SupplierMonthlyPurchases.objects.all().delete()
+
+        call_command("backfill_purchase_rollups", "--chunk-months", "5")
+
+        assert purchases() == {
+            (supplier.pk, first.pk): (2, Decimal("20.00"), Decimal("18.00")),
+            (supplier.pk, second.pk): (4, Decimal("10.00"), Decimal("10.00")),
+        }
+        assert SupplierMonthlyPurchases.objects.get(medicine=first).date == month.replace(year=month.year - 1)
+
+    def test_backfill_command_rejects_bad_month(self):
+        with pytest.raises(CommandError):
+            call_command("backfill_purchase_rollups", "--start", "2024-13")
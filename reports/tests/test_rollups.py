@@ -0,0 +1,149 @@
+import pytest
+from decimal import Decimal
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate, timedelta
+
+from medicine.tests.factories import BatchFactory, CategoryFactory, MedicineFactory
+from reports.backfill import rebuild_rollups
+from reports.models import CategoryDailySales, DailySales, MedicineDailySales
+from sales.checkout import cancel
+from sales.refunds import refund_invoice
+from sales.serializers import InvoiceCreationSerializer
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def batches():
+    category = CategoryFactory()
+    expiry = localdate() + timedelta(days=90)
+    return [
+        BatchFactory(
+            medicine=MedicineFactory(category=category, price=Decimal(price), units_per_pack=1),
+            stock_units=50,
+            expiry_date=expiry,
+        )
+        for price in ("10.00", "2.50")
+    ]
+
+
+def sell(lines, discount="10.00"):
+    serializer = InvoiceCreationSerializer(data={
+        "items": [{"barcode": batch.barcode, "quantity": quantity} for batch, quantity in lines],
+        "payment_status": "paid",
+        "discount": discount,
+    })
+    serializer.is_valid(raise_exception=True)
+    return serializer.save()
+
+
+def today():
+    """Today's sales, summed over the shards."""
+    return DailySales.objects.filter(date=localdate()).totals()
+
+
+def snapshot():
+    fields = ["date", "units_sold", "revenue", "discounted_revenue", "refunded_units", "refunded_amount"]
+    return (
+        list(DailySales.objects.summed_by("date")),
+        list(MedicineDailySales.objects.order_by("date", "medicine_id").values("medicine_id", *fields)),
+        list(CategoryDailySales.objects.order_by("date", "category_id").values("category_id", *fields)),
+    )
+
+
+class TestIncrementalRollups:
+    def test_sale_updates_rollups(self, batches):
+        first, second = batches
+        sell([(first, 2), (second, 3)])
+        sell([(first, 1)], discount="0.00")
+
+        day = today()
+        assert day["invoices"] == 2
+        assert day["units_sold"] == 6
+        assert day["revenue"] == Decimal("37.50")
+        assert day["discounted_revenue"] == Decimal("34.75")
+
+        medicine = MedicineDailySales.objects.get(medicine=first.medicine)
+        assert (medicine.units_sold, medicine.revenue, medicine.discounted_revenue) == (3, Decimal("30.00"), Decimal("28.00"))
+        category = CategoryDailySales.objects.get(category=first.medicine.category)
+        assert category.revenue == day["revenue"]
+
+    def test_invoices_spread_over_shards(self, batches, settings):
+        settings.DAILY_SALES_SHARDS = 4
+        invoices = [sell([(batches[0], 1)]) for _ in range(4)]
+        shards = dict(DailySales.objects.filter(date=localdate()).values_list("shard", "invoices"))
+        assert shards == {invoice.pk % 4: 1 for invoice in invoices}
+
+    def test_query_count_does_not_grow_with_lines(self, batches):
+        def queries(lines):
+            with CaptureQueriesContext(connection) as captured:
+                sell(lines)
+            return len(captured)
+
+        assert queries([(batches[0], 1)]) == queries([(batches[0], 1), (batches[1], 1)])
+
+    def test_refund_updates_rollups(self, batches):
+        invoice = sell([(batches[0], 4)])
+        item = invoice.sales_items.get()
+        refund_invoice(invoice.pk, {item.pk: 1})
+        refund_invoice(invoice.pk)
+
+        day = today()
+        assert day["refunded_units"] == 4
+        assert day["refunded_amount"] == Decimal("36.00")
+        assert day["discounted_revenue"] - day["refunded_amount"] == 0
+
+    def test_replacing_items_and_discount(self, batches):
+        invoice = sell([(batches[0], 2)])
+        serializer = InvoiceCreationSerializer(
+            invoice, data={"items": [{"barcode": batches[1].barcode, "quantity": 4}], "discount": "50.00"}, partial=True,
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        day = today()
+        assert (day["invoices"], day["units_sold"], day["revenue"], day["discounted_revenue"]) == (1, 4, Decimal("10.00"), Decimal("5.00"))
+        assert MedicineDailySales.objects.get(medicine=batches[0].medicine).units_sold == 0
+
+    def test_deleted_invoice_is_taken_off(self, batches):
+        sell([(batches[0], 1)])
+        cancel(sell([(batches[0], 2), (batches[1], 3)]))
+
+        day = today()
+        assert (day["invoices"], day["units_sold"], day["revenue"]) == (1, 1, Decimal("10.00"))
+        assert MedicineDailySales.objects.get(medicine=batches[1].medicine).units_sold == 0
+
+
+class TestRebuildRollups:
+    def test_rebuild_matches_incremental_rows(self, batches):
+        invoice = sell([(batches[0], 3), (batches[1], 5)], discount="12.50")
+        sell([(batches[1], 1)], discount="33.33")
+        refund_invoice(invoice.pk, {invoice.sales_items.order_by("pk").first().pk: 2})
+        incremental = snapshot()
+
+        for model in (DailySales, MedicineDailySales, CategoryDailySales):
+            model.objects.all().delete()
+        assert rebuild_rollups(localdate(), localdate()) == 1
+        assert snapshot() == incremental
+
+    def test_rebuild_replaces_only_its_range(self, batches):
+        sell([(batches[0], 1)])
+        old = DailySales.objects.create(date=localdate() - timedelta(days=40), invoices=7)
+        DailySales.objects.filter(date=localdate()).update(units_sold=99)
+
+        rebuild_rollups(localdate() - timedelta(days=1), localdate())
+        assert today()["units_sold"] == 1
+        assert DailySales.objects.get(pk=old.pk).invoices == 7
+
+    def test_backfill_command_in_chunks(self, batches):
+        sell([(batches[0], 1)])
+        DailySales.objects.all().delete()
+
+        call_command("backfill_sales_rollups", "--end", str(localdate()), "--chunk-days", "1")
+        assert today()["units_sold"] == 1
+
+        with pytest.raises(CommandError):
+            call_command("backfill_sales_rollups", "--start", "2025-02-30")
@@ -5,7 +5,8 @@ from rest_framework import status
 from django.utils.timezone import  now
 from datetime import timedelta
 from users.tests.factories import UserFactory
-from medicine.tests.factories import BatchFactory
+from medicine.tests.factories import BatchFactory, MedicineFactory, SupplierFactory
+from reports.models import DailySales, MedicineDailySales, SupplierMonthlyPurchases
 
 @pytest.fixture
 def pharmacist_user():
@@ -140,3 +141,122 @@ class TestNearExpireAPIView:
         response = auth_client.get(url)
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data) == 0
+
+@pytest.mark.django_db
+class TestRevenueReportAPIView:
+    """Tests for RevenueReportAPIView"""
+
+    @pytest.fixture
+    def rollups(self):
+        today = now().date()
+        medicines = [MedicineFactory(), MedicineFactory()]
+        for days_ago in range(3):
+            day = today - timedelta(days=days_ago)
+            DailySales.objects.create(
+                date=day, invoices=2, units_sold=5, revenue="50.00",
+                discounted_revenue="45.00", refunded_units=1, refunded_amount="9.00",
+            )
+            for medicine, revenue in zip(medicines, ("30.00", "20.00")):
+                MedicineDailySales.objects.create(
+                    date=day, medicine=medicine, units_sold=2, revenue=revenue, discounted_revenue=revenue,
+                )
+        return medicines
+
+    def test_revenue_by_day(self, auth_client, rollups):
+        response = auth_client.get(reverse('revenue'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["totals"]["invoices"] == 6
+        assert response.data["totals"]["discounted_revenue"] == "135.00"
+        assert response.data["totals"]["net_revenue"] == "108.00"
+        assert [row["period"] for row in response.data["rows"]] == sorted(row["period"] for row in response.data["rows"])
+        assert len(response.data["rows"]) == 3
+
+    def test_revenue_by_medicine(self, auth_client, rollups):
+        response = auth_client.get(reverse('revenue'), {"by": "medicine", "limit": 1})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["rows"]) == 1
+        assert response.data["rows"][0]["medicine"] == rollups[0].pk
+        assert response.data["rows"][0]["name"] == rollups[0].name
+        assert response.data["rows"][0]["revenue"] == "90.00"
+
+    def test_revenue_range_and_month(self, auth_client, rollups):
+        today = now().date()
+        response = auth_client.get(reverse('revenue'), {"start": today, "end": today, "by": "month"})
+        assert response.data["totals"]["units_sold"] == 5
+        assert response.data["rows"][0]["period"] == str(today.replace(day=1))
+
+    def test_revenue_invalid_range(self, auth_client):
+        response = auth_client.get(reverse('revenue'), {"start": "2025-02-01", "end": "2025-01-01"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_revenue_non_pharmacist(self, auth_client, non_pharmacist_user):
+        auth_client.force_authenticate(user=non_pharmacist_user)
+        response = auth_client.get(reverse('revenue'))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestSupplierPurchasesAPIView:
+    """Tests for SupplierPurchasesAPIView and SupplierPurchaseDetailAPIView"""
+
+    @pytest.fixture
+    def purchases(self):
+        month = now().date().replace(day=1)
+        last_month = (month - timedelta(days=1)).replace(day=1)
+        suppliers = [SupplierFactory(), SupplierFactory()]
+        medicines = [MedicineFactory(), MedicineFactory()]
+        for date in (month, last_month):
+            for medicine, (before, after) in zip(medicines, (("100.00", "90.00"), ("50.00", "40.00"))):
+                SupplierMonthlyPurchases.objects.create(
+                    date=date, supplier=suppliers[0], medicine=medicine,
+                    quantity=10, spend_before=before, spend_after=after,
+                )
+        SupplierMonthlyPurchases.objects.create(
+            date=month, supplier=suppliers[1], medicine=medicines[0],
+            quantity=1, spend_before="10.00", spend_after="10.00",
+        )
+        return suppliers, medicines
+
+    def test_purchases_by_supplier(self, auth_client, purchases):
+        suppliers, _ = purchases
+        response = auth_client.get(reverse('supplier-purchases'))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["totals"]["quantity"] == 41
+        assert response.data["totals"]["spend_after"] == "270.00"
+        first = response.data["rows"][0]
+        assert (first["supplier"], first["name"]) == (suppliers[0].pk, suppliers[0].name)
+        assert first["spend_before"] == "300.00"
+        assert first["average_discount"] == "13.33"
+        assert response.data["rows"][1]["average_discount"] == "0.00"
+
+    def test_supplier_detail_by_month(self, auth_client, purchases):
+        suppliers, _ = purchases
+        month = now().date().replace(day=1)
+        url = reverse('supplier-purchase-detail', args=[suppliers[0].pk])
+        response = auth_client.get(url, {"start": month.strftime("%Y-%m")})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["supplier"]["name"] == suppliers[0].name
+        assert [row["period"] for row in response.data["rows"]] == [str(month)]
+        assert response.data["totals"]["spend_after"] == "130.00"
+
+    def test_supplier_detail_by_medicine(self, auth_client, purchases):
+        suppliers, medicines = purchases
+        url = reverse('supplier-purchase-detail', args=[suppliers[0].pk])
+        response = auth_client.get(url, {"by": "medicine", "limit": 1})
+        assert len(response.data["rows"]) == 1
+        assert response.data["rows"][0]["medicine"] == medicines[0].pk
+        assert response.data["rows"][0]["quantity"] == 20
+        assert response.data["rows"][0]["average_discount"] == "10.00"
+
+    def test_supplier_detail_unknown_supplier(self, auth_client):
+        response = auth_client.get(reverse('supplier-purchase-detail', args=[0]))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_purchases_invalid_range(self, auth_client):
+        response = auth_client.get(reverse('supplier-purchases'), {"start": "2025-02", "end": "2025-01"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_purchases_non_pharmacist(self, auth_client, non_pharmacist_user):
+        auth_client.force_authenticate(user=non_pharmacist_user)
+        response = auth_client.get(reverse('supplier-purchases'))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
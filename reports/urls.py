@@ -1,9 +1,15 @@
 from django.urls import path
-from .views import OutOfStockAPIView, ExpiredAPIView, NearExpireAPIView
+from .views import (
+    OutOfStockAPIView, ExpiredAPIView, NearExpireAPIView, RevenueReportAPIView,
+    SupplierPurchasesAPIView, SupplierPurchaseDetailAPIView,
+)
 
-# API URL patterns for retrieving different inventory states
+# API URL patterns for retrieving different inventory states, sales revenue and supplier purchases
 urlpatterns = [
     path('out-of-stock/', OutOfStockAPIView.as_view(), name='out-of-stock'),
     path('expired/', ExpiredAPIView.as_view(), name='expired'),
     path('near-expiry/', NearExpireAPIView.as_view(), name='near-expiry'),
+    path('revenue/', RevenueReportAPIView.as_view(), name='revenue'),
+    path('suppliers/', SupplierPurchasesAPIView.as_view(), name='supplier-purchases'),
+    path('suppliers/<int:pk>/', SupplierPurchaseDetailAPIView.as_view(), name='supplier-purchase-detail'),
 ]
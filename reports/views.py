@@ -11,6 +11,16 @@ from medicine.models import Batch
 from django.utils.timezone import now
 from rest_framework.exceptions import ValidationError
 from dateutil.relativedelta import relativedelta  # Add this import
+from django.db.models import F
+from django.db.models.functions import TruncMonth
+from rest_framework.response import Response
+from django.shortcuts import get_object_or_404
+from medicine.models import Supplier
+from reports.models import CategoryDailySales, DailySales, MedicineDailySales, SupplierMonthlyPurchases
+from reports.serializers import (
+    PurchasesQuerySerializer, PurchasesRowSerializer, PurchasesSerializer,
+    RevenueQuerySerializer, RevenueRowSerializer, RevenueSerializer,
+)
 
 class OutOfStockAPIView(ListAPIView):
     """
@@ -78,3 +88,130 @@ class NearExpireAPIView(ListAPIView):
             expiry_date__gte=now().date(),
             expiry_date__lte=now().date() + relativedelta(months=months)
         )
+
+
+class RevenueReportAPIView(APIView):
+    """
+    API view that returns sales revenue over a range of days.
+
+    Reads only the daily rollup tables (see reports.models), never invoices,
+    so a year-long report sums at most a few hundred rows per group.
+
+    Permissions:
+        - Only accessible by pharmacists and admins.
+
+    Query Parameters:
+        - `start`, `end`: Dates (YYYY-MM-DD), optional; default to the last 30 days.
+        - `by`: Grouping of the rows: `day` (default), `month`, `medicine` or `category`.
+        - `limit`: Rows returned when grouping by medicine or category,
+            top revenue first (default: 50, at most 500).
+
+    Returns:
+        - The range, its `totals` and one row per group.
+    """
+    permission_classes = [IsPharmacistOnly]
+
+    def get(self, request):
+        query = RevenueQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end, by = query.validated_data["start"], query.validated_data["end"], query.validated_data["by"]
+
+        days = DailySales.objects.between(start, end)
+        if by == "day":
+            rows = days.annotate(period=F("date")).summed_by("period")
+        elif by == "month":
+            rows = days.annotate(period=TruncMonth("date")).summed_by("period")
+        else:
+            model = MedicineDailySales if by == "medicine" else CategoryDailySales
+            rows = model.objects.between(start, end)\
+                .annotate(name=F(f"{by}__name")).summed_by(f"{by}_id", "name")\
+                .order_by("-discounted_revenue", f"{by}_id")[:query.validated_data["limit"]]
+
+        return Response({
+            "start": start,
+            "end": end,
+            "by": by,
+            "totals": RevenueSerializer(days.totals()).data,
+            "rows": RevenueRowSerializer(rows, many=True).data,
+        })
+
+
+class SupplierPurchasesAPIView(APIView):
+    """
+    API view that returns purchases per supplier over a range of months.
+
+    Reads only the monthly purchase rollups (see reports.models), never
+    orders or their items.
+
+    Permissions:
+        - Only accessible by pharmacists and admins.
+
+    Query Parameters:
+        - `start`, `end`: Months (YYYY-MM), optional; default to the last 12 months.
+        - `limit`: Suppliers returned, top spend first (default: 50, at most 500).
+
+    Returns:
+        - The range, its `totals` and one row per supplier with its quantity,
+          spend before and after discount and spend-weighted average discount.
+    """
+    permission_classes = [IsPharmacistOnly]
+
+    def get(self, request):
+        query = PurchasesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end = query.validated_data["start"], query.validated_data["end"]
+
+        months = SupplierMonthlyPurchases.objects.between(start, end)
+        rows = months.annotate(name=F("supplier__name")).summed_by("supplier_id", "name")\
+            .order_by("-spend_after", "supplier_id")[:query.validated_data["limit"]]
+
+        return Response({
+            "start": start,
+            "end": end,
+            "totals": PurchasesSerializer(months.totals()).data,
+            "rows": PurchasesRowSerializer(rows, many=True).data,
+        })
+
+
+class SupplierPurchaseDetailAPIView(APIView):
+    """
+    API view that returns the purchases from one supplier over a range of months.
+
+    Reads only the monthly purchase rollups (see reports.models), never
+    orders or their items.
+
+    Permissions:
+        - Only accessible by pharmacists and admins.
+
+    Query Parameters:
+        - `start`, `end`: Months (YYYY-MM), optional; default to the last 12 months.
+        - `by`: Grouping of the rows: `month` (default) or `medicine`.
+        - `limit`: Rows returned when grouping by medicine, top spend first
+            (default: 50, at most 500).
+
+    Returns:
+        - The supplier, the range, its `totals` and one row per group.
+    """
+    permission_classes = [IsPharmacistOnly]
+
+    def get(self, request, pk):
+        supplier = get_object_or_404(Supplier, pk=pk)
+        query = PurchasesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end, by = query.validated_data["start"], query.validated_data["end"], query.validated_data["by"]
+
+        months = SupplierMonthlyPurchases.objects.filter(supplier=supplier).between(start, end)
+        if by == "month":
+            rows = months.annotate(period=F("date")).summed_by("period")
+        else:
+            rows = months.annotate(name=F("medicine__name")).summed_by("medicine_id", "name")\
+                .order_by("-spend_after", "medicine_id")[:query.validated_data["limit"]]
+
+        return Response({
+            "supplier": {"id": supplier.pk, "name": supplier.name},
+            "start": start,
+            "end": end,
+            "by": by,
+            "totals": PurchasesSerializer(months.totals()).data,
+            "rows": PurchasesRowSerializer(rows, many=True).data,
+        })
@@ -18,7 +18,8 @@ class SaleItemInline(admin.TabularInline):
     """
     model = SaleItem
     extra = 1
-    fields = ('batch', 'quantity')
+    fields = ('batch', 'quantity', 'unit_price', 'line_total')
+    readonly_fields = ('unit_price', 'line_total')
 
 
 @admin.register(Invoice)
@@ -48,10 +49,11 @@ class SaleItemAdmin(admin.ModelAdmin):
     list_display = ('invoice', 'batch', 'quantity', 'display_total')
     list_filter = ('invoice__payment_status',)
     search_fields = ('invoice__id', 'batch__medicine__name')
+    list_select_related = ('invoice', 'batch__medicine')
 
     def display_total(self, obj):
-        """Display the total cost of the sale item in the admin list view."""
+        """Display the stored total cost of the sale item in the admin list view."""
         if obj.pk:
-            return f"${obj.total:.2f}"
+            return f"${obj.line_total:.2f}"
         return "-"
     display_total.short_description = 'Total'
\ No newline at end of file
@@ -0,0 +1,192 @@
+"""
+Invoice Checkout
+
+Writes the sale items of an invoice with a fixed number of queries,
+whatever the number of lines:
+    - lines sold by medicine are allocated FEFO, one allocation per medicine
+    - the invoice total is computed in memory and saved with the invoice
+    - stock of every batch is taken in one conditional UPDATE (see
+      medicine.stock.decrement_many)
+    - sale items are inserted with one bulk_create
+    - the daily sales rollups take the new lines with one UPDATE per
+      rollup table (see reports.rollups)
+
+Lines are expected to be validated already (InvoiceCreationSerializer
+resolves all their barcodes with one lookup). Run `checkout` inside
+`transaction.atomic()`: when stock ran out since validation,
+InsufficientStock is raised and nothing is written.
+
+Replacing the items of an invoice goes through the same grouped stock
+update (see medicine.stock.adjust_many): the units of the current items go
+back to stock and those of the new items come out, netted per batch, so a
+batch on both sides only moves the difference. When a new line is sold by
+medicine, the current items' units are returned first so that allocation
+can draw on them. Deleting an invoice returns
+all its units with one UPDATE and takes it off the sales rollups.
+
+Units given back by an edit or a deletion are recorded in the stock ledger
+as adjustments, and units taken as sales, so the ledger tells sales apart
+from their corrections.
+
+Functions:
+    - build_items: Turn validated lines into unsaved sale items
+    - items_total: Sum of sale item totals, rounded like Invoice totals
+    - checkout: Save an invoice with its sale items and stock decrements
+    - revise: Replace the sale items of an invoice, applying only the stock differences
+    - cancel: Delete an invoice, returning its units to stock
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+
+from medicine import stock
+from medicine.allocation import allocate
+from medicine.models import StockMovement
+from reports import rollups
+from sales.models import Invoice, SaleItem
+from sales.refunds import RefundError
+
+
+def build_items(lines):
+    """
+    Turn validated lines into unsaved, priced sale items, in line order.
+
+    A line names either a `batch` or a `medicine_id`. All lines of one
+    medicine are allocated together, in one FEFO round, and the allocated
+    batches are handed out to those lines in order; a line may span
+    several batches and so become several items.
+    """
+    requested = {}
+    for line in lines:
+        if line.get("batch") is None:
+            requested[line["medicine_id"]] = requested.get(line["medicine_id"], 0) + line["quantity"]
+    allocations = {
+        medicine_id: allocate(medicine_id, quantity)
+        for medicine_id, quantity in requested.items()
+    }
+
+    items = []
+    for line in lines:
+        if line.get("batch") is not None:
+            items.append(SaleItem(batch=line["batch"], quantity=line["quantity"]))
+            items[-1].set_price()
+            continue
+        remaining = line["quantity"]
+        pending = allocations[line["medicine_id"]]
+        while remaining:
+            allocation = pending[0]
+            taken = min(allocation.quantity, remaining)
+            items.append(SaleItem(batch=allocation.batch, quantity=taken))
+            items[-1].set_price()
+            allocation.quantity -= taken
+            remaining -= taken
+            if not allocation.quantity:
+                pending.pop(0)
+    return items
+
+
+def items_total(items):
+    """Sum of the items' totals, rounded to cents."""
+    return sum((item.total for item in items), Decimal("0")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def checkout(invoice, lines):
+    """
+    Save `invoice` with sale items for validated `lines`.
+
+    A new invoice is inserted with its total already computed; for an
+    existing one the total is set and saving it is left to the caller.
+
+    Returns:
+        list[SaleItem]: The created sale items
+
+    Raises:
+        InsufficientStock: When a batch no longer holds enough units
+    """
+    items = build_items(lines)
+    invoice.total_before_discount = items_total(items)
+    if invoice._state.adding:
+        invoice.save()
+    for item in items:
+        item.invoice = invoice
+    stock.decrement_many(
+        [(item.batch, item.quantity) for item in items],
+        StockMovement.SALE,
+        source=invoice,
+    )
+    items = SaleItem.objects.bulk_create(items)
+    rollups.record_sale(invoice, items)
+    return items
+
+
+def revise(invoice, lines, discount=None):
+    """
+    Replace the sale items of an existing invoice with items for validated `lines`.
+
+    The current items leave the sales rollups at the invoice's discount, the
+    new ones enter them at `discount` when given. The invoice's total is set
+    and saving it is left to the caller. Invoices with returned units keep
+    their items (InvoiceCreationSerializer rejects the edit), since their
+    returns are counted in the rollups of the day they were made.
+
+    Returns:
+        list[SaleItem]: The new sale items
+
+    Raises:
+        InsufficientStock: When a batch no longer holds enough units
+    """
+    current = list(invoice.sales_items.select_related("batch__medicine").defer("batch__medicine__search_vector"))
+    rollups.retract_sale(invoice, current)
+    if discount is not None:
+        invoice.discount = discount
+    returned = [(item.batch, item.refundable_quantity) for item in current]
+    if any(line.get("batch") is None for line in lines):
+        # FEFO allocation only sees units in stock, so give the current ones back first
+        stock.increment_many(returned, StockMovement.ADJUSTMENT, source=invoice)
+        returned = []
+    items = build_items(lines)
+    invoice.total_before_discount = items_total(items)
+    for item in items:
+        item.invoice = invoice
+    changes = returned + [(item.batch, -item.quantity) for item in items]
+    net = {}
+    for batch, delta in changes:
+        net[batch.pk] = net.get(batch.pk, 0) + delta
+    # batches gaining units take back part of the sale, the others sell more
+    stock.increment_many(
+        [(batch, delta) for batch, delta in changes if net[batch.pk] > 0],
+        StockMovement.ADJUSTMENT,
+        source=invoice,
+    )
+    stock.adjust_many(
+        [(batch, delta) for batch, delta in changes if net[batch.pk] < 0],
+        StockMovement.SALE,
+        source=invoice,
+    )
+    SaleItem.objects.filter(pk__in=[item.pk for item in current]).delete()
+    items = SaleItem.objects.bulk_create(items)
+    rollups.record_sale(invoice, items)
+    return items
+
+
+def cancel(invoice):
+    """
+    Delete an invoice, returning its units to stock and taking it off the sales rollups.
+
+    The invoice row is locked first, so a concurrent refund either finishes
+    before or finds the invoice gone.
+
+    Raises:
+        RefundError: When units of the invoice were returned; their refunds
+            are counted in the rollups of the day they were made
+    """
+    with transaction.atomic():
+        Invoice.objects.select_for_update().filter(pk=invoice.pk).exists()
+        items = list(invoice.sales_items.select_related("batch__medicine").defer("batch__medicine__search_vector"))
+        if any(item.refunded_quantity for item in items):
+            raise RefundError(f"Units of invoice #{invoice.pk} were returned, it can't be deleted.")
+        stock.increment_many([(item.batch, item.quantity) for item in items], StockMovement.ADJUSTMENT, source=invoice)
+        rollups.retract_sale(invoice, items)
+        rollups.retract_invoice(invoice)
+        invoice.delete()
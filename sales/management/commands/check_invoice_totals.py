@@ -0,0 +1,42 @@
+"""
+Management command checking stored invoice totals against their lines.
+
+Invoice.total_before_discount is maintained as lines are written, not
+re-summed on every save. Lines changed outside the models (raw SQL,
+queryset updates) leave the stored total behind; this command finds those
+invoices and, with --fix, recomputes them in one UPDATE.
+
+Usage:
+    python manage.py check_invoice_totals
+    python manage.py check_invoice_totals --fix
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.models import Invoice
+
+
+class Command(BaseCommand):
+    help = "Report invoices whose total_before_discount differs from the sum of their lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix", action="store_true",
+            help="Recompute the totals of drifted invoices instead of failing",
+        )
+
+    def handle(self, *args, **options):
+        drifted = Invoice.objects.filter(payment_status="paid").drifted_totals()
+        if options["fix"]:
+            fixed = Invoice.objects.filter(pk__in=drifted.values("pk")).recompute_totals()
+            self.stdout.write(self.style.SUCCESS(f"Recomputed the totals of {fixed} invoices."))
+            return
+
+        count = 0
+        rows = drifted.order_by("id").values_list("id", "total_before_discount", "lines_total")
+        for invoice_id, stored, lines in rows.iterator():
+            count += 1
+            self.stdout.write(f"Invoice #{invoice_id}: stored {stored:.2f}, lines {lines:.2f}")
+        if count:
+            raise CommandError(f"{count} invoices have totals that don't match their lines.")
+        self.stdout.write(self.style.SUCCESS("Invoice totals match their lines."))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 01:33
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+
+def backfill_prices(apps, schema_editor):
+    """Price existing sale items from their medicine's current price, in chunks."""
+    SaleItem = apps.get_model("sales", "SaleItem")
+    chunk_size = 1000
+    last_id = 0
+    while True:
+        rows = list(
+            SaleItem.objects.filter(pk__gt=last_id).order_by("pk")
+            .values_list("pk", "quantity", "batch__medicine__price", "batch__medicine__units_per_pack")
+            [:chunk_size]
+        )
+        if not rows:
+            return
+        items = []
+        for pk, quantity, price, units_per_pack in rows:
+            unit_price = Decimal(price) / units_per_pack
+            items.append(SaleItem(
+                pk=pk,
+                unit_price=unit_price.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP),
+                line_total=(unit_price * quantity).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP),
+            ))
+        SaleItem.objects.bulk_update(items, ["unit_price", "line_total"])
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleitem',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=4, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 01:36
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_past_refunds(apps, schema_editor):
+    """Invoices refunded before this migration already restocked every unit."""
+    Invoice = apps.get_model("sales", "Invoice")
+    SaleItem = apps.get_model("sales", "SaleItem")
+    SaleItem.objects.filter(invoice__payment_status="refunded").update(refunded_quantity=F("quantity"))
+    Invoice.objects.filter(payment_status="refunded").update(refunded_at=F("modified"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_sale_item_prices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='refunded_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='refunded_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(mark_past_refunds, migrations.RunPython.noop),
+    ]
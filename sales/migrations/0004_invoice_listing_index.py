@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 01:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_refunds'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['payment_status', 'created', 'id'], name='invoice_status_created_idx'),
+        ),
+    ]
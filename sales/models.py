@@ -5,14 +5,75 @@ This module defines the `Invoice` and `SaleItem` models, which handle the creati
 management, and calculations related to invoices and their associated sale items.
 The `Invoice` model includes payment status, discount, and total calculations, while
 the `SaleItem` model tracks individual items sold within an invoice.
+`InvoiceQuerySet` loads invoice listings with SQL totals and prefetched items.
 """
 
-from django.db import models
-from medicine.models import Medicine, TimeStampedModel, Batch
+from django.db import models, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+from medicine.models import Medicine, TimeStampedModel, Batch, StockMovement
+from medicine import stock
+from reports import rollups
 from django.core.validators import MinValueValidator
+from django.utils.timezone import now
 from decimal import Decimal, ROUND_HALF_UP
 
 
+class InvoiceQuerySet(models.QuerySet):
+    """
+    Queryset for Invoice listings.
+
+    Methods:
+        with_totals: Annotate the discounted total computed in SQL
+        with_items: Prefetch sale items with their batches and medicines
+        items_prefetch: The Prefetch used by with_items
+        with_lines_total: Annotate the sum of the stored line totals
+        recompute_totals: Set total_before_discount from the lines in one UPDATE
+        drifted_totals: Invoices whose stored total differs from their lines
+    """
+
+    def with_totals(self):
+        """Annotate `discounted_total`, read by Invoice.total_after_discount."""
+        discounted = ExpressionWrapper(
+            F("total_before_discount") * (Value(100) - F("discount")) / Value(100),
+            output_field=DecimalField(max_digits=10, decimal_places=4),
+        )
+        return self.annotate(
+            discounted_total=Round(discounted, 2, output_field=DecimalField(max_digits=8, decimal_places=2)),
+        )
+
+    def with_items(self):
+        """Prefetch sale items, their batches and medicines in one extra query."""
+        return self.prefetch_related(self.items_prefetch())
+
+    @staticmethod
+    def items_prefetch():
+        """Prefetch of sale items with their batches and medicines, also for prefetch_related_objects."""
+        items = SaleItem.objects.select_related("batch__medicine")\
+            .defer("batch__medicine__search_vector").order_by("id")
+        return Prefetch("sales_items", queryset=items)
+
+    @staticmethod
+    def lines_total():
+        """Subquery summing the line totals of the outer invoice, 0 without lines."""
+        totals = SaleItem.objects.filter(invoice=OuterRef("pk"))\
+            .values("invoice").annotate(total=Sum("line_total")).values("total")
+        output = DecimalField(max_digits=8, decimal_places=2)
+        return Coalesce(Subquery(totals, output_field=output), Value(Decimal("0")), output_field=output)
+
+    def with_lines_total(self):
+        """Annotate `lines_total`, the sum of each invoice's stored line totals."""
+        return self.annotate(lines_total=self.lines_total())
+
+    def recompute_totals(self):
+        """Set total_before_discount of every invoice from its lines; returns the rows updated."""
+        return self.update(total_before_discount=self.lines_total(), modified=now())
+
+    def drifted_totals(self):
+        """Invoices whose stored total_before_discount differs from their lines."""
+        return self.with_lines_total().exclude(total_before_discount=F("lines_total"))
+
+
 class Invoice(TimeStampedModel):
     """
     Represents an invoice in the sales system.
@@ -21,6 +82,8 @@ class Invoice(TimeStampedModel):
         payment_status (CharField): The payment status of the invoice ('paid' or 'refunded').
         discount (DecimalField): The discount percentage applied to the invoice (0-100%).
         total_before_discount (DecimalField): The total amount before applying the discount.
+        refunded_at (DateTimeField): When the invoice became fully refunded (see sales.refunds).
+        idempotency_key (CharField): Client-generated key of an invoice synced from a terminal.
     """
     PAYMENT_STATUS = [
         ('paid', 'Paid'),
@@ -42,33 +105,74 @@ class Invoice(TimeStampedModel):
         validators=[MinValueValidator(0)],
         default=0
     )
+    refunded_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False
+    )
+    idempotency_key = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False
+    )
 
     class Meta:
         """Metadata for the Invoice model."""
         verbose_name = "Invoice"
         verbose_name_plural = "Invoices"
         ordering = ['-created']
+        indexes = [
+            # keyset pagination of paid invoices on (-created, -id)
+            models.Index(fields=["payment_status", "created", "id"], name="invoice_status_created_idx"),
+        ]
+
+    objects = InvoiceQuerySet.as_manager()
 
     @property
     def total_after_discount(self):
-        """Calculate the total after applying the discount."""
+        """
+        Calculate the total after applying the discount.
+
+        Uses the annotation from InvoiceQuerySet.with_totals() when present.
+        """
+        if "discounted_total" in self.__dict__:
+            return self.discounted_total
         subtotal = self.total_before_discount
         amount = Decimal(subtotal)
         discounted = amount * (1 - (self.discount / Decimal('100')))
         return discounted.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
     def save(self, *args, **kwargs):
-        """Recalculate totals and handle stock updates before saving."""
-        if self.pk and hasattr(self, "sales_items") and self.payment_status == 'paid':
-            self.total_before_discount = sum(
-                item.total for item in self.sales_items.all()
-            ).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-        if self.payment_status == "refunded":
-            for item in self.sales_items.all():
-                item.batch.stock_units += item.quantity
-                item.batch.save()
-        super().save(*args, **kwargs)
+        """
+        Save the invoice as is.
+
+        total_before_discount is maintained as lines change (see
+        sales.checkout and refresh_total), not re-summed on every save.
+        Stock is restored by sales.refunds.refund_invoice, never by saving
+        an invoice. A new invoice is counted in the daily sales rollup.
+        """
+        # the annotated total no longer matches once the invoice changes
+        self.__dict__.pop("discounted_total", None)
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                rollups.record_invoice(self)
+
+    def refresh_total(self):
+        """
+        Recompute total_before_discount of a paid invoice from its lines.
+
+        The sum is taken by the database in the UPDATE itself, so the cost
+        doesn't depend on the number of lines.
+        """
+        if self.payment_status != "paid":
+            return
+        Invoice.objects.filter(pk=self.pk).recompute_totals()
+        self.refresh_from_db(fields=["total_before_discount", "modified"])
+        self.__dict__.pop("discounted_total", None)
 
     def __str__(self):
         """String representation of the Invoice."""
@@ -83,6 +187,9 @@ class SaleItem(models.Model):
         invoice (ForeignKey): The invoice this sale item belongs to.
         batch (ForeignKey): The batch of medicine being sold.
         quantity (PositiveIntegerField): The quantity of the item sold.
+        unit_price (DecimalField): Price of one unit when the item was sold.
+        line_total (DecimalField): Price of the whole line when the item was sold.
+        refunded_quantity (PositiveIntegerField): Units returned so far.
     """
     invoice = models.ForeignKey(
         Invoice,
@@ -95,6 +202,22 @@ class SaleItem(models.Model):
         related_name="sale_items"
     )
     quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        default=0,
+        editable=False
+    )
+    line_total = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False
+    )
+    refunded_quantity = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
 
     class Meta:
         """Metadata for the SaleItem model."""
@@ -103,19 +226,47 @@ class SaleItem(models.Model):
 
     @property
     def total(self):
-        """Calculate the total cost of the sale item."""
-        pack_price = self.batch.medicine.price
-        units_per_pack = self.batch.medicine.units_per_pack
-        total = (pack_price / units_per_pack) * self.quantity
-        return Decimal(total.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+        """The total cost of the sale item, as priced when it was sold."""
+        return self.line_total
+
+    @property
+    def refundable_quantity(self):
+        """Units that can still be returned."""
+        return self.quantity - self.refunded_quantity
+
+    def set_price(self):
+        """Copy the current price of the batch's medicine onto the item."""
+        medicine = self.batch.medicine
+        unit_price = Decimal(medicine.price) / medicine.units_per_pack
+        self.unit_price = unit_price.quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
+        self.line_total = (unit_price * self.quantity).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
 
     def __str__(self):
         """String representation of the SaleItem."""
         return f"{self.quantity}x {self.batch.medicine.name} ({self.total})"
 
     def save(self, *args, **kwargs):
-        """Update stock and parent invoice totals when saving."""
-        super().save(*args, **kwargs)
-        self.batch.stock_units -= self.quantity
-        self.batch.save()
-        self.invoice.save()
\ No newline at end of file
+        """
+        Update stock, the parent invoice's total and the sales rollups when saving.
+
+        A new item takes its quantity from the batch with a conditional
+        UPDATE (see medicine.stock), raising InsufficientStock and rolling
+        the item back when the batch no longer holds enough units.
+        """
+        adding = self._state.adding
+        if adding:
+            self.set_price()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                stock.decrement(self.batch, self.quantity, StockMovement.SALE, source=self.invoice)
+                rollups.record_sale(self.invoice, [self])
+            self.invoice.refresh_total()
+
+    def delete(self, *args, **kwargs):
+        """Delete the item and take its line off the parent invoice's total and the sales rollups."""
+        with transaction.atomic():
+            rollups.retract_sale(self.invoice, [self])
+            result = super().delete(*args, **kwargs)
+            self.invoice.refresh_total()
+        return result
\ No newline at end of file
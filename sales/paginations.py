@@ -0,0 +1,12 @@
+"""
+Pagination:
+    - InvoiceCursorPagination: Keyset pagination for invoices, newest first
+"""
+
+from medicine.paginations import KeysetPagination
+
+
+class InvoiceCursorPagination(KeysetPagination):
+    """Keyset pagination for invoice listings, ordered by (-created, -id)."""
+    ordering = ("-created", "-id")
+    page_size = 20
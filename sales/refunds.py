@@ -0,0 +1,86 @@
+"""
+Invoice Refunds
+
+Returns sold units to stock, for a whole invoice or for some of its lines.
+
+A refund locks the invoice row, so concurrent refunds of one invoice run one
+after the other. Each sale item tracks how many of its units were returned
+(`refunded_quantity`), which makes refunds idempotent: refunding an invoice
+twice, or returning more units than are left on a line, restores nothing
+more. Stock of all refunded batches is restored with one grouped UPDATE
+(see medicine.stock.increment_many), and the item counters are written
+with one bulk update. The returned units are added to today's sales
+rollups (see reports.rollups).
+
+The invoice moves to 'refunded' once, when its last unit is returned.
+
+Classes:
+    - RefundError: Raised for refund lines that don't match the invoice
+
+Functions:
+    - refund_invoice: Return units of an invoice to stock
+"""
+
+from django.db import transaction
+from django.utils.timezone import now
+
+from medicine import stock
+from medicine.models import StockMovement
+from reports import rollups
+from sales.models import Invoice, SaleItem
+
+
+class RefundError(Exception):
+    """Raised when a refund names an unknown line or more units than it has left."""
+
+
+def refund_invoice(invoice_id, lines=None):
+    """
+    Return units of an invoice to stock.
+
+    Args:
+        invoice_id (int): Invoice to refund
+        lines (dict | None): Sale item id -> units to return; None returns
+            everything not returned yet
+
+    Returns:
+        Invoice: The locked and updated invoice
+
+    Raises:
+        Invoice.DoesNotExist: When there is no such invoice
+        RefundError: When a line isn't on the invoice or has fewer units left
+    """
+    with transaction.atomic():
+        invoice = Invoice.objects.select_for_update().get(pk=invoice_id)
+        items = {item.pk: item for item in invoice.sales_items.select_related("batch__medicine")}
+
+        if lines is None:
+            lines = {pk: item.refundable_quantity for pk, item in items.items()}
+        for pk, quantity in lines.items():
+            if pk not in items:
+                raise RefundError(f"Sale item {pk} is not on invoice #{invoice.pk}.")
+            if quantity > items[pk].refundable_quantity:
+                raise RefundError(
+                    f"Only {items[pk].refundable_quantity} units of sale item {pk} can be refunded."
+                )
+
+        returned = [(items[pk], quantity) for pk, quantity in lines.items() if quantity > 0]
+        if returned:
+            stock.increment_many(
+                [(item.batch, quantity) for item, quantity in returned],
+                StockMovement.REFUND,
+                source=invoice,
+            )
+            for item, quantity in returned:
+                item.refunded_quantity += quantity
+            SaleItem.objects.bulk_update([item for item, _ in returned], ["refunded_quantity"])
+            rollups.record_refund(invoice, returned)
+
+        if invoice.refunded_at is None and not any(item.refundable_quantity for item in items.values()):
+            invoice.payment_status = "refunded"
+            invoice.refunded_at = now()
+            Invoice.objects.filter(pk=invoice.pk).update(
+                payment_status=invoice.payment_status,
+                refunded_at=invoice.refunded_at,
+            )
+    return invoice
@@ -5,9 +5,17 @@ This module defines serializers for creating, updating, and validating invoices
 and their associated sale items, as well as handling invoice returns.
 """
 
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
-from sales.models import Invoice, SaleItem
-from medicine.models import Batch
+from sales.models import Invoice, InvoiceQuerySet, SaleItem
+from medicine.models import Medicine
+from medicine.barcodes import resolve_barcode, resolve_barcodes
+from medicine.allocation import allocate
+from medicine.stock import InsufficientStock
+from sales.checkout import checkout, revise
+from sales.refunds import RefundError, refund_invoice
+from reports import rollups
 from decimal import Decimal
 
 
@@ -17,9 +25,19 @@ class SaleItemSerializer(serializers.ModelSerializer):
 
     Handles the serialization and validation of sale items, including barcode-based
     batch lookup and stock/expiry checks.
+
+    A line either names an exact batch (batch barcode) or a medicine (its
+    international barcode, or `medicine_id`). Medicine lines are drawn from
+    the medicine's batches first expiry first out (see medicine.allocation)
+    and may be split into several sale items.
     """
     barcode = serializers.CharField(
-        write_only=True
+        write_only=True,
+        required=False
+    )
+    medicine_id = serializers.IntegerField(
+        write_only=True,
+        required=False
     )
     medicine = serializers.ReadOnlyField(source="batch.medicine.name")
 
@@ -28,21 +46,52 @@ class SaleItemSerializer(serializers.ModelSerializer):
         model = SaleItem
         fields = [
             "barcode",
+            "medicine_id",
             "quantity",
             "batch",
-            "medicine"
+            "medicine",
+            "unit_price",
+            "line_total"
         ]
-        read_only_fields = ["batch", "medicine"]
+        read_only_fields = ["batch", "medicine", "unit_price", "line_total"]
+
+    def resolve(self, barcode):
+        """Barcode match preloaded by the parent serializer, or a cached lookup."""
+        matches = self.context.get("barcode_matches")
+        if matches is not None and barcode in matches:
+            return matches[barcode]
+        return resolve_barcode(barcode)
+
+    def returned_units(self, kind, pk):
+        """
+        Units the edited invoice's current items give back to a batch or medicine.
+
+        They are available again to the invoice's new lines (see
+        InvoiceCreationSerializer.to_internal_value); 0 for new invoices.
+        """
+        return self.context.get("returned_units", {}).get((kind, pk), 0)
 
     def validate(self, data):
-        """Validate barcode, batch availability, and quantity."""
+        """
+        Validate barcode, batch availability, and quantity.
+
+        The batch is resolved through the cached barcode service, which also
+        attaches its medicine so pricing needs no further queries.
+        """
         barcode = data.get("barcode")
-        batch = Batch.objects.filter(barcode=barcode).first()
+        if not barcode:
+            return self.validate_medicine_line(data)
+        match = self.resolve(barcode)
+        if match and match.kind == "medicine":
+            data["medicine_id"] = match.medicine.id
+            return self.validate_medicine_line(data, available=match.stock_units)
+        batch = match.batch if match else None
         if not batch:
             raise serializers.ValidationError(
                 "This is not a valid batch barcode"
             )
-        if not batch.has_amount:
+        available = batch.stock_units + self.returned_units("batch", batch.pk)
+        if not available:
             raise serializers.ValidationError(
                 "This batch stock is zero"
             )
@@ -51,17 +100,59 @@ class SaleItemSerializer(serializers.ModelSerializer):
                 "This batch is expired"
             )
         quantity = data.get("quantity")
-        if quantity > batch.stock_units:
+        if quantity > available:
             raise serializers.ValidationError(
-                f"This quantity you try to sell exceeds amount in our stocks, We only have {batch.stock_units}"
+                f"This quantity you try to sell exceeds amount in our stocks, We only have {available}"
             )
         data["batch"] = batch
         return super().validate(data)
 
+    def validate_medicine_line(self, data, available=None):
+        """Validate a line sold by medicine against its sellable stock."""
+        medicine_id = data.get("medicine_id")
+        if medicine_id is None:
+            raise serializers.ValidationError(
+                "Either a barcode or a medicine_id is required"
+            )
+        if available is None:
+            available = self.context.get("sellable_units", {}).get(medicine_id)
+        if available is None:
+            available = Medicine.objects.filter(pk=medicine_id)\
+                .values_list("sellable_units", flat=True).first()
+            if available is None:
+                raise serializers.ValidationError("This is not a valid medicine")
+        available += self.returned_units("medicine", medicine_id)
+        if data.get("quantity") > available:
+            raise serializers.ValidationError(
+                f"This quantity you try to sell exceeds amount in our stocks, We only have {available}"
+            )
+        return super().validate(data)
+
     def create(self, validated_data):
-        """Create a new sale item, removing barcode from validated data."""
-        validated_data.pop("barcode")
-        return super().create(validated_data)
+        """
+        Create a new sale item, removing barcode from validated data.
+
+        Medicine lines are allocated across batches in FEFO order, creating one
+        sale item per batch drawn from; the first of them is returned.
+        """
+        validated_data.pop("barcode", None)
+        medicine_id = validated_data.pop("medicine_id", None)
+        try:
+            if validated_data.get("batch") is not None:
+                return super().create(validated_data)
+
+            with transaction.atomic():
+                items = [
+                    super(SaleItemSerializer, self).create(
+                        {**validated_data, "batch": allocation.batch, "quantity": allocation.quantity}
+                    )
+                    for allocation in allocate(medicine_id, validated_data["quantity"])
+                ]
+            return items[0]
+        except InsufficientStock as error:
+            raise serializers.ValidationError(
+                f"This quantity you try to sell exceeds amount in our stocks, We only have {error.available}"
+            )
 
     def update(self, instance, validated_data):
         """Prevent updating sale items."""
@@ -74,6 +165,10 @@ class InvoiceCreationSerializer(serializers.ModelSerializer):
 
     Handles the creation and updating of invoices, including their associated
     sale items.
+
+    All item barcodes are resolved with one lookup before the items are
+    validated, and items are written through sales.checkout, so the number
+    of queries doesn't depend on the number of items.
     """
     items = SaleItemSerializer(many=True, allow_empty=False, write_only=True)
     sale_items = SaleItemSerializer(many=True, source="sales_items", read_only=True)
@@ -94,48 +189,153 @@ class InvoiceCreationSerializer(serializers.ModelSerializer):
             "total_after_discount",
         ]
 
+    def to_internal_value(self, data):
+        """
+        Preload barcode matches and medicine stock for all items before validating them.
+
+        When items of an existing invoice are replaced, the units its current
+        items give back count as available to the new lines, per batch and
+        per medicine (units of expired batches don't count for medicines).
+        """
+        items = data.get("items") if hasattr(data, "get") else None
+        if isinstance(items, list):
+            if self.instance is not None:
+                self.context["returned_units"] = returned = {}
+                for item in self.instance.sales_items.select_related("batch"):
+                    keys = [("batch", item.batch_id)]
+                    if not item.batch.is_expired:
+                        keys.append(("medicine", item.batch.medicine_id))
+                    for key in keys:
+                        returned[key] = returned.get(key, 0) + item.refundable_quantity
+            items = [item for item in items if isinstance(item, dict)]
+            self.context["barcode_matches"] = resolve_barcodes(
+                item["barcode"] for item in items if isinstance(item.get("barcode"), str)
+            )
+            medicine_ids = {
+                item["medicine_id"] for item in items
+                if isinstance(item.get("medicine_id"), int) and not item.get("barcode")
+            }
+            if medicine_ids:
+                self.context["sellable_units"] = dict(
+                    Medicine.objects.filter(pk__in=medicine_ids).values_list("id", "sellable_units")
+                )
+        return super().to_internal_value(data)
+
+    def validate_items(self, items):
+        """
+        Check that lines repeating a batch or medicine don't exceed its stock together.
+
+        Items of an invoice with returned units can't be replaced.
+        """
+        if self.instance is not None and self.instance.sales_items.filter(refunded_quantity__gt=0).exists():
+            raise serializers.ValidationError(
+                "Items of an invoice with returned units can't be replaced."
+            )
+        batches = {}
+        medicines = {}
+        for item in items:
+            batch = item.get("batch")
+            if batch is not None:
+                batches[batch.pk] = (batch, batches.get(batch.pk, (batch, 0))[1] + item["quantity"])
+            else:
+                medicines[item["medicine_id"]] = medicines.get(item["medicine_id"], 0) + item["quantity"]
+        returned = self.context.get("returned_units", {})
+        for batch, quantity in batches.values():
+            available = batch.stock_units + returned.get(("batch", batch.pk), 0)
+            if quantity > available:
+                raise serializers.ValidationError(
+                    f"This quantity you try to sell exceeds amount in our stocks, We only have {available}"
+                )
+        matches = {
+            match.medicine.id: match.stock_units
+            for match in self.context.get("barcode_matches", {}).values() if match.kind == "medicine"
+        }
+        sellable = {**self.context.get("sellable_units", {}), **matches}
+        for medicine_id, quantity in medicines.items():
+            if medicine_id not in sellable:
+                continue
+            available = sellable[medicine_id] + returned.get(("medicine", medicine_id), 0)
+            if quantity > available:
+                raise serializers.ValidationError(
+                    f"This quantity you try to sell exceeds amount in our stocks, We only have {available}"
+                )
+        return items
+
+    def sell(self, invoice, items_data, replace=False, discount=None):
+        """Write the sale items through the checkout pipeline, or replace the invoice's items."""
+        try:
+            if replace:
+                return revise(invoice, items_data, discount)
+            return checkout(invoice, items_data)
+        except InsufficientStock as error:
+            raise serializers.ValidationError(
+                f"This quantity you try to sell exceeds amount in our stocks, We only have {error.available}"
+            )
+
+    @transaction.atomic
     def create(self, validated_data):
-        """Create a new invoice with associated sale items."""
+        """Create a new invoice with associated sale items, all or nothing."""
         items_data = validated_data.pop("items")
-        discount = validated_data.pop("discount", 0)
-        payment_status = validated_data.pop("payment_status")
-        invoice = Invoice.objects.create(
-            discount=discount,
-            payment_status=payment_status
+        invoice = Invoice(
+            discount=validated_data.pop("discount", 0),
+            payment_status=validated_data.pop("payment_status"),
+            idempotency_key=validated_data.pop("idempotency_key", None),
         )
-        for item in items_data:
-            serializer = SaleItemSerializer(
-                data=item
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save(invoice=invoice)
+        self.sell(invoice, items_data)
+        # the response lists the items with their medicines, read with one query
+        prefetch_related_objects([invoice], InvoiceQuerySet.items_prefetch())
         return invoice
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Update an existing invoice, optionally replacing sale items."""
+        """
+        Update an existing invoice, optionally replacing sale items.
+
+        Setting the payment status to 'refunded' refunds the whole invoice
+        through sales.refunds. Replaced items go through sales.checkout.revise,
+        which returns their units to stock; replaced lines and discount
+        changes are carried into the sales rollups.
+        """
         discount = validated_data.get("discount", instance.discount)
         validated_data["discount"] = discount
         items_data = validated_data.pop("items", None)
         if items_data:
-            instance.sales_items.all().delete()
-            for item in items_data:
-                serializer = SaleItemSerializer(
-                    data=item
-                )
-                serializer.is_valid(raise_exception=True)
-                serializer.save(invoice=instance)
+            self.sell(instance, items_data, replace=True, discount=discount)
+        elif discount != instance.discount:
+            # the sales rollups drop the lines at the old discount and take them again
+            sold = list(instance.sales_items.select_related("batch__medicine"))
+            rollups.retract_sale(instance, sold)
+            instance.discount = discount
+            rollups.record_sale(instance, sold)
+        if validated_data.get("payment_status") == "refunded" and instance.payment_status != "refunded":
+            refunded = refund_invoice(instance.pk)
+            instance.payment_status = refunded.payment_status
+            instance.refunded_at = refunded.refunded_at
         return super().update(instance, validated_data)
 
 
+class ReturnItemSerializer(serializers.Serializer):
+    """One line of a partial return: a sale item and the units given back."""
+    item = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+
 class ReturnInvoiceSerializer(serializers.Serializer):
     """
     Serializer for handling invoice returns.
 
-    Validates the invoice ID and marks the invoice as refunded.
+    Validates the invoice ID and refunds it through sales.refunds: the whole
+    invoice, or only the given `items`.
     """
     invoice = serializers.CharField(
         write_only=True
     )
+    items = ReturnItemSerializer(
+        many=True,
+        required=False,
+        allow_empty=False,
+        write_only=True
+    )
 
     def validate_invoice(self, value):
         """Validate that the provided invoice ID exists."""
@@ -143,4 +343,44 @@ class ReturnInvoiceSerializer(serializers.Serializer):
             invoice = Invoice.objects.get(id=value)
             return invoice
         except Invoice.DoesNotExist:
-            raise serializers.ValidationError("This is not a valid invoice ID.")
\ No newline at end of file
+            raise serializers.ValidationError("This is not a valid invoice ID.")
+
+    def validate_items(self, items):
+        """Combine return lines into units per sale item."""
+        lines = {}
+        for line in items:
+            lines[line["item"]] = lines.get(line["item"], 0) + line["quantity"]
+        return lines
+
+    def create(self, validated_data):
+        """Refund the invoice, returning the updated invoice."""
+        try:
+            return refund_invoice(validated_data["invoice"].pk, validated_data.get("items"))
+        except RefundError as error:
+            raise serializers.ValidationError({"items": [str(error)]})
+
+
+class InvoiceSyncSerializer(serializers.Serializer):
+    """
+    Serializer for invoices replayed by a point-of-sale terminal.
+
+    Only checks the envelope: every invoice needs an idempotency key. The
+    invoices themselves are validated by sales.sync, and only when their
+    key hasn't been committed yet.
+    """
+    max_invoices = 500
+    invoices = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=max_invoices
+    )
+
+    def validate_invoices(self, invoices):
+        """Require a non-empty idempotency key of at most 64 characters on every invoice."""
+        for index, invoice in enumerate(invoices):
+            key = invoice.get("idempotency_key")
+            if not isinstance(key, str) or not key or len(key) > 64:
+                raise serializers.ValidationError(
+                    f"Invoice {index} needs an idempotency_key of 1 to 64 characters."
+                )
+        return invoices
@@ -0,0 +1,134 @@
+"""
+Point-of-Sale Invoice Sync
+
+Accepts invoices recorded by branch terminals while offline and replayed in
+bulk. Every invoice carries a client-generated idempotency key, stored in a
+unique column of Invoice, so a replayed invoice is never created twice.
+
+Keys already committed are found with one query up front and reported as
+duplicates without validating their payload again, which keeps replays
+cheap. The remaining invoices are validated and written in chunks, one
+transaction per chunk; each invoice runs in its own savepoint so an invalid
+invoice doesn't roll back the rest of its chunk. A key committed
+concurrently by another request is caught by the unique index and also
+reported as a duplicate.
+
+Classes:
+    - SyncResult: Outcome of one synced invoice
+
+Functions:
+    - sync_invoices: Create the invoices of a sync payload that don't exist yet
+    - sync_invoice: Validate and create one invoice in a savepoint
+"""
+
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+
+from medicine.barcodes import resolve_barcodes
+from sales.models import Invoice
+from sales.serializers import InvoiceCreationSerializer
+
+
+class SyncResult:
+    """
+    Outcome of one synced invoice.
+
+    Attributes:
+        idempotency_key (str): The client's key for the invoice
+        status (str): 'created', 'duplicate' or 'invalid'
+        invoice_id (int | None): The stored invoice, for created and duplicate invoices
+        errors (dict | None): Validation errors of an invalid invoice
+    """
+    CREATED = "created"
+    DUPLICATE = "duplicate"
+    INVALID = "invalid"
+
+    def __init__(self, idempotency_key, status, invoice_id=None, errors=None):
+        self.idempotency_key = idempotency_key
+        self.status = status
+        self.invoice_id = invoice_id
+        self.errors = errors
+
+    def as_dict(self):
+        result = {
+            "idempotency_key": self.idempotency_key,
+            "status": self.status,
+            "invoice": self.invoice_id,
+        }
+        if self.errors is not None:
+            result["errors"] = self.errors
+        return result
+
+
+def sync_invoices(payloads, chunk_size=50, context=None):
+    """
+    Create the invoices of a sync payload that don't exist yet.
+
+    Args:
+        payloads (list[dict]): Invoice payloads, each with an `idempotency_key`
+            and the fields accepted by InvoiceCreationSerializer
+        chunk_size (int): Invoices written per transaction
+        context (dict | None): Serializer context, e.g. the request
+
+    Returns:
+        list[SyncResult]: One result per payload, in payload order
+    """
+    keys = [payload["idempotency_key"] for payload in payloads]
+    committed = dict(
+        Invoice.objects.filter(idempotency_key__in=keys).values_list("idempotency_key", "id")
+    )
+
+    results = {}
+    first = {}
+    pending = []
+    for index, payload in enumerate(payloads):
+        key = payload["idempotency_key"]
+        if key in committed:
+            results[index] = SyncResult(key, SyncResult.DUPLICATE, committed[key])
+        elif key not in first:
+            first[key] = index
+            pending.append((index, payload))
+
+    pending = iter(pending)
+    while True:
+        chunk = list(islice(pending, chunk_size))
+        if not chunk:
+            break
+        # warm the barcode cache for the whole chunk with one lookup
+        resolve_barcodes(
+            item["barcode"] for _, payload in chunk for item in payload.get("items") or []
+            if isinstance(item, dict) and isinstance(item.get("barcode"), str)
+        )
+        with transaction.atomic():
+            for index, payload in chunk:
+                results[index] = sync_invoice(payload, context)
+
+    for index, payload in enumerate(payloads):
+        if index not in results:
+            # a key repeated within the payload shares the outcome of its first copy
+            original = results[first[payload["idempotency_key"]]]
+            status = SyncResult.DUPLICATE if original.status == SyncResult.CREATED else original.status
+            results[index] = SyncResult(original.idempotency_key, status, original.invoice_id, original.errors)
+    return [results[index] for index in range(len(payloads))]
+
+
+def sync_invoice(payload, context=None):
+    """Validate and create one invoice in a savepoint, returning its SyncResult."""
+    key = payload["idempotency_key"]
+    data = {name: value for name, value in payload.items() if name != "idempotency_key"}
+    serializer = InvoiceCreationSerializer(data=data, context=dict(context or {}))
+    if not serializer.is_valid():
+        return SyncResult(key, SyncResult.INVALID, errors=serializer.errors)
+    try:
+        with transaction.atomic():
+            invoice = serializer.save(idempotency_key=key)
+    except IntegrityError:
+        invoice_id = Invoice.objects.filter(idempotency_key=key).values_list("id", flat=True).first()
+        if invoice_id is None:
+            raise
+        return SyncResult(key, SyncResult.DUPLICATE, invoice_id)
+    except ValidationError as error:
+        return SyncResult(key, SyncResult.INVALID, errors=error.detail)
+    return SyncResult(key, SyncResult.CREATED, invoice.pk)
@@ -1,4 +1,8 @@
 import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from decimal import Decimal
 from sales.models import Invoice, SaleItem
 from medicine.models import Batch, Medicine
@@ -93,3 +97,62 @@ class TestSaleItemModel:
 
         # Should equal 1 pack → 1 x 30.00
         assert sale_item.total == Decimal("30.00")
+
+    def test_price_is_stored_at_sale_time(self):
+        medicine = MedicineFactory(price=Decimal("20.00"), units_per_pack=3)
+        batch = BatchFactory(medicine=medicine, stock_units=10)
+        invoice = InvoiceFactory(payment_status='paid')
+        sale_item = SaleItemFactory(invoice=invoice, batch=batch, quantity=3)
+        assert sale_item.unit_price == Decimal("6.6667")
+        assert sale_item.line_total == Decimal("20.00")
+
+        medicine.price = Decimal("50.00")
+        medicine.save()
+        sale_item = SaleItem.objects.get(pk=sale_item.pk)
+        assert sale_item.total == Decimal("20.00")
+        invoice.save()
+        assert invoice.total_before_discount == Decimal("20.00")
+
+    def test_delete_takes_line_off_invoice_total(self):
+        invoice = InvoiceFactory(payment_status='paid')
+        medicine = MedicineFactory(units_per_pack=1, price=Decimal("4.00"))
+        kept = SaleItemFactory(invoice=invoice, batch=BatchFactory(medicine=medicine, stock_units=10), quantity=1)
+        removed = SaleItemFactory(invoice=invoice, batch=kept.batch, quantity=2)
+        assert invoice.total_before_discount == Decimal("12.00")
+
+        removed.delete()
+        assert invoice.total_before_discount == Decimal("4.00")
+        assert Invoice.objects.get(pk=invoice.pk).total_before_discount == Decimal("4.00")
+
+
+class TestInvoiceTotals:
+    def test_adding_a_line_costs_the_same_for_any_invoice_size(self):
+        medicine = MedicineFactory(units_per_pack=1, price=Decimal("1.00"))
+        batch = BatchFactory(medicine=medicine, stock_units=100)
+
+        def add_line(invoice):
+            with CaptureQueriesContext(connection) as queries:
+                SaleItem.objects.create(invoice=invoice, batch=batch, quantity=1)
+            return len(queries)
+
+        small = InvoiceFactory(payment_status='paid')
+        large = InvoiceFactory(payment_status='paid')
+        for _ in range(20):
+            SaleItem.objects.create(invoice=large, batch=batch, quantity=1)
+        assert add_line(small) == add_line(large)
+        assert large.total_before_discount == Decimal("21.00")
+
+    def test_check_invoice_totals(self, capsys):
+        invoice = InvoiceFactory(payment_status='paid')
+        medicine = MedicineFactory(units_per_pack=1, price=Decimal("5.00"))
+        SaleItemFactory(invoice=invoice, batch=BatchFactory(medicine=medicine, stock_units=10), quantity=2)
+        call_command("check_invoice_totals")
+
+        Invoice.objects.filter(pk=invoice.pk).update(total_before_discount=Decimal("1.00"))
+        with pytest.raises(CommandError):
+            call_command("check_invoice_totals")
+        assert f"Invoice #{invoice.pk}: stored 1.00, lines 10.00" in capsys.readouterr().out
+
+        call_command("check_invoice_totals", fix=True)
+        assert Invoice.objects.get(pk=invoice.pk).total_before_discount == Decimal("10.00")
+        call_command("check_invoice_totals")
@@ -0,0 +1,96 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from medicine.models import Batch, StockMovement
+from medicine.tests.factories import BatchFactory
+from sales.models import Invoice, SaleItem
+from sales.refunds import RefundError, refund_invoice
+from sales.tests.factories import InvoiceFactory, SaleItemFactory
+from users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def sold_invoice(count, quantity=3):
+    invoice = InvoiceFactory(payment_status="paid")
+    for _ in range(count):
+        batch = BatchFactory(stock_units=10, expiry_date=timezone.now().date() + timezone.timedelta(days=60))
+        SaleItemFactory(invoice=invoice, batch=batch, quantity=quantity)
+    return invoice
+
+
+def stock_units(invoice):
+    return sorted(Batch.objects.filter(sale_items__invoice=invoice).values_list("stock_units", flat=True))
+
+
+class TestRefundInvoice:
+    def test_full_refund_restores_stock_once(self):
+        invoice = sold_invoice(2)
+        assert stock_units(invoice) == [7, 7]
+
+        refunded = refund_invoice(invoice.pk)
+        assert refunded.payment_status == "refunded"
+        assert refunded.refunded_at is not None
+        assert stock_units(invoice) == [10, 10]
+
+        refund_invoice(invoice.pk)
+        invoice.refresh_from_db()
+        invoice.save()
+        assert stock_units(invoice) == [10, 10]
+        assert StockMovement.objects.filter(reason=StockMovement.REFUND).count() == 2
+
+    def test_partial_refund(self):
+        invoice = sold_invoice(2)
+        first, second = invoice.sales_items.order_by("pk")
+
+        refund_invoice(invoice.pk, {first.pk: 2})
+        invoice.refresh_from_db()
+        assert invoice.payment_status == "paid"
+        assert Batch.objects.get(pk=first.batch_id).stock_units == 9
+        assert SaleItem.objects.get(pk=first.pk).refunded_quantity == 2
+
+        with pytest.raises(RefundError):
+            refund_invoice(invoice.pk, {first.pk: 2})
+
+        refund_invoice(invoice.pk)
+        invoice.refresh_from_db()
+        assert invoice.payment_status == "refunded"
+        assert stock_units(invoice) == [10, 10]
+
+    def test_unknown_item_is_rejected(self):
+        invoice = sold_invoice(1)
+        other = SaleItemFactory(batch=BatchFactory(stock_units=10), quantity=1)
+        with pytest.raises(RefundError):
+            refund_invoice(invoice.pk, {other.pk: 1})
+
+    def test_query_count_does_not_grow_with_items(self):
+        def refund(count):
+            invoice = sold_invoice(count)
+            with CaptureQueriesContext(connection) as queries:
+                refund_invoice(invoice.pk)
+            return len(queries)
+
+        assert refund(2) == refund(6)
+
+
+class TestReturnInvoiceAPI:
+    def test_partial_return(self):
+        client = APIClient()
+        client.force_authenticate(user=UserFactory(role="cashier"))
+        invoice = sold_invoice(1, quantity=5)
+        item = invoice.sales_items.get()
+
+        url = reverse("invoice-return")
+        data = {"invoice": invoice.pk, "items": [{"item": item.pk, "quantity": 2}]}
+        response = client.post(url, data, format="json")
+        assert response.status_code == 200
+        assert Batch.objects.get(pk=item.batch_id).stock_units == 7
+
+        data = {"invoice": invoice.pk, "items": [{"item": item.pk, "quantity": 4}]}
+        response = client.post(url, data, format="json")
+        assert response.status_code == 400
+        assert "Only 3 units" in str(response.data)
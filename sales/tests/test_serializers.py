@@ -1,11 +1,14 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from decimal import Decimal
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 from sales.models import Invoice, SaleItem
-from medicine.models import Batch
+from medicine.models import Batch, Medicine, StockMovement
 from medicine.tests.factories import BatchFactory, MedicineFactory
 from sales.tests.factories import SaleItemFactory, InvoiceFactory
+from sales.refunds import refund_invoice
 from sales.serializers import SaleItemSerializer, InvoiceCreationSerializer, ReturnInvoiceSerializer
 
 
@@ -118,6 +121,75 @@ class TestInvoiceCreationSerializer:
         assert batch1.stock_units == 6  # 9 - 3 = 6
         assert batch2.stock_units == 4  # 6 - 2 = 4
 
+    def test_invoice_sold_by_medicine_uses_fefo(self):
+        """Lines given by international barcode or medicine id draw earliest expiry first"""
+        today = timezone.now().date()
+        med = MedicineFactory(price=Decimal('10.00'), units_per_pack=1)
+        late = BatchFactory(medicine=med, stock_units=10, expiry_date=today + timezone.timedelta(days=90))
+        early = BatchFactory(medicine=med, stock_units=4, expiry_date=today + timezone.timedelta(days=30))
+        data = {
+            "items": [
+                {"barcode": med.international_barcode, "quantity": 6},
+                {"medicine_id": med.id, "quantity": 1},
+            ],
+            "payment_status": "paid",
+            "discount": Decimal('0.00'),
+        }
+        serializer = InvoiceCreationSerializer(data=data)
+        assert serializer.is_valid(), serializer.errors
+        invoice = serializer.save()
+        assert sorted(invoice.sales_items.values_list("batch_id", "quantity")) == sorted(
+            [(early.id, 4), (late.id, 2), (late.id, 1)]
+        )
+        assert invoice.total_before_discount == Decimal('70.00')
+        late.refresh_from_db()
+        early.refresh_from_db()
+        assert (early.stock_units, late.stock_units) == (0, 7)
+
+    def test_medicine_line_exceeding_stock(self):
+        """Medicine lines are checked against sellable stock"""
+        med = MedicineFactory()
+        BatchFactory(medicine=med, stock_units=2, expiry_date=timezone.now().date() + timezone.timedelta(days=30))
+        serializer = SaleItemSerializer(data={"medicine_id": med.id, "quantity": 3})
+        assert not serializer.is_valid()
+        assert "We only have 2" in str(serializer.errors)
+        serializer = SaleItemSerializer(data={"quantity": 3})
+        assert not serializer.is_valid()
+
+    def test_query_count_does_not_grow_with_items(self):
+        """Barcodes are resolved together and items, stock and totals written in bulk"""
+        def create(count):
+            batches = [BatchFactory(stock_units=5) for _ in range(count)]
+            data = {
+                "items": [{"barcode": batch.barcode, "quantity": 2} for batch in batches],
+                "payment_status": "paid",
+                "discount": Decimal('0.00'),
+            }
+            with CaptureQueriesContext(connection) as queries:
+                serializer = InvoiceCreationSerializer(data=data)
+                assert serializer.is_valid(), serializer.errors
+                invoice = serializer.save()
+                assert len(serializer.data["sale_items"]) == count
+            return invoice, len(queries)
+
+        _, few = create(2)
+        invoice, many = create(12)
+        assert few == many
+        assert invoice.total_before_discount == sum(item.total for item in invoice.sales_items.all())
+        assert set(Batch.objects.filter(sale_items__invoice=invoice).values_list("stock_units", flat=True)) == {3}
+
+    def test_repeated_batch_lines_checked_together(self):
+        """Lines naming the same batch may not exceed its stock together"""
+        batch = BatchFactory(stock_units=5)
+        data = {
+            "items": [{"barcode": batch.barcode, "quantity": 3}, {"barcode": batch.barcode, "quantity": 3}],
+            "payment_status": "paid",
+            "discount": Decimal('0.00'),
+        }
+        serializer = InvoiceCreationSerializer(data=data)
+        assert not serializer.is_valid()
+        assert "We only have 5" in str(serializer.errors)
+
     def test_invoice_with_no_items(self):
         """Test invoice with no items should fail"""
         data = {
@@ -174,6 +246,91 @@ class TestInvoiceCreationSerializer:
         
         assert updated_invoice.total_before_discount == expected_total_before_discount
         assert updated_invoice.total_after_discount == expected_total_after_discount
+        # the replaced unit is back in stock
+        assert Batch.objects.get(pk=batch1.pk).stock_units == 10
+        assert Batch.objects.get(pk=batch2.pk).stock_units == 3
+        assert Medicine.objects.get(pk=med1.pk).sellable_units == 10
+
+    def test_invoice_update_moves_only_the_difference(self):
+        """A batch kept on the invoice only moves the change in quantity"""
+        invoice = InvoiceFactory(discount=Decimal('0.00'))
+        batch = BatchFactory(stock_units=10)
+        SaleItemFactory(invoice=invoice, batch=batch, quantity=4)
+
+        def edit(quantity):
+            serializer = InvoiceCreationSerializer(
+                invoice, data={"items": [{"barcode": batch.barcode, "quantity": quantity}]}, partial=True
+            )
+            assert serializer.is_valid(), serializer.errors
+            serializer.save()
+
+        edit(6)
+        assert Batch.objects.get(pk=batch.pk).stock_units == 4
+        assert list(invoice.sales_items.values_list("quantity", flat=True)) == [6]
+        edit(1)
+        assert Batch.objects.get(pk=batch.pk).stock_units == 9
+
+        # units given back are adjustments, not sales
+        movements = StockMovement.objects.filter(batch=batch).order_by("pk").values_list("reason", "delta")
+        assert list(movements)[1:] == [
+            (StockMovement.SALE, -4), (StockMovement.SALE, -2), (StockMovement.ADJUSTMENT, 5),
+        ]
+
+    def test_invoice_update_sold_out_batch(self, django_capture_on_commit_callbacks):
+        """The units an invoice gives back are available to its new lines"""
+        invoice = InvoiceFactory(discount=Decimal('0.00'))
+        batch = BatchFactory(stock_units=5, expiry_date=timezone.now().date() + timezone.timedelta(days=30))
+        SaleItemFactory(invoice=invoice, batch=batch, quantity=5)
+
+        serializer = InvoiceCreationSerializer(
+            invoice, data={"items": [{"barcode": batch.barcode, "quantity": 4}]}, partial=True
+        )
+        assert serializer.is_valid(), serializer.errors
+        with django_capture_on_commit_callbacks(execute=True):
+            serializer.save()
+        assert Batch.objects.get(pk=batch.pk).stock_units == 1
+
+        serializer = InvoiceCreationSerializer(
+            invoice, data={"items": [{"barcode": batch.barcode, "quantity": 6}]}, partial=True
+        )
+        assert not serializer.is_valid()
+        assert "We only have 5" in str(serializer.errors)
+
+    def test_invoice_update_sold_out_medicine(self):
+        """Lines sold by medicine are allocated from the returned units"""
+        expiry = timezone.now().date() + timezone.timedelta(days=30)
+        med = MedicineFactory()
+        first = BatchFactory(medicine=med, stock_units=3, expiry_date=expiry)
+        second = BatchFactory(medicine=med, stock_units=2, expiry_date=expiry + timezone.timedelta(days=30))
+        invoice = InvoiceCreationSerializer(data={
+            "items": [{"medicine_id": med.id, "quantity": 5}], "payment_status": "paid", "discount": "0.00",
+        })
+        assert invoice.is_valid(), invoice.errors
+        invoice = invoice.save()
+        assert Medicine.objects.get(pk=med.pk).sellable_units == 0
+
+        serializer = InvoiceCreationSerializer(
+            invoice, data={"items": [{"medicine_id": med.id, "quantity": 4}]}, partial=True
+        )
+        assert serializer.is_valid(), serializer.errors
+        serializer.save()
+
+        assert dict(invoice.sales_items.values_list("batch_id", "quantity")) == {first.pk: 3, second.pk: 1}
+        assert Batch.objects.get(pk=second.pk).stock_units == 1
+        assert Medicine.objects.get(pk=med.pk).sellable_units == 1
+
+    def test_invoice_update_rejects_items_after_returns(self):
+        """Items with returned units keep their history"""
+        invoice = InvoiceFactory(discount=Decimal('0.00'))
+        batch = BatchFactory(stock_units=10)
+        item = SaleItemFactory(invoice=invoice, batch=batch, quantity=4)
+        refund_invoice(invoice.pk, {item.pk: 1})
+
+        serializer = InvoiceCreationSerializer(
+            invoice, data={"items": [{"barcode": batch.barcode, "quantity": 2}]}, partial=True
+        )
+        assert not serializer.is_valid()
+        assert "returned units" in str(serializer.errors["items"])
 
     def test_invoice_update_discount_only(self):
         """Test updating only discount"""
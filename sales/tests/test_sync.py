@@ -0,0 +1,89 @@
+import pytest
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from medicine.tests.factories import BatchFactory, MedicineFactory
+from sales.models import Invoice
+from sales.sync import sync_invoices
+from users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def client():
+    client = APIClient()
+    client.force_authenticate(user=UserFactory(role="cashier"))
+    return client
+
+
+@pytest.fixture
+def batches():
+    medicine = MedicineFactory(price=Decimal("10.00"), units_per_pack=1)
+    today = timezone.now().date()
+    return [
+        BatchFactory(medicine=medicine, stock_units=50, expiry_date=today + timezone.timedelta(days=30 + i))
+        for i in range(3)
+    ]
+
+
+def payload(key, batch, quantity=1):
+    return {
+        "idempotency_key": key,
+        "items": [{"barcode": batch.barcode, "quantity": quantity}],
+        "payment_status": "paid",
+        "discount": "0.00",
+    }
+
+
+class TestInvoiceSync:
+    url = reverse("invoice-sync")
+
+    def test_sync_creates_invoices_once(self, client, batches):
+        invoices = [payload(f"terminal-1-{i}", batches[i % 3]) for i in range(6)]
+        response = client.post(self.url, {"invoices": invoices}, format="json")
+        assert response.status_code == 200
+        results = response.data["results"]
+        assert [result["status"] for result in results] == ["created"] * 6
+        assert Invoice.objects.filter(idempotency_key__startswith="terminal-1-").count() == 6
+
+        with CaptureQueriesContext(connection) as queries:
+            replay = client.post(self.url, {"invoices": invoices}, format="json")
+        assert [result["status"] for result in replay.data["results"]] == ["duplicate"] * 6
+        assert [result["invoice"] for result in replay.data["results"]] == [result["invoice"] for result in results]
+        assert len(queries) <= 2
+        assert Invoice.objects.count() == 6
+        batches[0].refresh_from_db()
+        assert batches[0].stock_units == 48
+
+    def test_invalid_invoice_does_not_block_the_rest(self, client, batches):
+        invoices = [
+            payload("a", batches[0]),
+            payload("b", batches[1], quantity=500),
+            payload("c", batches[2]),
+        ]
+        response = client.post(self.url, {"invoices": invoices}, format="json")
+        statuses = {result["idempotency_key"]: result["status"] for result in response.data["results"]}
+        assert statuses == {"a": "created", "b": "invalid", "c": "created"}
+        assert "errors" in response.data["results"][1]
+        assert set(Invoice.objects.values_list("idempotency_key", flat=True)) == {"a", "c"}
+
+    def test_key_repeated_within_payload(self, client, batches):
+        invoices = [payload("same", batches[0]), payload("same", batches[0])]
+        response = client.post(self.url, {"invoices": invoices}, format="json")
+        assert [result["status"] for result in response.data["results"]] == ["created", "duplicate"]
+        assert Invoice.objects.count() == 1
+
+    def test_small_chunks(self, batches):
+        results = sync_invoices([payload(f"k{i}", batches[0]) for i in range(5)], chunk_size=2)
+        assert [result.status for result in results] == ["created"] * 5
+
+    def test_key_is_required(self, client, batches):
+        invoice = payload("x", batches[0])
+        del invoice["idempotency_key"]
+        response = client.post(self.url, {"invoices": [invoice]}, format="json")
+        assert response.status_code == 400
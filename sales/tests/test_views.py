@@ -1,3 +1,4 @@
+import itertools
 import pytest
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -7,7 +8,13 @@ from decimal import Decimal
 
 from users.tests.factories import UserFactory
 from medicine.tests.factories import BatchFactory, MedicineFactory
+from medicine.models import StockMovement
 from sales.models import Invoice, SaleItem
+from sales.paginations import InvoiceCursorPagination
+from sales.refunds import refund_invoice
+from sales.tests.factories import InvoiceFactory, SaleItemFactory
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
 @pytest.fixture
@@ -141,6 +148,22 @@ def test_delete_invoice_success(auth_client):
     # Assert the response status is OK
     assert response.status_code == status.HTTP_204_NO_CONTENT
     assert Invoice.objects.count() == 0
+    # the sold units are back in stock, recorded as an adjustment
+    batch.refresh_from_db()
+    assert batch.stock_units == 3
+    assert batch.movements.order_by("pk").last().reason == StockMovement.ADJUSTMENT
+
+
+@pytest.mark.django_db
+def test_delete_invoice_with_returns_rejected(auth_client):
+    batch = BatchFactory(stock_units=3)
+    invoice = InvoiceFactory(discount=Decimal("0.00"))
+    item = SaleItemFactory(invoice=invoice, batch=batch, quantity=2)
+    refund_invoice(invoice.pk, {item.pk: 1})
+
+    response = auth_client.delete(reverse("invoice-detail", kwargs={"pk": invoice.pk}))
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert Invoice.objects.filter(pk=invoice.pk).exists()
 
 @pytest.mark.django_db
 def test_create_invoice_unauthorized(non_cashier_user, unauth_client):
@@ -196,3 +219,59 @@ def test_return_invoice_success(auth_client):
     batch.refresh_from_db()
     assert batch.stock_units == 3
     assert invoice.payment_status == "refunded"
+
+
+@pytest.fixture
+def paid_invoice():
+    """Factory of paid invoices; batches get distinct expiry dates within the test."""
+    expiry_dates = (timezone.now().date() + timezone.timedelta(days=30 + day) for day in itertools.count())
+
+    def create(items=2, medicine=None):
+        invoice = InvoiceFactory(payment_status="paid", discount=Decimal("12.50"))
+        medicine = medicine or MedicineFactory(price=Decimal("9.99"), units_per_pack=1)
+        for _ in range(items):
+            batch = BatchFactory(medicine=medicine, stock_units=10, expiry_date=next(expiry_dates))
+            SaleItemFactory(invoice=invoice, batch=batch, quantity=3)
+        invoice.refresh_from_db()
+        return invoice
+
+    return create
+
+
+@pytest.mark.django_db
+def test_invoice_list_is_cursor_paginated(auth_client, paid_invoice):
+    invoices = [paid_invoice(items=1) for _ in range(5)]
+    url = reverse("invoice-list") + "?size=2"
+    seen = []
+    while url:
+        response = auth_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        seen += [row["total_after_discount"] for row in response.data["results"]]
+        url = response.data["next"]
+    expected = sorted(invoices, key=lambda invoice: (invoice.created, invoice.pk), reverse=True)
+    assert seen == [invoice.total_after_discount for invoice in expected]
+
+
+@pytest.mark.django_db
+def test_invoice_list_query_count_is_fixed(auth_client, paid_invoice):
+    medicine = MedicineFactory(price=Decimal("9.99"), units_per_pack=1)
+    for _ in range(2):
+        paid_invoice(items=2, medicine=medicine)
+    url = reverse("invoice-list") + "?size=50"
+    with CaptureQueriesContext(connection) as few:
+        auth_client.get(url)
+    for _ in range(4):
+        paid_invoice(items=4, medicine=medicine)
+    with CaptureQueriesContext(connection) as many:
+        response = auth_client.get(url)
+    assert len(response.data["results"]) == 6
+    assert len(few) == len(many)
+    assert all(row["sale_items"][0]["medicine"] for row in response.data["results"])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("position", [["yesterday", 1], ["2024-01-01T00:00:00+00:00", "abc"]])
+def test_invoice_list_tampered_cursor(auth_client, position):
+    cursor = InvoiceCursorPagination().encode_cursor(position)
+    response = auth_client.get(reverse("invoice-list") + f"?cursor={cursor}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
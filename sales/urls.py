@@ -2,8 +2,8 @@
 URL configurations for the sales app.
 
 This module defines URL patterns for invoice-related API endpoints, including
-listing/creating invoices, retrieving/updating/deleting invoices, and returning
-invoices.
+listing/creating invoices, retrieving/updating/deleting invoices, returning
+invoices, and syncing invoices from offline terminals.
 """
 
 from django.urls import path
@@ -14,4 +14,5 @@ urlpatterns = [
     path("", InvoiceListCreateAPIView.as_view(), name="invoice-list"),
     path("<int:pk>/", InvoiceRetrieveUpdateDestroyAPIView.as_view(), name="invoice-detail"),
     path("return/", ReturnInvoiceAPIView.as_view(), name="invoice-return"),
+    path("sync/", InvoiceSyncAPIView.as_view(), name="invoice-sync"),
 ]
\ No newline at end of file
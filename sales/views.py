@@ -9,26 +9,36 @@ permissions.
 from django.shortcuts import render
 from rest_framework import status, generics
 from sales.models import Invoice, SaleItem
-from sales.serializers import InvoiceCreationSerializer, ReturnInvoiceSerializer
+from sales.serializers import InvoiceCreationSerializer, ReturnInvoiceSerializer, InvoiceSyncSerializer
+from sales.sync import sync_invoices
+from sales.checkout import cancel
+from sales.refunds import RefundError
 from users.permissions import IsCashier
 from django_filters.rest_framework import DjangoFilterBackend
 from sales.filters import InvoiceFilter
+from sales.paginations import InvoiceCursorPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 
 
 class InvoiceListCreateAPIView(generics.ListCreateAPIView):
     """
     API view for listing and creating invoices.
 
-    Lists all paid invoices and allows creating new invoices. Supports filtering
-    by creation date using InvoiceFilter.
+    Lists all paid invoices, newest first, and allows creating new invoices.
+    Supports filtering by creation date using InvoiceFilter.
+
+    The list is cursor paginated (`?cursor=`, `?size=`). Totals are computed
+    in SQL and sale items prefetched, so a page costs a fixed number of
+    queries.
     """
     permission_classes = [IsCashier]
-    queryset = Invoice.objects.filter(payment_status="paid")
+    queryset = Invoice.objects.filter(payment_status="paid").with_totals().with_items()
     serializer_class = InvoiceCreationSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = InvoiceFilter
+    pagination_class = InvoiceCursorPagination
 
 
 class InvoiceRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
@@ -36,27 +46,56 @@ class InvoiceRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView)
     API view for retrieving, updating, and deleting invoices.
 
     Allows cashiers to retrieve, update, or delete a specific invoice by ID.
+    Deleting an invoice returns its units to stock and takes it off the
+    sales rollups (see sales.checkout.cancel).
     """
     permission_classes = [IsCashier]
-    queryset = Invoice.objects.all()
+    queryset = Invoice.objects.with_totals().with_items()
     serializer_class = InvoiceCreationSerializer
 
+    def perform_destroy(self, instance):
+        try:
+            cancel(instance)
+        except RefundError as error:
+            raise ValidationError(str(error))
+
 
 class ReturnInvoiceAPIView(APIView):
     """
     API view for returning (refunding) an invoice.
 
-    Marks an invoice as refunded and updates related stock quantities.
+    Returns the whole invoice, or the given items, to stock (see
+    sales.refunds). Repeating a return restores nothing more.
     """
     def post(self, request):
-        """Return invoice (mark as refunded)."""
+        """Return invoice (mark as refunded once every unit is returned)."""
         serializer = ReturnInvoiceSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
-            invoice = serializer.validated_data['invoice']
-            invoice.payment_status = 'refunded'
-            invoice.save()
+            invoice = serializer.save()
             return Response(
                 {"message": f"Invoice #{invoice.pk} refunded successfully."},
                 status=status.HTTP_200_OK
             )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class InvoiceSyncAPIView(APIView):
+    """
+    API view for invoices replayed by offline point-of-sale terminals.
+
+    Accepts `{"invoices": [...]}` where every invoice carries a client
+    generated `idempotency_key`. Invoices whose key is already stored are
+    reported as duplicates without being validated again (see sales.sync).
+    Returns one result per invoice, in request order.
+    """
+    permission_classes = [IsCashier]
+
+    def post(self, request):
+        """Create the invoices that don't exist yet."""
+        serializer = InvoiceSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = sync_invoices(serializer.validated_data["invoices"], context={"request": request})
+        return Response(
+            {"results": [result.as_dict() for result in results]},
+            status=status.HTTP_200_OK
+        )